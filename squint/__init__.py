@@ -37,6 +37,8 @@ if _sqlite3.sqlite_version_info < (3, 6, 8):
 # Import squint objects into main namespace.
 ############################################
 from .query import BaseElement
+from .query import PreparedQuery
+from .query import param
 from .select import Select
 from .select import Query
 from .result import Result
@@ -49,6 +51,8 @@ __version__ = '0.2.0'
 BaseElement.__module__ = 'squint'
 Select.__module__ = 'squint'
 Query.__module__ = 'squint'
+PreparedQuery.__module__ = 'squint'
+param.__module__ = 'squint'
 Result.__module__ = 'squint'
 Predicate.__module__ = 'squint'
 
@@ -1,36 +1,361 @@
 # -*- coding: utf-8 -*-
+import bz2
+import codecs
+import gzip
+import io
+import sys
 import warnings
 from get_reader import get_reader
 
+try:
+    import lzma  # New in Python 3.3.
+except ImportError:
+    try:
+        from backports import lzma  # <- Optional backport for Python 2.
+    except ImportError:
+        lzma = None
+
+from .._compatibility.itertools import chain
 from .._utils import exhaustible
 from .._utils import seekable
 from .._utils import file_types
+from .._utils import string_types
 from .temptable import load_data
 from .temptable import savepoint
 
 
 preferred_encoding = 'utf-8'
 fallback_encoding = ['latin-1']
+sniff_size = 65536  # Number of bytes used to select an encoding.
+
+
+def _get_encoding_list():
+    if isinstance(fallback_encoding, list):
+        return [preferred_encoding] + fallback_encoding
+    return [preferred_encoding, fallback_encoding]
+
+
+def get_compression(csvfile):
+    """Return the compression suffix ('.gz', '.bz2', or '.xz') used
+    by *csvfile* (a path or a file object's name) or None if it is
+    not compressed.
+    """
+    if not isinstance(csvfile, string_types):
+        csvfile = getattr(csvfile, 'name', '')
+    if not isinstance(csvfile, string_types):
+        return None  # <- File descriptors can be used as names.
+    for suffix in ('.gz', '.bz2', '.xz'):
+        if csvfile.lower().endswith(suffix):
+            return suffix
+    return None
+
+
+class _BZ2Reader(io.RawIOBase):
+    """Raw stream that decompresses bzip2 data read from *fileobj*.
+    Used on Python 2 where BZ2File does not accept file objects and
+    has no readable() method (so io.TextIOWrapper can not use it).
+    If *owned* is True, *fileobj* is closed when the reader is closed.
+    """
+    def __init__(self, fileobj, owned=False):
+        self._fileobj = fileobj
+        self._owned = owned
+        self._decompressor = bz2.BZ2Decompressor()
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            data = self._fileobj.read(len(b))
+            if not data:
+                return 0  # <- End of file.
+            try:
+                self._buffer = self._decompressor.decompress(data)
+            except EOFError:
+                return 0  # <- End of the compressed stream.
+        data = self._buffer[:len(b)]
+        self._buffer = self._buffer[len(data):]
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if self._owned and not self.closed:
+            self._fileobj.close()
+        super(_BZ2Reader, self).close()
+
+
+def _open_binary(csvfile):
+    """Return a binary stream for *csvfile* (a path or file object).
+    Compressed files are decompressed as they are read.
+    """
+    compression = get_compression(csvfile)
+    is_path = isinstance(csvfile, string_types)
+    if compression == '.gz':
+        if is_path:
+            return gzip.GzipFile(csvfile, 'rb')
+        return gzip.GzipFile(fileobj=csvfile, mode='rb')
+    if compression == '.bz2':
+        if hasattr(bz2.BZ2File, 'readable'):
+            return bz2.BZ2File(csvfile)
+        if is_path:  # <- Python 2.
+            return io.BufferedReader(_BZ2Reader(io.open(csvfile, 'rb'), True))
+        return io.BufferedReader(_BZ2Reader(csvfile))
+    if compression == '.xz':
+        if lzma is None:
+            raise ImportError('loading .xz files requires the lzma module')
+        return lzma.LZMAFile(csvfile)
+    return io.open(csvfile, 'rb')
+
+
+def _is_ascii_compatible(encoding):
+    """Return True if *encoding* decodes ASCII bytes unchanged (this
+    means lines can be split on newline bytes before decoding).
+    """
+    ascii_bytes = b'\r\n,;|"\'\t abcXYZ019'
+    try:
+        return ascii_bytes.decode(encoding) == ascii_bytes.decode('ascii')
+    except (UnicodeError, LookupError):
+        return False
+
+
+def _split_cr(line):
+    """Split a line of bytes (read up to a b'\\n') after any bare
+    b'\\r' so that files with CR line endings are read one line at
+    a time. Returns a list of lines.
+    """
+    index = line.find(b'\r')
+    if index == -1 or (index == len(line) - 2 and line.endswith(b'\n')):
+        return [line]  # <- No bare CR (the usual case).
+
+    parts = line.split(b'\r')
+    lines = [part + b'\r' for part in parts[:-1]]
+    if parts[-1] == b'\n':
+        lines[-1] += b'\n'  # <- Keep CRLF line ending together.
+    elif parts[-1]:
+        lines.append(parts[-1])
+    return lines
+
+
+def _make_unsuccessful_error(orig_error, csvfile):
+    encoding, object_, start, end, reason = orig_error.args  # Unpack args.
+    reason = (
+        '{0}: unable to load {1!r}, fallback recovery unsuccessful: '
+        'must specify an appropriate text encoding'
+    ).format(reason, csvfile)
+    return UnicodeDecodeError(encoding, object_, start, end, reason)
+
+
+class FallbackDecoder(object):
+    """Iterator that yields decoded lines from the file at *path*
+    (beginning at the byte offset *start*). If *fileobj* is given,
+    lines are read from it instead (and *path* is only used in
+    messages).
+
+    The first of the given *encodings* that can decode the start
+    of the file (see *sniff_size*) is used. If a later line cannot
+    be decoded, decoding switches to the next encoding that can
+    decode it--lines that were already decoded are left as-is.
+    The first decoding error is kept in the *error* attribute, the
+    encoding currently in use is kept in *encoding*, and the offset
+    of the next undecoded byte is kept in *position*.
+
+    With a single encoding there is nothing to select, so the start
+    of the file is not checked and errors are raised by the line that
+    can not be decoded (e.g., read_header() only decodes the header).
+
+    The *position* is only advanced past lines that end with a line
+    ending. If the last line has none (e.g., the file is still being
+    written), *unterminated* is set to True and the line is yielded
+    only if *partial* is True.
+    """
+    def __init__(self, path, encodings, start=0, fileobj=None, partial=True):
+        self.path = path
+        self.encodings = list(encodings)
+        self.error = None
+        self.position = start
+        self.partial = partial
+        self.unterminated = False
+        self._file = fileobj or _open_binary(path)
+        try:
+            if start:
+                self._file.seek(start)
+
+            # The prefix is kept and read again (rather than seeking
+            # back to the start) so compressed streams are read once.
+            prefix = self._file.read(sniff_size)
+            if prefix and not prefix.endswith(b'\n'):
+                prefix += self._file.readline()
+            if len(self.encodings) > 1:
+                self._index = self._find_encoding(prefix, 0, final=False)
+            else:
+                self._index = 0
+        except Exception:
+            self._file.close()
+            raise
+        self.encoding = self.encodings[self._index]
+        self._lines = chain(io.BytesIO(prefix), self._file)
+        self._iterator = self._iter_lines()  # <- Shared by all iter() calls.
+
+    def _find_encoding(self, data, start, final=True):
+        """Return index of first encoding (beginning at *start*) that
+        can decode *data*.
+        """
+        for index in range(start, len(self.encodings)):
+            decoder = codecs.getincrementaldecoder(self.encodings[index])()
+            try:
+                decoder.decode(data, final)
+                return index
+            except UnicodeDecodeError as error:
+                if self.error is None:
+                    self.error = error
+
+        if len(self.encodings) == 1:
+            raise self.error  # <- No fallback encodings were given.
+        raise _make_unsuccessful_error(self.error, self.path)
+
+    def _decode(self, line):
+        text = line.decode(self.encoding)
+        if text.startswith(u'\ufeff') and self.position == 0:
+            text = text[1:]  # <- Remove byte order mark.
+        return text
 
+    def __iter__(self):
+        return self
 
-def load_csv(cursor, table, csvfile, encoding=None, **kwds):
-    """Load *csvfile* and insert data into *table*."""
+    def __next__(self):
+        return next(self._iterator)
+
+    def next(self):
+        return next(self._iterator)  # For Python 2 compatibility.
+
+    def _iter_lines(self):
+        for line in (x for block in self._lines for x in _split_cr(block)):
+            if not line.endswith((b'\n', b'\r')):
+                self.unterminated = True  # <- Can only be the last line.
+                if not self.partial:
+                    return  # <- EXIT!
+            try:
+                text = self._decode(line)
+            except UnicodeDecodeError as error:
+                if self.error is None:
+                    self.error = error
+                self._index = self._find_encoding(line, self._index + 1)
+                self.encoding = self.encodings[self._index]
+                text = self._decode(line)
+            if not self.unterminated:
+                self.position += len(line)
+            yield text
+
+    def close(self):
+        self._file.close()
+
+
+def read_header(path, encoding=None, **kwds):
+    """Return the header row of the CSV file at *path* (or None if
+    the file is empty). If *encoding* is not given, the preferred
+    and fallback encodings are tried.
+    """
+    encodings = [encoding] if encoding else _get_encoding_list()
+    lines = FallbackDecoder(path, encodings)
+    try:
+        return next(iter(get_reader.from_csv(lines, lines.encoding, **kwds)), None)
+    finally:
+        lines.close()
+
+
+def _load_lines(cursor, table, lines, default, options, kwds, columns=None):
+    """Load decoded *lines* from a FallbackDecoder and return a tuple
+    of the final encoding and the byte offset where loading stopped.
+    """
+    try:
+        with savepoint(cursor):
+            reader = get_reader.from_csv(lines, lines.encoding, **kwds)
+            if columns:
+                load_data(cursor, table, columns, reader, default=default,
+                          **options)
+            else:
+                load_data(cursor, table, reader, default=default, **options)
+    finally:
+        lines.close()
+
+    if lines.error is not None:
+        msg = (
+            '{0}: loaded {1!r} using fallback {2!r}: specify an '
+            'appropriate text encoding to assure correct operation'
+        ).format(lines.error, lines.path, lines.encoding)
+        warnings.warn(msg)
+
+    return lines.encoding, lines.position
+
+
+def load_csv(cursor, table, csvfile, encoding=None, options=None, **kwds):
+    """Load *csvfile* and insert data into *table*. If given, *options*
+    should be a dictionary of keyword arguments for load_data() (e.g.,
+    "infer_types").
+
+    Files compressed with gzip, bzip2 or xz (a ".gz", ".bz2" or
+    ".xz" suffix on the path or file object's name) are decompressed
+    as they are loaded.
+
+    If *csvfile* is an uncompressed path, returns a tuple of the
+    final encoding, the byte offset where loading stopped and the
+    encoding used to decode the header (see append_csv()). For other objects, or if the file's last line
+    has no line ending (so rows can not be appended after it),
+    returns None.
+    """
     global preferred_encoding
     global fallback_encoding
 
     default = kwds.get('restval', '')  # Used for default column value.
+    options = options or {}
+
+    # When *csvfile* is a path, select an encoding using the beginning
+    # of the file and (if the encoding is unspecified) switch to the
+    # fallback encodings if later lines can not be decoded:
+
+    encodings = [encoding] if encoding else _get_encoding_list()
+    ascii_compatible = all(_is_ascii_compatible(x) for x in encodings)
+    compression = get_compression(csvfile)
+    if isinstance(csvfile, string_types) and ascii_compatible:
+        lines = FallbackDecoder(csvfile, encodings)
+        header_encoding = lines.encoding
+        csv_state = _load_lines(cursor, table, lines, default, options, kwds)
+        if compression or lines.unterminated:
+            return None  # <- Offset not in file or not at the end of a row.
+        return csv_state + (header_encoding,)
+
+    if compression:
+        # Compressed sources are read as a single forward-only stream.
+        stream = _open_binary(csvfile)
+        if ascii_compatible:
+            lines = FallbackDecoder(csvfile, encodings, fileobj=stream)
+            _load_lines(cursor, table, lines, default, options, kwds)
+            return None  # <- EXIT!
+
+        if sys.version_info[0] == 2:
+            text = stream  # <- Binary streams are decoded by get_reader.
+        else:
+            text = io.TextIOWrapper(stream, encoding=encodings[0], newline='')
+        try:
+            with savepoint(cursor):
+                reader = get_reader.from_csv(text, encodings[0], **kwds)
+                load_data(cursor, table, reader, default=default, **options)
+        finally:
+            text.close()
+        return None  # <- EXIT!
 
     if encoding:
         # When an encoding is specified, use it to load *csvfile* or
         # fail if there are errors (no fallback recovery):
         with savepoint(cursor):
             reader = get_reader.from_csv(csvfile, encoding, **kwds)
-            load_data(cursor, table, reader, default=default)
+            load_data(cursor, table, reader, default=default, **options)
 
-        return  # <- EXIT!
+        return None  # <- EXIT!
 
-    # When the encoding is unspecified, try to load *csvfile* using the
-    # preferred encoding and failing that, try the fallback encodings:
+    # Otherwise, try to load *csvfile* using the preferred encoding
+    # and failing that, try the fallback encodings:
 
     if isinstance(csvfile, file_types) and seekable(csvfile):
         position = csvfile.tell()  # Get current position if
@@ -40,9 +365,9 @@ def load_csv(cursor, table, csvfile, encoding=None, **kwds):
     try:
         with savepoint(cursor):
             reader = get_reader.from_csv(csvfile, preferred_encoding, **kwds)
-            load_data(cursor, table, reader, default=default)
+            load_data(cursor, table, reader, default=default, **options)
 
-        return  # <- EXIT!
+        return None  # <- EXIT!
 
     except UnicodeDecodeError as orig_error:
         if exhaustible(csvfile) and position is None:
@@ -53,19 +378,15 @@ def load_csv(cursor, table, csvfile, encoding=None, **kwds):
             ).format(reason, csvfile, csvfile.__class__.__name__)
             raise UnicodeDecodeError(encoding, object_, start, end, reason)
 
-        if isinstance(fallback_encoding, list):
-            fallback_list = fallback_encoding
-        else:
-            fallback_list = [fallback_encoding]
-
-        for fallback in fallback_list:
+        for fallback in _get_encoding_list()[1:]:
             if position is not None:
                 csvfile.seek(position)
 
             try:
                 with savepoint(cursor):
                     reader = get_reader.from_csv(csvfile, fallback, **kwds)
-                    load_data(cursor, table, reader, default=default)
+                    load_data(cursor, table, reader, default=default,
+                              **options)
 
                 msg = (
                     '{0}: loaded {1!r} using fallback {2!r}: specify an '
@@ -73,15 +394,45 @@ def load_csv(cursor, table, csvfile, encoding=None, **kwds):
                 ).format(orig_error, csvfile, fallback)
                 warnings.warn(msg)
 
-                return  # <- EXIT!
+                return None  # <- EXIT!
 
             except UnicodeDecodeError:
                 pass
 
         # Note: DO NOT refactor this section using a for-else. I swear...
-        encoding, object_, start, end, reason = orig_error.args  # Unpack args.
-        reason = (
-            '{0}: unable to load {1!r}, fallback recovery unsuccessful: '
-            'must specify an appropriate text encoding'
-        ).format(reason, csvfile)
-        raise UnicodeDecodeError(encoding, object_, start, end, reason)
+        raise _make_unsuccessful_error(orig_error, csvfile)
+
+
+def append_csv(cursor, table, path, encoding, position, fallback=True,
+               options=None, header_encoding=None, **kwds):
+    """Load rows that were appended to the CSV file at *path* after
+    the byte offset *position* (as returned by load_csv()) and insert
+    them into *table*. The file's header row is used for the column
+    names and it is decoded with *header_encoding* (the encoding that
+    load_csv() used for the header, defaults to *encoding*). Decoding
+    of the appended rows starts with the given *encoding* and, if
+    *fallback* is True, can switch to any of the fallback encodings
+    that follow. The *options* argument is the same as for load_csv().
+
+    A last line with no line ending is not loaded (it may still be
+    being written) and is left for a later call.
+
+    Returns a tuple of the final encoding, the new byte offset and
+    the header encoding.
+    """
+    default = kwds.get('restval', '')
+    options = options or {}
+
+    header_encoding = header_encoding or encoding
+    columns = read_header(path, header_encoding, **kwds)
+
+    encodings = [encoding]
+    if fallback:
+        all_encodings = _get_encoding_list()
+        if encoding in all_encodings:
+            encodings = all_encodings[all_encodings.index(encoding):]
+
+    lines = FallbackDecoder(path, encodings, start=position, partial=False)
+    csv_state = _load_lines(cursor, table, lines, default, options, kwds,
+                            columns)
+    return csv_state + (header_encoding,)
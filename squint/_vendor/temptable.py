@@ -1,9 +1,22 @@
 # -*- coding: utf-8 -*-
+import logging
+import re
 import sqlite3
+import threading
+import time
+from decimal import Decimal
+from numbers import Integral
+from numbers import Real
 from .._compatibility.collections.abc import Iterable
 from .._compatibility.collections.abc import Mapping
 from .._compatibility.itertools import chain
 from .._compatibility.itertools import count
+from .._compatibility.itertools import islice
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue  # For Python 2.
 
 
 try:
@@ -12,6 +25,35 @@ except NameError:
     string_types = str
 
 
+# Number of records examined when inferring column types and the
+# number of records inserted per batch when checking that values
+# fit the declared column types.
+infer_sample_size = 100
+affinity_batch_size = 10000
+
+# Number of records examined when detecting columns to dictionary
+# encode and the largest ratio of distinct values to records that a
+# column can have to be encoded (see load_data()).
+encode_sample_size = 1000
+encode_max_ratio = 0.05
+
+# Number of records per batch and maximum number of batches waiting
+# to be inserted when loading with a RecordPipeline.
+pipeline_batch_size = 1000
+pipeline_queue_size = 8
+
+_logger = logging.getLogger(__name__)
+
+_min_integer = -2 ** 63
+_max_integer = 2 ** 63 - 1
+
+_integer_literal = re.compile(r'^-?(?:0|[1-9][0-9]*)$')
+_real_literal = re.compile(
+    r'^-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?$')
+_numeric_literal = re.compile(  # <- Text SQLite treats as a number.
+    r'^\s*[-+]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][-+]?[0-9]+)?\s*$')
+
+
 def table_exists(cursor, table):
     cursor.execute('''
         SELECT name
@@ -27,6 +69,17 @@ def table_exists(cursor, table):
     return bool(cursor.fetchall())
 
 
+def get_table_keyword(cursor):
+    """Return the keywords used to create tables with *cursor*. Tables
+    are temporary unless the cursor's connection has a true
+    *shared_tables* attribute--then tables are created in the main
+    database where other connections to the same file can read them.
+    """
+    if getattr(cursor.connection, 'shared_tables', False):
+        return 'TABLE'
+    return 'TEMPORARY TABLE'
+
+
 _table_names = ('tbl{0}'.format(x) for x in count())
 def new_table_name(cursor):
     global _table_names
@@ -60,8 +113,97 @@ def normalize_default(value):
     return repr(value)
 
 
-def create_table(cursor, table, columns, default=''):
-    """Creates a temporary table using *table* and *columns* names."""
+def _is_affinity_value(affinity, value):
+    """Return True if *value* is a number (or text) that can be stored
+    using the given column *affinity* without changing its meaning.
+    Integers must fit in 64 bits and reals must convert to a float
+    whose repr() has the same numeric value as the original.
+    """
+    if affinity == 'TEXT':
+        return isinstance(value, (string_types, bytes))
+
+    if isinstance(value, string_types):
+        if affinity == 'INTEGER':
+            if not _integer_literal.match(value):
+                return False
+            return _min_integer <= int(value) <= _max_integer
+        if not _real_literal.match(value):
+            return False
+        return Decimal(repr(float(value))) == Decimal(value)
+
+    if isinstance(value, bool):
+        return False
+
+    if affinity == 'INTEGER':
+        return isinstance(value, Integral) \
+            and _min_integer <= value <= _max_integer
+    if isinstance(value, Integral):
+        return float(value) == value  # <- Large integers can lose precision.
+    return isinstance(value, Real)
+
+
+def _fits_affinity(affinity, value):
+    """Return True if *value* can be inserted into a column with the
+    given *affinity* without being lossily converted by SQLite.
+    """
+    if value is None or value == '':
+        return True
+
+    if _is_affinity_value(affinity, value):
+        return True
+
+    # Non-numeric text is stored unchanged in INTEGER and REAL columns.
+    return affinity in ('INTEGER', 'REAL') \
+        and isinstance(value, string_types) \
+        and not _numeric_literal.match(value)
+
+
+def _widen_affinity(affinity):
+    """Return the next affinity that can hold a superset of values
+    (an empty string declares a column with no affinity).
+    """
+    if affinity == 'INTEGER':
+        return 'REAL'
+    return ''
+
+
+def infer_types(columns, records):
+    """Return a list of SQLite type names ('INTEGER', 'REAL', 'TEXT'
+    or '' for no affinity) inferred from a sample of *records*.
+    """
+    types = []
+    for index in range(len(columns)):
+        values = [row[index] for row in records if len(row) > index]
+        values = [x for x in values if x is not None and x != '']
+        if not values:
+            types.append('')  # <- Nothing to infer from.
+            continue
+
+        for affinity in ('INTEGER', 'REAL', 'TEXT'):
+            if all(_is_affinity_value(affinity, x) for x in values):
+                types.append(affinity)
+                break
+        else:
+            types.append('')
+    return types
+
+
+def _make_column_defs(columns, default, column_types=None):
+    column_types = column_types or [''] * len(columns)
+    column_defs = []
+    for column, type_ in zip(columns, column_types):
+        if type_:
+            column_defs.append('{0} {1} DEFAULT {2}'.format(column, type_, default))
+        else:
+            column_defs.append('{0} DEFAULT {1}'.format(column, default))
+    return column_defs
+
+
+def create_table(cursor, table, columns, default='', column_types=None):
+    """Creates a temporary table using *table* and *columns* names.
+    If given, *column_types* should be a list of SQLite type names
+    that correspond to *columns*.
+    """
     columns = normalize_names(columns)
     if columns.count('""') > 1:
         custom_message = ('duplicate column name: contains multiple '
@@ -74,11 +216,11 @@ def create_table(cursor, table, columns, default=''):
         # OperationalError and re-raising it with a modified message.
 
     default = normalize_default(default)
-    column_defs = ['{0} DEFAULT {1}'.format(x, default) for x in columns]
+    column_defs = _make_column_defs(columns, default, column_types)
     column_defs = ', '.join(column_defs)
 
-    statement = 'CREATE TEMPORARY TABLE {0} ({1})'.format(table, column_defs)
-    cursor.execute(statement)
+    statement = 'CREATE {0} {1} ({2})'
+    cursor.execute(statement.format(get_table_keyword(cursor), table, column_defs))
 
 
 def get_columns(cursor, table):
@@ -90,6 +232,12 @@ def get_columns(cursor, table):
     return columns
 
 
+def get_column_types(cursor, table):
+    """Returns dictionary of column names and declared types."""
+    cursor.execute('PRAGMA table_info({0})'.format(table))
+    return dict((x[1], x[2].upper()) for x in cursor)
+
+
 def insert_records(cursor, table, columns, records):
     table = normalize_names(table)
     columns = normalize_names(columns)
@@ -113,21 +261,201 @@ def insert_records(cursor, table, columns, records):
         raise error
 
 
-def alter_table(cursor, table, columns, default=''):
+def alter_table(cursor, table, columns, default='', column_types=None):
     existing_columns = set(normalize_names(get_columns(cursor, table)))
     default = normalize_default(default)
+    columns = normalize_names(columns)
+    column_defs = _make_column_defs(columns, default, column_types)
 
-    for column in normalize_names(columns):
+    for column, column_def in zip(columns, column_defs):
         if column in existing_columns:
             continue
 
-        sql = 'ALTER TABLE {0} ADD COLUMN {1} DEFAULT {2}'
-        sql = sql.format(table, column, default)
-
+        sql = 'ALTER TABLE {0} ADD COLUMN {1}'.format(table, column_def)
         cursor.execute(sql)
         existing_columns.add(column)
 
 
+def get_index_statements(cursor, table):
+    """Return a list of the statements used to create the indexes
+    of *table*.
+    """
+    cursor.execute(
+        "SELECT sql FROM sqlite_master "
+        "WHERE type='index' AND tbl_name=? AND sql IS NOT NULL "
+        "UNION ALL "
+        "SELECT sql FROM sqlite_temp_master "
+        "WHERE type='index' AND tbl_name=? AND sql IS NOT NULL",
+        (table, table),
+    )
+    return [x[0] for x in cursor.fetchall()]
+
+
+def drop_indexes(cursor, table):
+    """Drop the indexes of *table* and return a list of statements
+    that can be used to re-create them.
+    """
+    cursor.execute(
+        "SELECT name, sql FROM sqlite_master "
+        "WHERE type='index' AND tbl_name=? AND sql IS NOT NULL "
+        "UNION ALL "
+        "SELECT name, sql FROM sqlite_temp_master "
+        "WHERE type='index' AND tbl_name=? AND sql IS NOT NULL",
+        (table, table),
+    )
+    indexes = cursor.fetchall()
+    for name, _ in indexes:
+        cursor.execute('DROP INDEX {0}'.format(name))
+    return [sql for _, sql in indexes]
+
+
+def change_column_type(cursor, table, column, type_):
+    """Rebuild *table* so that *column* is declared with the given
+    *type_* (an empty string removes the column's affinity). Existing
+    values and rowids are copied and indexes are re-created.
+    """
+    cursor.execute('PRAGMA table_info({0})'.format(table))
+    table_info = cursor.fetchall()
+    column_defs = []
+    for _, name, declared, _, dflt_value, _ in table_info:
+        if name == column:
+            declared = type_
+        column_def = normalize_names(name)
+        if declared:
+            column_def = '{0} {1}'.format(column_def, declared)
+        if dflt_value is not None:
+            column_def = '{0} DEFAULT {1}'.format(column_def, dflt_value)
+        column_defs.append(column_def)
+
+    index_statements = get_index_statements(cursor, table)
+
+    rebuilt = new_table_name(cursor)
+    statement = 'CREATE {0} {1} ({2})'
+    cursor.execute(statement.format(get_table_keyword(cursor), rebuilt,
+                                    ', '.join(column_defs)))
+    columns = ', '.join(normalize_names([x[1] for x in table_info]))
+    statement = 'INSERT INTO {0} (_ROWID_, {1}) SELECT _ROWID_, {1} FROM {2}'
+    cursor.execute(statement.format(rebuilt, columns, table))  # <- Keep rowids.
+    cursor.execute('DROP TABLE {0}'.format(table))
+    cursor.execute('ALTER TABLE {0} RENAME TO {1}'.format(rebuilt, table))
+    for statement in index_statements:
+        cursor.execute(statement)
+
+
+def insert_typed_records(cursor, table, columns, records):
+    """Insert *records* into *table* making sure that values fit the
+    declared column types. When a value would be lossily converted
+    by SQLite, the column is widened (INTEGER to REAL or to no
+    affinity at all) before the value is inserted.
+    """
+    declared = get_column_types(cursor, table)
+    checked = []
+    for index, column in enumerate(columns):
+        affinity = declared.get(str(column).strip(), '')
+        if affinity in ('INTEGER', 'REAL', 'TEXT'):
+            checked.append([index, str(column).strip(), affinity])
+
+    if not checked:
+        insert_records(cursor, table, columns, records)
+        return  # <- EXIT!
+
+    records = iter(records)
+    while True:
+        batch = list(islice(records, affinity_batch_size))
+        if not batch:
+            break
+
+        for item in checked:
+            index, column, affinity = item
+            values = [row[index] for row in batch if len(row) > index]
+            widened = affinity
+            while widened and not all(_fits_affinity(widened, x) for x in values):
+                widened = _widen_affinity(widened)
+            if widened != affinity:
+                change_column_type(cursor, table, column, widened)
+                item[2] = widened
+
+        checked = [x for x in checked if x[2]]
+        insert_records(cursor, table, columns, batch)
+
+
+class RecordPipeline(object):
+    """Iterator that yields *records* which are read ahead, in batches,
+    by a background thread. This lets records be parsed while earlier
+    records are being inserted. At most *maxsize* batches are waiting
+    at any time--when the queue is full, the reading thread waits.
+
+    Errors raised while reading are re-raised when iterating. When
+    iteration is finished, the number of records and the time taken
+    are kept in the *rows* and *seconds* attributes. *waiting* is the
+    time spent waiting for the reading thread (if this is close to
+    *seconds*, reading records is the bottleneck).
+    """
+    def __init__(self, records, batch_size=None, maxsize=None):
+        self.batch_size = batch_size or pipeline_batch_size
+        self.rows = 0
+        self.seconds = 0.0
+        self.waiting = 0.0
+        self._queue = queue.Queue(maxsize or pipeline_queue_size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._read, args=(iter(records),))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _read(self, records):
+        try:
+            while not self._stop.is_set():
+                batch = list(islice(records, self.batch_size))
+                if not batch:
+                    break
+                self._put((batch, None))
+        except BaseException as error:  # <- Re-raised when iterating.
+            self._put((None, error))
+            return
+        self._put((None, None))
+
+    def __iter__(self):
+        start = time.time()
+        try:
+            while True:
+                waiting_since = time.time()
+                batch, error = self._queue.get()
+                self.waiting += time.time() - waiting_since
+                if error is not None:
+                    raise error
+                if batch is None:
+                    break
+                self.rows += len(batch)
+                for record in batch:
+                    yield record
+        finally:
+            self.seconds = time.time() - start
+            self.close()
+
+    def close(self):
+        """Stop the reading thread and log the throughput."""
+        if not self._thread.is_alive() and self._stop.is_set():
+            return  # <- EXIT! (Already closed.)
+        self._stop.set()
+        self._thread.join()
+        _logger.debug(
+            'pipeline loaded %d records in %.3f seconds (%.0f records '
+            'per second, %.3f seconds waiting for records)',
+            self.rows,
+            self.seconds,
+            self.rows / self.seconds if self.seconds else 0.0,
+            self.waiting,
+        )
+
+
 def drop_table(cursor, table):
     table = normalize_names(table)
     cursor.execute('DROP TABLE IF EXISTS {0}'.format(table))
@@ -157,12 +485,146 @@ class savepoint(object):
             self.cursor.execute('RELEASE {0}'.format(self.name))
         else:
             self.cursor.execute('ROLLBACK TO {0}'.format(self.name))
+            self.cursor.execute('RELEASE {0}'.format(self.name))
+            # Above: ROLLBACK TO does not end the transaction.
+
+
+def project_columns(columns, include=None, exclude=None):
+    """Return a list of indexes for the *columns* that are named in
+    *include* (if given) and are not named in *exclude*.
+    """
+    if include is not None:
+        include = set(str(x).strip() for x in include)
+    exclude = set(str(x).strip() for x in (exclude or ()))
+
+    indexes = []
+    for index, column in enumerate(columns):
+        name = str(column).strip()
+        if include is not None and name not in include:
+            continue
+        if name in exclude:
+            continue
+        indexes.append(index)
+    return indexes
+
+
+def _check_width(record, width):
+    if len(record) != width:
+        raise sqlite3.ProgrammingError(  # <- Message is expanded by
+            'Incorrect number of bindings supplied.'  # insert_records().
+        )
+
+
+def _project_records(records, indexes, width):
+    """Return an iterator of *records* containing only the values at
+    the given *indexes*.
+    """
+    for record in records:
+        _check_width(record, width)
+        yield [record[i] for i in indexes]
+
+
+def filter_records(records, columns, where, default=''):
+    """Return an iterator of *records* where every function in *where*
+    (a mapping of column names and functions of one argument) returns
+    True. If a column in *where* is not in *columns*, its function is
+    tested using the *default* value instead.
+    """
+    names = [str(x).strip() for x in columns]
+    checks = []
+    for name, function in where.items():
+        name = str(name).strip()
+        if name in names:
+            checks.append((names.index(name), function))
+        elif not function(default):
+            return iter([])  # <- EXIT! (No records can match.)
+
+    if not checks:
+        return records
+
+    def generate(records, width):
+        for record in records:
+            _check_width(record, width)
+            if all(function(record[i]) for i, function in checks):
+                yield record
+    return generate(records, len(columns))
+
+
+def find_encodable_columns(columns, records):
+    """Return a list of *columns* whose values in the sample *records*
+    are all strings and contain few distinct values (no more than
+    *encode_max_ratio* of the number of records).
+    """
+    limit = len(records) * encode_max_ratio
+    encodable = []
+    for index, column in enumerate(columns):
+        values = [row[index] for row in records if len(row) > index]
+        if not values or not all(isinstance(x, string_types) for x in values):
+            continue
+        if len(set(values)) <= limit:
+            encodable.append(column)
+    return encodable
+
+
+def encode_records(records, columns, encode):
+    """Return an iterator of *records* where the values of columns
+    named in *encode* are replaced with integer codes. The *encode*
+    argument should be a mapping of column names and dictionaries
+    of values and codes--values that are not in a dictionary are
+    added to it using the next available code (starting with 1).
+    The dictionaries are keyed by ``(type(value), value)`` so that
+    equal values of different types (e.g., 1, 1.0 and True) get
+    different codes and decode to their original values.
+    """
+    indexes = [(i, encode[c]) for i, c in enumerate(columns) if c in encode]
+    if not indexes:
+        return records  # <- EXIT!
+
+    def encode_record(record):
+        record = list(record)
+        for index, codes in indexes:
+            if index < len(record):
+                value = record[index]
+                key = (type(value), value)
+                code = codes.get(key)
+                if code is None:
+                    code = len(codes) + 1
+                    codes[key] = code
+                record[index] = code
+        return record
+
+    return (encode_record(record) for record in records)
 
 
 def load_data(cursor, table, *args, **kwds):
     """
-    load_data(cursor, table, columns, records, default='')
-    load_data(cursor, table, records, default='')
+    load_data(cursor, table, columns, records, default='', **options)
+    load_data(cursor, table, records, default='', **options)
+
+    Supported *options* are infer_types=False, include=None,
+    exclude=None, where=None, pipeline=False, encode=None and
+    auto_encode=False.
+
+    When *infer_types* is True, column types are inferred from the
+    first records (see *infer_sample_size*) and values are stored
+    using SQLite INTEGER or REAL affinity where possible.
+
+    When *include* or *exclude* are given, only the named columns
+    are loaded or the named columns are skipped. If no columns are
+    left to load, no table is created.
+
+    When *where* is given, it should be a mapping of column names and
+    functions of one argument. Only records where every function returns
+    True are loaded (see filter_records()).
+
+    When *pipeline* is True, records are read by a background thread
+    while earlier records are being inserted (see RecordPipeline).
+
+    When *encode* is given, values in the named columns are stored
+    as integer codes (see encode_records()). When *auto_encode* is
+    also True, new columns with few distinct values in the first
+    records (see *encode_sample_size*) are added to *encode*. Columns
+    that already contain rows are never added.
     """
     try:
         records, = args
@@ -171,6 +633,13 @@ def load_data(cursor, table, *args, **kwds):
         columns, records = args
 
     default = kwds.pop('default', '')
+    infer = kwds.pop('infer_types', False)
+    include = kwds.pop('include', None)
+    exclude = kwds.pop('exclude', None)
+    where = kwds.pop('where', None)
+    use_pipeline = kwds.pop('pipeline', False)
+    encode = kwds.pop('encode', None)
+    auto_encode = kwds.pop('auto_encode', False)
     if kwds:
         msg = 'load_data() got unexpected keyword argument {0!r}'
         raise TypeError(msg.format(next(iter(kwds.keys()))))
@@ -201,9 +670,50 @@ def load_data(cursor, table, *args, **kwds):
     if isinstance(first_record, Mapping):
         records = ([rec.get(c, '') for c in columns] for rec in records)
 
-    with savepoint(cursor):
+    if where:
+        records = filter_records(records, columns, where, default)
+
+    if include is not None or exclude:
+        indexes = project_columns(columns, include, exclude)
+        if not indexes:
+            return  # <- EXIT! (No columns to load.)
+        if len(indexes) < len(columns):
+            records = _project_records(records, indexes, len(columns))
+            columns = [columns[i] for i in indexes]
+
+    if encode is not None and auto_encode:
+        sample = list(islice(records, encode_sample_size))
+        records = chain(sample, records)
+        existing = []
         if table_exists(cursor, table):
-            alter_table(cursor, table, columns, default=default)
-        else:
-            create_table(cursor, table, columns, default=default)
-        insert_records(cursor, table, columns, records)
+            cursor.execute('SELECT EXISTS (SELECT 1 FROM {0})'.format(table))
+            if cursor.fetchone()[0]:
+                existing = get_columns(cursor, table)
+        for column in find_encodable_columns(columns, sample):
+            if column not in existing and column not in encode:
+                encode[column] = {}
+
+    if encode:
+        records = encode_records(records, columns, encode)
+
+    column_types = None
+    if infer:
+        sample = list(islice(records, infer_sample_size))
+        records = chain(sample, records)
+        column_types = infer_types(columns, sample)
+
+    pipeline = None
+    if use_pipeline:
+        pipeline = RecordPipeline(records)
+        records = iter(pipeline)
+
+    try:
+        with savepoint(cursor):
+            if table_exists(cursor, table):
+                alter_table(cursor, table, columns, default, column_types)
+            else:
+                create_table(cursor, table, columns, default, column_types)
+            insert_typed_records(cursor, table, columns, records)
+    finally:
+        if pipeline is not None:
+            pipeline.close()
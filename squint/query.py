@@ -204,16 +204,24 @@ def _reduce_data(function, iterable, initializer_factory=None):
     return _apply_to_data(wrapper, iterable)
 
 
-def _filter_data(predicate, iterable):
+def _get_filter_function(predicate):
+    """Return a function of one argument that is used to test the
+    values kept by filter(*predicate*).
+    """
     if callable(predicate) and not isinstance(predicate, type):
-        function = predicate
-    else:
-        predicate = get_matcher(predicate)
-        if hasattr(predicate, '_func'):
-            function = predicate._func
-        else:
-            def function(x):
-                return predicate == x
+        return predicate  # <- EXIT!
+
+    predicate = get_matcher(predicate)
+    if hasattr(predicate, '_func'):
+        return predicate._func  # <- EXIT!
+
+    def function(x):
+        return predicate == x
+    return function
+
+
+def _filter_data(predicate, iterable):
+    function = _get_filter_function(predicate)
 
     def wrapper(iterable):
         if isinstance(iterable, BaseElement):
@@ -478,13 +486,14 @@ def _get_step_repr(step):
     return '{0}, ({1}), {{{2}}}'.format(func_repr, args_repr, kwds_repr)
 
 
+# The typenames match the variable names so queries can be pickled.
 _query_step = namedtuple(
-    typename='query_step',
+    typename='_query_step',
     field_names=('name', 'args', 'kwds')
 )
 
 _execution_step = namedtuple(
-    typename='execution_step',
+    typename='_execution_step',
     field_names=('function', 'args', 'kwds')
 )
 
@@ -495,6 +504,320 @@ RESULT_TOKEN = _make_sentinel(
 )
 
 
+########################################################
+# Rules to optimize execution plans.
+########################################################
+
+_sql_aggregates = {
+    _sqlite_sum: 'SUM',
+    _sqlite_count: 'COUNT',
+    _sqlite_avg: 'AVG',
+    _sqlite_min: 'MIN',
+    _sqlite_max: 'MAX',
+}
+
+
+class _FilterFunction(object):
+    """Function that returns True for values kept by filter() steps
+    using each of the given *predicates*. Used to move filter() steps
+    into *where* conditions (which the Select can compile to SQL, see
+    select._compile_predicate()). Instances made from equal predicates
+    are equal (so the Select can reuse the same SQLite function).
+    """
+    def __init__(self, *predicates):
+        self.predicates = predicates
+        self._functions = [_get_filter_function(x) for x in predicates]
+
+    def __call__(self, value):
+        return all(function(value) for function in self._functions)
+
+    def _key(self):
+        return tuple((type(x), x) for x in self.predicates)
+
+    def __eq__(self, other):
+        if not isinstance(other, _FilterFunction):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        func = lambda x: getattr(x, '__name__', repr(x))
+        return '.'.join('filter({0})'.format(func(x)) for x in self.predicates)
+
+
+def _get_select_method(execution_plan):
+    """Return the name of the Select method called by the first two
+    steps of *execution_plan* (e.g., '_select') or None if the plan
+    does not begin with a Select method.
+    """
+    if len(execution_plan) < 2:
+        return None  # <- EXIT!
+
+    function, args, kwds = execution_plan[0]
+    if function is getattr and len(args) == 2 and args[0] is RESULT_TOKEN:
+        return args[1]
+    return None
+
+
+def _get_value_column(columns):
+    """Return the column name if the normalized *columns* selection
+    is a single column of values (without a key), else return None.
+    """
+    if isinstance(columns, Mapping) or len(columns) != 1:
+        return None  # <- EXIT!
+
+    column = next(iter(columns))
+    if isinstance(column, string_types):
+        return column
+    return None
+
+
+def _make_distinct_columns(columns):
+    """Return the normalized *columns* selection with its value
+    container changed to a set (which selects distinct values) or
+    None if the selection's value is not a single column.
+    """
+    key, value = _parse_columns(columns)
+    if len(value) != 1:
+        return None  # <- EXIT!
+
+    column = next(iter(value))
+    if not isinstance(column, string_types):
+        return None  # <- EXIT!
+
+    if key:
+        return {key: set([column])}
+    return set([column])
+
+
+def _optimize_filter(execution_plan):
+    """Move a filter() of a single column's values into the Select's
+    *where* conditions::
+
+        Select._select(['A']).filter(pred)
+          -> Select._select(['A'], A=_FilterFunction(pred))
+
+    Later filters of the same column are added to the same condition.
+    Filters of keyed selections are not moved (filtering the values
+    of a key can leave an empty group but a *where* condition would
+    remove the group) and neither are filters of a column that has a
+    *where* condition of its own.
+    """
+    if len(execution_plan) < 3:
+        return None  # <- EXIT!
+    if _get_select_method(execution_plan) not in ('_select', '_select_distinct'):
+        return None  # <- EXIT!
+
+    func_1, args_1, kwds_1 = execution_plan[1]
+    func_2, args_2, kwds_2 = execution_plan[2]
+    if func_2 is not _filter_data:
+        return None  # <- EXIT!
+
+    column = _get_value_column(args_1[0])
+    if column is None:
+        return None  # <- EXIT!
+
+    predicates = (args_2[0],)
+    if column in kwds_1:
+        if not isinstance(kwds_1[column], _FilterFunction):
+            return None  # <- EXIT!
+        predicates = kwds_1[column].predicates + predicates
+
+    kwds_1 = dict(kwds_1)
+    kwds_1[column] = _FilterFunction(*predicates)
+    optimized_steps = (execution_plan[0], (func_1, args_1, kwds_1))
+    return optimized_steps + tuple(execution_plan[3:])
+
+
+def _optimize_count_distinct(execution_plan):
+    """Count distinct values using the selection (which uses SQLite's
+    COUNT(DISTINCT ...) once the aggregate rule is applied)::
+
+        Select._select(['A']).distinct().count()
+          -> Select._select({'A'}).count()
+    """
+    if len(execution_plan) < 4 or _get_select_method(execution_plan) != '_select':
+        return None  # <- EXIT!
+
+    if execution_plan[2] != (_sqlite_distinct, (RESULT_TOKEN,), {}) \
+            or execution_plan[3] != (_apply_to_data, (_sqlite_count, RESULT_TOKEN), {}):
+        return None  # <- EXIT!
+
+    func_1, args_1, kwds_1 = execution_plan[1]
+    columns = _make_distinct_columns(args_1[0])
+    if columns is None:
+        return None  # <- EXIT!
+
+    optimized_steps = (execution_plan[0], (func_1, (columns,), kwds_1))
+    return optimized_steps + tuple(execution_plan[3:])
+
+
+def _optimize_aggregate(execution_plan):
+    """Compute an aggregate using SQLite::
+
+        Select._select(['A']).sum()
+          -> Select._select_aggregate('SUM', ['A'])
+    """
+    if len(execution_plan) < 3 or _get_select_method(execution_plan) != '_select':
+        return None  # <- EXIT!
+
+    func_2, args_2, kwds_2 = execution_plan[2]
+    if func_2 is not _apply_to_data:
+        return None  # <- EXIT!
+
+    sqlite_function = _sql_aggregates.get(args_2[0], None)
+    if not sqlite_function:
+        return None  # <- EXIT!
+
+    func_1, args_1, kwds_1 = execution_plan[1]
+    args_1 = (sqlite_function,) + args_1  # <- Add SQL function as 1st arg.
+    optimized_steps = (
+        (getattr, (RESULT_TOKEN, '_select_aggregate'), {}),
+        (func_1, args_1, kwds_1),
+    )
+    return optimized_steps + tuple(execution_plan[3:])
+
+
+def _optimize_distinct(execution_plan):
+    """Select distinct values using SQLite::
+
+        Select._select(['A']).distinct()
+          -> Select._select_distinct(['A'])
+    """
+    if len(execution_plan) < 3 or _get_select_method(execution_plan) != '_select':
+        return None  # <- EXIT!
+
+    if execution_plan[2] != (_sqlite_distinct, (RESULT_TOKEN,), {}):
+        return None  # <- EXIT!
+
+    optimized_steps = (
+        (getattr, (RESULT_TOKEN, '_select_distinct'), {}),
+        execution_plan[1],
+    )
+    return optimized_steps + tuple(execution_plan[3:])
+
+
+def _optimize_chained_aggregates(execution_plan):
+    """Remove min(), max() and distinct() steps that follow an
+    aggregate. An aggregate returns a single element (per group)
+    and these steps return single elements unchanged::
+
+        Select._select_aggregate('SUM', ['A']).max()
+          -> Select._select_aggregate('SUM', ['A'])
+    """
+    noop_steps = [
+        (_apply_to_data, (_sqlite_min, RESULT_TOKEN), {}),
+        (_apply_to_data, (_sqlite_max, RESULT_TOKEN), {}),
+        (_sqlite_distinct, (RESULT_TOKEN,), {}),
+    ]
+    for index in range(1, len(execution_plan) - 1):
+        if index == 1:
+            is_aggregate = _get_select_method(execution_plan) == '_select_aggregate'
+        else:
+            func, args, kwds = execution_plan[index]
+            is_aggregate = func is _apply_to_data and args[0] in _sql_aggregates
+
+        if is_aggregate and execution_plan[index + 1] in noop_steps:
+            execution_plan = tuple(execution_plan)
+            return execution_plan[:index + 1] + execution_plan[index + 2:]
+    return None
+
+
+# Rules are tried in order (see BaseQuery._optimize()). Each rule is a
+# function that returns an optimized copy of an execution plan or None
+# if the rule does not apply. Rules must make plans shorter.
+_optimization_rules = [
+    _optimize_filter,
+    _optimize_count_distinct,
+    _optimize_aggregate,
+    _optimize_distinct,
+    _optimize_chained_aggregates,
+]
+
+
+########################################################
+# Parameters for prepared queries.
+########################################################
+
+class _Param(object):
+    """Placeholder for a *where* value that is given when a prepared
+    query is executed (see param() and PreparedQuery).
+    """
+    def __init__(self, name):
+        if not isinstance(name, string_types):
+            raise TypeError('parameter name must be str, got {0!r}'.format(name))
+        self.name = name
+
+    def __eq__(self, other):
+        if not isinstance(other, _Param):
+            return NotImplemented
+        return self.name == other.name
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __hash__(self):
+        return hash((_Param, self.name))
+
+    def __repr__(self):
+        return 'param({0!r})'.format(self.name)
+
+
+def param(name):
+    """Return a placeholder for a *where* value that is given by
+    *name* when a prepared query is executed::
+
+        query = select({'id': 'value'}, region=squint.param('region'))
+        prepared = query.sum().prepare()
+        result = prepared.fetch(region='west')
+
+    Placeholders match the values that equal the given value (see
+    :meth:`Query.prepare` for details).
+    """
+    return _Param(name)
+
+
+def _bind_params(params, values):
+    """Return a list of SQL *params* with placeholders (see param())
+    replaced by the parameter *values* of the same name.
+    """
+    bound = []
+    for x in params:
+        if isinstance(x, _Param):
+            try:
+                x = values[x.name]
+            except KeyError:
+                msg = 'missing value for parameter {0!r} (see Query.prepare())'
+                raise TypeError(msg.format(x.name))
+        bound.append(x)
+    return bound
+
+
+def _run_steps(result, execution_plan):
+    """Run the steps of *execution_plan* beginning with the given
+    *result* and return the final result.
+    """
+    replace_token = lambda x: result if x is RESULT_TOKEN else x
+    for step in execution_plan:
+        function, args, keywords = step  # Unpack 3-tuple.
+        function = replace_token(function)
+        args = tuple(replace_token(x) for x in args)
+        keywords = dict((k, replace_token(v)) for k, v in keywords.items())
+        result = function(*args, **keywords)
+    return result
+
+
 ########################################################
 # BaseQuery class
 ########################################################
@@ -728,47 +1051,22 @@ class BaseQuery(abc.ABC):
 
     @staticmethod
     def _optimize(execution_plan):
-        try:
-            step_0 = execution_plan[0]
-            step_1 = execution_plan[1]
-            step_2 = execution_plan[2]
-            remaining_steps = execution_plan[3:]
-        except IndexError:
-            return None  # <- EXIT!
-
-        if step_0 != (getattr, (RESULT_TOKEN, '_select'), {}):
-            return None  # <- EXIT!
-
-        if step_2[0] == _apply_to_data:
-            func_dict = {
-                _sqlite_sum: 'SUM',
-                _sqlite_count: 'COUNT',
-                _sqlite_avg: 'AVG',
-                _sqlite_min: 'MIN',
-                _sqlite_max: 'MAX',
-            }
-            py_function = step_2[1][0]
-            sqlite_function = func_dict.get(py_function, None)
-            if sqlite_function:
-                func_1, args_1, kwds_1 = step_1
-                args_1 = (sqlite_function,) + args_1  # <- Add SQL function
-                optimized_steps = (                   #    as 1st arg.
-                    (getattr, (RESULT_TOKEN, '_select_aggregate'), {}),
-                    (func_1, args_1, kwds_1),
-                )
+        """Return an optimized copy of *execution_plan* or None if it
+        can not be optimized. The first rule (from _optimization_rules)
+        that applies is used and the rules are tried again on the new
+        plan until none apply.
+        """
+        optimized_plan = None
+        index = 0
+        while index < len(_optimization_rules):
+            rule = _optimization_rules[index]
+            new_plan = rule(optimized_plan or execution_plan)
+            if new_plan is None:
+                index += 1  # <- Try next rule.
             else:
-                optimized_steps = ()
-        elif step_2 == (_sqlite_distinct, (RESULT_TOKEN,), {}):
-            optimized_steps = (
-                (getattr, (RESULT_TOKEN, '_select_distinct'), {}),
-                step_1,
-            )
-        else:
-            optimized_steps = ()
-
-        if optimized_steps:
-            return optimized_steps + remaining_steps
-        return None
+                optimized_plan = new_plan
+                index = 0  # <- Start over with the new plan.
+        return optimized_plan
 
     def execute(self, source=None, optimize=True):
         """A Query can be executed to return a single value or an
@@ -779,6 +1077,14 @@ class BaseQuery(abc.ABC):
 
         Setting *optimize* to False turns-off query optimization.
         """
+        source = self._get_source(source)
+        execution_plan = self._get_execution_plan(source, self._query_steps)
+        if optimize:
+            execution_plan = self._optimize(execution_plan) or execution_plan
+        return _run_steps(source, execution_plan)
+
+    def _get_source(self, source=None):
+        """Return the data source to use when executing the query."""
         if source:
             if self.source:
                 raise ValueError((
@@ -790,21 +1096,26 @@ class BaseQuery(abc.ABC):
             if not self.source:
                 raise ValueError("missing 'source' argument, none found")
             source = self.source
-
-        execution_plan = self._get_execution_plan(source, self._query_steps)
-        if optimize:
-            execution_plan = self._optimize(execution_plan) or execution_plan
-
-        result = source
-        replace_token = lambda x: result if x is RESULT_TOKEN else x
-        for step in execution_plan:
-            function, args, keywords = step  # Unpack 3-tuple.
-            function = replace_token(function)
-            args = tuple(replace_token(x) for x in args)
-            keywords = dict((k, replace_token(v)) for k, v in keywords.items())
-            result = function(*args, **keywords)
-
-        return result
+        return source
+
+    def prepare(self, source=None, optimize=True):
+        """Return a :class:`PreparedQuery` that can be executed many
+        times using different values for the query's placeholders
+        (see :func:`param`)::
+
+            query = select('A', B=squint.param('b'))
+            prepared = query.prepare()
+            result1 = prepared.fetch(b='foo')
+            result2 = prepared.fetch(b='bar')
+
+        The execution plan and SQL statement are built once (rather
+        than for every execution) so repeated queries have less
+        overhead. A placeholder matches values that equal the value
+        given when executing. Unlike other *where* values, sets,
+        functions, and other predicate objects can not be given as
+        parameter values.
+        """
+        return PreparedQuery(self, source, optimize)
 
     def __iter__(self):
         """Executes query and returns an eagerly evaluated result."""
@@ -1011,6 +1322,58 @@ class BaseQuery(abc.ABC):
                 csvfile.close()
 
 
+class PreparedQuery(object):
+    """A query that has been prepared to execute many times (see
+    :meth:`Query.prepare`).
+    """
+    def __init__(self, query, source=None, optimize=True):
+        source = query._get_source(source)
+        if not isinstance(source, query._select_cls):
+            raise TypeError('can only prepare queries of {0!r} objects, got {1!r}'.format(
+                query._select_cls.__name__,
+                source.__class__.__name__,
+            ))
+
+        execution_plan = query._get_execution_plan(source, query._query_steps)
+        if optimize:
+            execution_plan = query._optimize(execution_plan) or execution_plan
+
+        method = _get_select_method(execution_plan)
+        _, args, kwds = execution_plan[1]
+        self.query = query
+        self.params = frozenset(x.name for x in kwds.values() if isinstance(x, _Param))
+        self._statement = source._prepare_statement(method, args, kwds)
+        self._execution_plan = tuple(execution_plan[2:])
+
+    def execute(self, **params):
+        """Execute the query using the given *params* as the values
+        of its placeholders and return a single value or an iterable
+        :class:`Result` (see :meth:`Query.execute`).
+        """
+        if len(params) != len(self.params) or not self.params.issuperset(params):
+            missing = sorted(self.params.difference(params))
+            if missing:
+                msg = 'missing value for parameter {0!r}'
+                raise TypeError(msg.format(missing[0]))
+            unexpected = sorted(set(params).difference(self.params))
+            raise TypeError('unexpected parameter {0!r}'.format(unexpected[0]))
+
+        result = self._statement(params)
+        return _run_steps(result, self._execution_plan)
+
+    def fetch(self, **params):
+        """Execute the query using the given *params* as the values
+        of its placeholders and return an eagerly evaluated result.
+        """
+        result = self.execute(**params)
+        if isinstance(result, Result):
+            return result.fetch()
+        return result
+
+    def __repr__(self):
+        return '<{0} {1!r}>'.format(self.__class__.__name__, self.query)
+
+
 with contextlib.suppress(AttributeError):  # inspect.Signature() is new in 3.3
     BaseQuery.__init__.__signature__ = inspect.Signature([
         inspect.Parameter('self', inspect.Parameter.POSITIONAL_ONLY),
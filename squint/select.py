@@ -1,12 +1,28 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
+import atexit
+import hashlib
+import multiprocessing
+import os
+import pickle
+import re
+import shutil
 import sqlite3
+import sys
+import tempfile
+import threading
+import types
+import warnings
+import weakref
 from glob import glob
+from numbers import Integral
 
 from get_reader import get_reader
 
 from ._compatibility.builtins import *
 from ._compatibility import (
+    collections,
+    contextlib,
     functools,
     itertools,
 )
@@ -17,33 +33,54 @@ from ._compatibility.collections.abc import (
     Set,
 )
 from ._vendor.load_csv import (
+    append_csv,
     load_csv,
+    read_header,
 )
 from ._vendor.predicate import (
     MatcherObject,
     MatcherTuple,
+    Predicate,
     get_matcher,
 )
 from ._vendor.temptable import (
+    alter_table,
+    create_table,
+    drop_indexes,
+    get_index_statements,
+    get_table_keyword,
     load_data,
     new_table_name,
+    normalize_names,
+    project_columns,
     savepoint,
     table_exists,
 )
 from ._utils import (
     file_types,
+    regex_types,
     string_types,
 )
 from .query import (
     BaseQuery,
+    _FilterFunction,
+    _Param,
+    _bind_params,
     _get_iteritems,
     _parse_columns,
+    _sqlite_sortkey,
 )
 from .result import (
     Result,
 )
 
 
+try:
+    from urllib.request import pathname2url
+except ImportError:
+    from urllib import pathname2url  # For Python 2.
+
+
 try:
     FileNotFoundError  # New in Python 3.3.
 except NameError:
@@ -56,11 +93,1267 @@ except NameError:
 # is temporary, long-term integrity should not be a concern--in the
 # unlikely event of data corruption, it should be entirely acceptable
 # to simply rebuild the temporary tables.
-DEFAULT_CONNECTION = sqlite3.connect('')  # <- Using '' makes a temp file.
-DEFAULT_CONNECTION.execute('PRAGMA synchronous=OFF')
-DEFAULT_CONNECTION.isolation_level = None  # <- Run in 'autocommit' mode.
+# Connections are opened with URI filenames enabled (when the sqlite3
+# module supports it) so database files can be attached in read-only
+# mode (see _attach_database()).
+_uri_kwds = {'uri': True} if sys.version_info[:2] >= (3, 4) else {}
+
+
+def _new_default_connection():
+    # The connection is checked by _check_default_thread() rather than
+    # by sqlite3 so that a Select can be pickled from another thread
+    # (e.g., by the task handler thread of a multiprocessing pool).
+    # Using '' as the database name makes a temporary file.
+    connection = sqlite3.connect('', check_same_thread=False, **_uri_kwds)
+    connection.execute('PRAGMA synchronous=OFF')
+    connection.execute('PRAGMA temp.auto_vacuum=INCREMENTAL')  # <- See close().
+    connection.isolation_level = None  # <- Run in 'autocommit' mode.
+    return connection
+
+
+DEFAULT_CONNECTION = _new_default_connection()
+_process_id = os.getpid()  # Process that opened DEFAULT_CONNECTION (see _check_fork()).
+_default_thread = threading.current_thread()  # Thread that can use DEFAULT_CONNECTION.
+
+def _check_default_thread():
+    """Raise an error if DEFAULT_CONNECTION is used by a thread other
+    than the one that opened it. This replaces the check that sqlite3
+    makes for connections opened with check_same_thread=True.
+    """
+    if threading.current_thread() is not _default_thread:
+        msg = ('SQLite objects created in a thread can only be used '
+               'in that same thread (use concurrent=True to query a '
+               'Select from several threads)')
+        raise sqlite3.ProgrammingError(msg)
+
+
+_default_lock = threading.RLock()  # Held while changing DEFAULT_CONNECTION.
 _user_function_name_gen = ('FUNC{0}'.format(x) for x in itertools.count())
 
+# Largest number of user-defined functions (used for *where* conditions)
+# that a Select uses and that a connection keeps registered. When the
+# limit is passed, least recently used functions are released (see
+# _FunctionRegistry).
+MAX_USER_FUNCTIONS = 128
+_database_name_gen = ('db{0}'.format(x) for x in itertools.count())
+_attached_databases = {}  # Schema names by (connection, path) of attached files.
+_attached_users = {}  # Number of Selects using each attached file (same keys).
+
+
+_csv_suffixes = ('.csv', '.csv.gz', '.csv.bz2', '.csv.xz')
+
+
+def _is_csv(obj):
+    """Return True if *obj* is a CSV file path or file object (which
+    can be compressed with gzip, bzip2 or xz).
+    """
+    if isinstance(obj, string_types):
+        return obj.lower().endswith(_csv_suffixes)
+    if isinstance(obj, file_types):
+        name = getattr(obj, 'name', '')
+        return isinstance(name, string_types) \
+            and name.lower().endswith(_csv_suffixes)
+    return False
+
+
+def _check_where_value(key, val):
+    """Raise a ValueError if *val* cannot be used to narrow a
+    selection.
+    """
+    if isinstance(val, dict):
+        msg = ('cannot narrow a selection using a dictionary, '
+               'got: {0}={1!r}').format(key, val)
+        if len(val) == 0:
+            msg = '{0}\n  Did you mean {1}=set()?'.format(msg, key)
+        raise ValueError(msg)
+
+
+_truthy_sql = ("CASE typeof({0}) WHEN 'null' THEN 0 "
+               "WHEN 'text' THEN {0} != '' "
+               "WHEN 'blob' THEN length({0}) > 0 "
+               "ELSE {0} != 0 END")
+
+
+def _is_sql_literal(value):
+    """Return True if *value* is None, a string, or a number that can
+    be given to SQLite as a parameter and that equals the same values
+    in Python and SQL (when compared with values of the same type).
+    """
+    if value is None or isinstance(value, string_types):
+        return True
+    if isinstance(value, float):
+        return value == value  # <- False for NaN.
+    if isinstance(value, Integral) and not isinstance(value, bool):
+        return -2 ** 63 <= value < 2 ** 63  # <- Includes "long" on Python 2.
+    return False
+
+
+def _compile_literals(column, values):
+    """Return an SQL condition (and its parameters) that matches the
+    values of *column* that equal any of the given literal *values*
+    using Python's equality (strings never equal numbers).
+    """
+    conditions = []
+    params = []
+    texts = [x for x in values if isinstance(x, string_types)]
+    numbers = [x for x in values
+               if x is not None and not isinstance(x, string_types)]
+    if None in values:
+        conditions.append('{0} IS NULL'.format(column))
+    if texts:
+        conditions.append("(typeof({0})='text' AND {0} IN ({1}))".format(
+            column, ', '.join('?' * len(texts))))
+        params.extend(texts)
+    if numbers:
+        conditions.append("(typeof({0}) IN ('integer', 'real') AND {0} IN ({1}))".format(
+            column, ', '.join('?' * len(numbers))))
+        params.extend(numbers)
+
+    if not conditions:
+        return '0', []  # <- Matches nothing.
+    if len(conditions) == 1:
+        return conditions[0], params
+    return '({0})'.format(' OR '.join(conditions)), params
+
+
+def _get_storage_types():
+    """Return a list of SQLite storage classes and the types of the
+    values that the sqlite3 module returns for them.
+    """
+    connection = sqlite3.connect(':memory:')
+    try:
+        values = connection.execute("SELECT 1, 1.5, 'x', x'00', NULL").fetchone()
+    finally:
+        connection.close()
+    names = ['integer', 'real', 'text', 'blob', 'null']
+    return list(zip(names, [type(x) for x in values]))
+
+
+_storage_types = _get_storage_types()
+_regex_special = set('.^$*+?{}[]\\|()')
+
+
+def _get_regex_prefix(regex):
+    """Return a tuple of the literal prefix that strings must begin
+    with to match the anchored *regex* and True if the regex matches
+    every string that begins with the prefix. Returns None if there
+    is no such prefix (including any regex that uses alternation, like
+    "^abc|xyz", where the prefix would not apply to every branch).
+    """
+    pattern = regex.pattern
+    if not isinstance(pattern, string_types) \
+            or regex.flags & (re.IGNORECASE | re.MULTILINE | re.VERBOSE):
+        return None  # <- EXIT!
+    if '|' in pattern:
+        return None  # <- EXIT!
+
+    if pattern.startswith('^'):
+        position = 1
+    elif pattern.startswith('\\A'):
+        position = 2
+    else:
+        return None  # <- EXIT!
+
+    prefix = []
+    while position < len(pattern):
+        char = pattern[position]
+        length = 1
+        if char == '\\':
+            char = pattern[position + 1:position + 2]
+            if not char or char.isalnum() or char == '_':
+                break  # <- A class or special sequence (e.g., "\\d").
+            length = 2
+        elif char in _regex_special:
+            break
+        if pattern[position + length:position + length + 1] in ('*', '?', '{'):
+            break  # <- The character is optional or repeated.
+        prefix.append(char)
+        position += length
+
+    if not prefix:
+        return None  # <- EXIT!
+    return ''.join(prefix), pattern[position:] in ('', '.*', '.*?')
+
+
+def _looks_numeric(text):
+    """Return True if SQLite could convert *text* to a number (when
+    it is compared to a column with numeric affinity).
+    """
+    try:
+        float(text)
+    except ValueError:
+        return False
+    return True
+
+
+def _compile_regex(column, regex):
+    """Return an SQL condition (and its parameters) that selects the
+    range of text values that begin with the anchored *regex*'s
+    literal prefix (a range can use an index) and True if the range
+    matches the regex exactly. Returns None if the regex has no such
+    prefix.
+    """
+    found = _get_regex_prefix(regex)
+    if not found:
+        return None  # <- EXIT!
+
+    prefix, exact = found
+    if _looks_numeric(prefix):
+        return None  # <- EXIT! (Column affinity could change the bounds.)
+
+    last = ord(prefix[-1])
+    if last == 0x10ffff:
+        condition = '{0} >= ? AND typeof({0})=\'text\''.format(column)
+        return condition, [prefix], exact
+
+    if 0xd800 <= last + 1 <= 0xdfff:
+        last = 0xdfff  # <- Skip surrogates.
+    upper = prefix[:-1] + chr(last + 1)
+    if _looks_numeric(upper):
+        return None  # <- EXIT!
+    condition = '{0} >= ? AND {0} < ?'.format(column)
+    return condition, [prefix, upper], exact
+
+
+def _compile_matcher(column, obj):
+    """Return a tuple of an SQL condition, its parameters and a flag
+    for the predicate matcher made from *obj* (Ellipsis, True, False,
+    a type, NaN or a regular expression). When the flag is False, the
+    condition only narrows the matching values and they must still be
+    tested using a user-defined function. Returns None if *obj* can
+    not be compiled. An empty condition matches all values.
+    """
+    if obj is Ellipsis:
+        return '', [], True
+    if obj is True:
+        return _truthy_sql.format(column), [], True
+    if obj is False:
+        return 'NOT ({0})'.format(_truthy_sql.format(column)), [], True
+    if isinstance(obj, float) and obj != obj:
+        return '0', [], True  # <- SQLite stores NaN as NULL.
+    if isinstance(obj, type):
+        names = [k for k, v in _storage_types if issubclass(v, obj)]
+        if len(names) == len(_storage_types):
+            return '', [], True
+        if not names:
+            return '0', [], True
+        if len(names) == 1:
+            return "typeof({0})='{1}'".format(column, names[0]), [], True
+        names = ', '.join("'{0}'".format(x) for x in names)
+        return 'typeof({0}) IN ({1})'.format(column, names), [], True
+    if isinstance(obj, regex_types):
+        return _compile_regex(column, obj)
+    return None
+
+
+def _compile_predicate(column, predicate):
+    """Return a tuple of an SQL condition, its parameters and a flag
+    (see _compile_matcher()) that matches the same values of *column*
+    as filter(*predicate*) or None if *predicate* can not be compiled
+    (it is then tested with a user-defined function).
+    """
+    if isinstance(predicate, (set, frozenset)):
+        if all(_is_sql_literal(x) for x in predicate):
+            return _compile_literals(column, predicate) + (True,)
+        return None
+    if _is_sql_literal(predicate) and not isinstance(predicate, bool):
+        return _compile_literals(column, [predicate]) + (True,)
+    return _compile_matcher(column, predicate)  # <- True and False are matchers.
+
+
+def _make_where_function(val):
+    """Return a function of one argument that returns True for values
+    matched by the *where* constraint *val* (the same as when *val* is
+    given to Select.__call__()).
+    """
+    if isinstance(val, Set):
+        return lambda x: x in val
+    if callable(val) and not isinstance(val, type):
+        return val
+
+    pred = get_matcher(val)
+    if isinstance(pred, MatcherObject):
+        return pred._func
+    return lambda x: pred == x
+
+
+def _get_load_options(options):
+    """Return a copy of *options* for temptable.load_data() with any
+    *where* constraints replaced by functions.
+    """
+    options = dict(options or {})
+    if options.get('where'):
+        items = options['where'].items()
+        options['where'] = dict((k, _make_where_function(v)) for k, v in items)
+    return options
+
+
+def _load_object(cursor, table, obj, args, kwds, options=None):
+    """Load data from a single *obj* into *table*. The *options* are
+    keyword arguments for temptable.load_data(). When *obj* is a CSV
+    file path, returns a tuple of the encoding used and the byte offset
+    where loading stopped, otherwise returns None.
+    """
+    options = _get_load_options(options)
+    if _is_csv(obj):
+        return load_csv(cursor, table, obj, *args, options=options, **kwds)
+
+    reader = get_reader(obj, *args, **kwds)
+    load_data(cursor, table, reader, **options)
+    return None
+
+
+def _make_list(names):
+    """Return a list of column *names* (a single name can be given
+    as a string) or None if *names* is None.
+    """
+    if names is None:
+        return None
+    if isinstance(names, string_types):
+        return [names]
+    return list(names)
+
+
+def _pop_load_options(kwds):
+    """Remove the loading options used by Select.load_data() from
+    *kwds* and return them in a dictionary. The remaining *kwds*
+    are arguments for the objects' readers.
+    """
+    where = kwds.pop('where', None) or {}
+    for key, val in where.items():
+        _check_where_value(key, val)
+
+    return {
+        'infer_types': kwds.pop('infer_types', False),
+        'include': _make_list(kwds.pop('columns', None)),
+        'exclude': _make_list(kwds.pop('exclude', None)),
+        'where': dict(where),
+        'pipeline': kwds.pop('pipeline', False),
+        'workers': kwds.pop('workers', None),
+        'cache_dir': kwds.pop('cache_dir', None),
+        'encode': kwds.pop('encode', None),
+    }
+
+
+def _index_if_not_exists(statement):
+    """Return the CREATE INDEX *statement* (as stored in sqlite_master)
+    changed to do nothing if the index already exists.
+    """
+    return re.sub(r'^CREATE ((?:UNIQUE )?)INDEX ', r'CREATE \1INDEX IF NOT EXISTS ',
+                  statement, count=1, flags=re.IGNORECASE)
+
+
+def _get_max_rowid(cursor, table):
+    """Return the largest rowid used in *table* (0 if empty)."""
+    if not table_exists(cursor, table):
+        return 0
+    cursor.execute('SELECT IFNULL(MAX(_ROWID_), 0) FROM {0}'.format(table))
+    return cursor.fetchone()[0]
+
+
+try:
+    _replace_file = os.replace  # New in Python 3.3.
+except AttributeError:
+    _replace_file = os.rename
+
+
+def _get_cache_path(cache_dir, path, args, kwds, options):
+    """Return the path of the cache database for the file *path*.
+    The name is a fingerprint made from the file's location, size,
+    modification time and the arguments used to load it.
+    """
+    stat = os.stat(path)
+    fingerprint = repr((
+        os.path.abspath(path),
+        stat.st_size,
+        stat.st_mtime,
+        args,
+        sorted(kwds.items()),
+    ))
+    digest = hashlib.sha1(fingerprint.encode('utf-8'))
+    options = [x for x in sorted(options.items()) if x[0] != 'pipeline']
+    digest.update(pickle.dumps(options, 2))  # <- Pipeline doesn't change data.
+    digest = digest.hexdigest()
+    return os.path.join(cache_dir, '{0}.sqlite3'.format(digest))
+
+
+def _get_category_name(category):
+    """Return the qualified name of the warning class *category*."""
+    return '{0}.{1}'.format(category.__module__, category.__name__)
+
+
+def _get_category(name):
+    """Return the warning class for a name made by _get_category_name()
+    or UserWarning if the class can not be found.
+    """
+    module_name, _, class_name = name.rpartition('.')
+    module = sys.modules.get(module_name)
+    category = getattr(module, class_name, None)
+    if isinstance(category, type) and issubclass(category, UserWarning):
+        return category
+    return UserWarning
+
+
+def _load_worker(task):
+    """Load a file into a new SQLite database at the given path. The
+    loaded data is stored in a table named "data" (omitted when there
+    is no data), the text and category of any user warnings are stored
+    in a table named "warnings", and the CSV state returned by
+    load_csv() is stored in a table named "source". This function can
+    be run in a worker process.
+    """
+    path, directory, obj, args, kwds, options = task
+
+    fd, partial_path = tempfile.mkstemp(suffix='.sqlite3', dir=directory)
+    os.close(fd)
+    connection = sqlite3.connect(partial_path)
+    connection.isolation_level = None
+    try:
+        cursor = connection.cursor()
+        cursor.execute('PRAGMA synchronous=OFF')
+        with savepoint(cursor):
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                table = new_table_name(cursor)
+                csv_state = _load_object(cursor, table, obj, args, kwds,
+                                         options)
+
+            # Copy the temporary table into the database file itself.
+            if table_exists(cursor, table):
+                statement = 'CREATE TABLE main.data AS SELECT * FROM temp.{0}'
+                cursor.execute(statement.format(table))
+
+            # Only user warnings are kept (other categories, like
+            # ResourceWarning, are not shown when loading in sequence).
+            cursor.execute('CREATE TABLE main.warnings (message, category)')
+            cursor.executemany(
+                'INSERT INTO main.warnings VALUES (?, ?)',
+                [(str(x.message), _get_category_name(x.category))
+                 for x in caught if issubclass(x.category, UserWarning)],
+            )
+
+            cursor.execute('CREATE TABLE main.source '
+                           '(encoding, position, header_encoding)')
+            if csv_state:
+                cursor.execute('INSERT INTO main.source VALUES (?, ?, ?)',
+                               csv_state)
+    finally:
+        connection.close()
+
+    _replace_file(partial_path, path)  # <- Never leave a partial file.
+    return path
+
+
+def _load_from_file(cursor, table, path, default='', **options):
+    """Load data from a database file created by _load_worker() and
+    return the stored CSV state (or None). The *options*
+    are keyword arguments for temptable.load_data().
+    """
+    source = sqlite3.connect(path)
+    try:
+        source_cursor = source.cursor()
+        source_cursor.execute('SELECT * FROM warnings')
+        for row in source_cursor.fetchall():
+            category = _get_category(row[1]) if len(row) > 1 else UserWarning
+            warnings.warn(row[0], category)
+
+        if table_exists(source_cursor, 'data'):
+            source_cursor.execute('SELECT * FROM data')
+            columns = [x[0] for x in source_cursor.description]
+            load_data(cursor, table, columns, source_cursor,
+                      default=default, **options)
+
+        source_cursor.execute('SELECT * FROM source')
+        csv_state = source_cursor.fetchone()
+        if csv_state and len(csv_state) < 3:
+            csv_state += (csv_state[0],)  # <- File made by an older version.
+    finally:
+        source.close()
+    return csv_state
+
+
+def _create_union_table(cursor, table, obj_list, args, kwds, options):
+    """Create *table* (or add columns to it) using the union of the
+    headers of the CSV files in *obj_list* so that the table's schema
+    is changed once rather than once for each file. The columns are
+    the same, and in the same order, as when the files are loaded one
+    after another.
+
+    Nothing is done unless *obj_list* contains two or more CSV file
+    paths (and nothing else), types are not being inferred, and every
+    header can be read in advance.
+    """
+    if len(obj_list) < 2 or options.get('infer_types'):
+        return  # <- EXIT!
+    for obj in obj_list:
+        if not isinstance(obj, string_types) or not _is_csv(obj):
+            return  # <- EXIT!
+
+    kwds = dict(kwds)
+    encoding = args[0] if args else kwds.pop('encoding', None)
+    include = options.get('include')
+    exclude = options.get('exclude')
+
+    columns = []
+    seen = set()
+    for path in obj_list:
+        try:
+            header = read_header(path, encoding, **kwds)
+        except Exception:  # <- Errors are raised when the file is loaded.
+            return  # <- EXIT!
+        if header is None:
+            continue
+        if len(set(normalize_names(header))) < len(header):
+            return  # <- EXIT! (Let load_data() handle duplicate names.)
+
+        header = [header[i] for i in project_columns(header, include, exclude)]
+        for column, name in zip(header, normalize_names(header)):
+            if name not in seen:
+                seen.add(name)
+                columns.append(column)
+
+    if not columns:
+        return  # <- EXIT!
+
+    default = kwds.get('restval', '')
+    if table_exists(cursor, table):
+        alter_table(cursor, table, columns, default)
+    else:
+        create_table(cursor, table, columns, default)
+
+
+def _attach_database(cursor, path):
+    """Attach the SQLite database file at *path* to the cursor's
+    connection (at most once per connection and file) and return its
+    schema name. The database is attached in read-only mode using a
+    URI filename. If the connection does not accept URI filenames
+    (Python 2 with an SQLite library built without USE_URI), a
+    warning is shown and the file is attached in read-write mode.
+    Each call should be matched by a call to _detach_database()
+    when the file is no longer used.
+    """
+    path = os.path.abspath(path)
+    key = (cursor.connection, path)
+    if key in _attached_databases:
+        _attached_users[key] += 1
+        return _attached_databases[key]  # <- EXIT!
+
+    if not os.path.isfile(path):
+        raise FileNotFoundError('no such file: {0!r}'.format(path))
+
+    cursor.execute('PRAGMA compile_options')
+    options = [x[0] for x in cursor.fetchall()]
+    if _uri_kwds or 'USE_URI' in options or 'USE_URI=1' in options:
+        filename = 'file:{0}?mode=ro'.format(pathname2url(path))
+    else:
+        msg = ('SQLite URI filenames are not supported, {0!r} can not '
+               'be attached in read-only mode').format(path)
+        warnings.warn(msg)
+        filename = path
+
+    name = next(_database_name_gen)
+    cursor.execute('ATTACH DATABASE ? AS {0}'.format(name), (filename,))
+    _attached_databases[key] = name
+    _attached_users[key] = 1
+    return name
+
+
+def _detach_database(cursor, path):
+    """Detach the database file at *path* from the cursor's
+    connection once it is no longer used (see _attach_database()).
+    """
+    key = (cursor.connection, os.path.abspath(path))
+    if key not in _attached_databases:
+        return  # <- EXIT!
+    if _attached_users[key] > 1:
+        _attached_users[key] -= 1
+        return  # <- EXIT!
+    cursor.execute('DETACH DATABASE {0}'.format(_attached_databases[key]))
+    del _attached_databases[key]
+    del _attached_users[key]
+
+
+_snapshot_files = set()  # Snapshot files made by this process.
+
+
+@atexit.register
+def _remove_snapshot_files():
+    """Remove snapshot files of Selects that were not closed."""
+    while _snapshot_files:
+        try:
+            os.remove(_snapshot_files.pop())
+        except OSError:
+            pass
+
+
+def _add_schema(statement, schema):
+    """Return the CREATE TABLE or CREATE INDEX *statement* (as stored
+    in sqlite_master) changed to create its object in *schema*.
+    """
+    return re.sub(r'^(CREATE (?:UNIQUE )?(?:TABLE|INDEX) )',
+                  r'\g<1>{0}.'.format(schema), statement)
+
+
+def _write_snapshot(cursor, tables):
+    """Copy *tables* (and their indexes) into a new database file and
+    return its path (see Select.__getstate__()).
+    """
+    fd, path = tempfile.mkstemp(suffix='.sqlite3')
+    os.close(fd)
+    _snapshot_files.add(path)
+
+    schema = next(_database_name_gen)
+    cursor.execute('ATTACH DATABASE ? AS {0}'.format(schema), (path,))
+    try:
+        with savepoint(cursor):
+            for table in tables:
+                cursor.execute(
+                    "SELECT sql FROM sqlite_master WHERE type='table' AND name=? "
+                    "UNION ALL "
+                    "SELECT sql FROM sqlite_temp_master WHERE type='table' AND name=?",
+                    (table, table),
+                )
+                cursor.execute(_add_schema(cursor.fetchone()[0], schema))
+                statement = 'INSERT INTO {0}.{1} SELECT * FROM {1}'
+                cursor.execute(statement.format(schema, table))
+                for statement in get_index_statements(cursor, table):
+                    cursor.execute(_add_schema(statement, schema))
+    finally:
+        cursor.execute('DETACH DATABASE {0}'.format(schema))
+    return path
+
+
+def _get_column_stats(cursor, table, start_rowid=0, exprs=None):
+    """Return a dictionary of statistics for each column of *table*
+    using the rows after *start_rowid*. The values are computed with
+    a single pass over the rows. If given, *exprs* should be a mapping
+    of column names and SQL expressions used in place of the columns.
+    When *start_rowid* is 0, all rows are used (this also works for
+    views, which have no rowid).
+    """
+    cursor.execute('PRAGMA table_info({0})'.format(table))
+    columns = [x[1] for x in cursor.fetchall()]
+    if not columns:
+        return {}  # <- EXIT!
+
+    exprs = exprs or {}
+    aggregates = []
+    for column, name in zip(columns, normalize_names(columns)):
+        name = exprs.get(column, name)
+        aggregates.append(
+            "COUNT({0}), IFNULL(SUM({0} IS NULL OR {0} = ''), 0), "
+            "MIN({0}), MAX({0})".format(name)
+        )
+    statement = 'SELECT {0} FROM {1}'.format(', '.join(aggregates), table)
+    if start_rowid:
+        cursor.execute(statement + ' WHERE _ROWID_ > ?', (start_rowid,))
+    else:
+        cursor.execute(statement)
+    row = cursor.fetchone()
+
+    stats = {}
+    for index, column in enumerate(columns):
+        count, empty, min_value, max_value = row[index * 4:index * 4 + 4]
+        stats[column] = {
+            'count': count,
+            'empty': empty,
+            'min': min_value,
+            'max': max_value,
+            'distinct': None,  # <- Computed when requested (see stats()).
+        }
+    return stats
+
+
+def _merge_column_stats(stats, new_stats):
+    """Return a new dictionary of statistics combining the given
+    *stats* and *new_stats* (made from rows that were added later).
+    """
+    merged = {}
+    for column, new in new_stats.items():
+        old = stats.get(column)
+        if old is None:
+            merged[column] = dict(new)
+            continue
+
+        values = [x for x in (old['min'], new['min']) if x is not None]
+        min_value = min(values, key=_sqlite_sortkey) if values else None
+        values = [x for x in (old['max'], new['max']) if x is not None]
+        max_value = max(values, key=_sqlite_sortkey) if values else None
+        merged[column] = {
+            'count': old['count'] + new['count'],
+            'empty': old['empty'] + new['empty'],
+            'min': min_value,
+            'max': max_value,
+            'distinct': None,
+        }
+    return merged
+
+
+def _is_picklable(obj):
+    """Return True if *obj* can be pickled."""
+    try:
+        pickle.dumps(obj, 2)
+    except Exception:  # <- Errors vary by object and Python version.
+        return False
+    return True
+
+
+def _has_function(value):
+    """Return True if the predicate *value* is or contains a callable
+    object (a function, Predicate, etc.).
+    """
+    if callable(value):
+        return True
+    if isinstance(value, tuple):
+        return any(_has_function(x) for x in value)
+    return False
+
+
+def _load_objects(cursor, table, obj_list, args, kwds, options,
+                  workers=None, cache_dir=None):
+    """Load objects from *obj_list* into *table* using the *options*
+    for temptable.load_data().
+
+    If *workers* is greater than 1, file paths are parsed using a
+    pool of worker processes. If *cache_dir* is given, loaded files
+    are kept in the cache directory and later loads of an unchanged
+    file (using the same arguments) are read from the cache instead
+    of being parsed again. In either case, data is inserted in the
+    original order of *obj_list*. Workers and caching are not used when
+    the *options* can not be pickled (e.g., *where* uses a lambda).
+    Caching is also not used when *where* uses a function: functions
+    are pickled by name so a changed function would match the cache.
+
+    Returns a list of tuples--one for each object--containing the
+    object, the first and last rowid of its rows, and the encoding
+    and byte offset returned by load_csv() (or None).
+    """
+    _create_union_table(cursor, table, obj_list, args, kwds, options)
+
+    loaded = []
+    paths = [x for x in obj_list if isinstance(x, string_types)]
+    parallel = workers and workers > 1 and len(paths) > 1
+    if (parallel or cache_dir) and not _is_picklable(options):
+        parallel = cache_dir = None  # <- Options can not be sent to workers.
+    where = options.get('where') or {}
+    if cache_dir and any(_has_function(x) for x in where.values()):
+        cache_dir = None  # <- Functions are pickled by name only.
+    if not parallel and not (cache_dir and paths):
+        for obj in obj_list:
+            first = _get_max_rowid(cursor, table) + 1
+            csv_state = _load_object(cursor, table, obj, args, kwds, options)
+            loaded.append((obj, first, _get_max_rowid(cursor, table), csv_state))
+        return loaded  # <- EXIT!
+
+    if cache_dir and not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    directory = tempfile.mkdtemp(dir=cache_dir)  # <- Working directory.
+
+    # Types are inferred and values are encoded when loading from the
+    # worker's database so that they behave the same as when loading
+    # directly (and so the Select's codes are updated in this process).
+    worker_options = dict(options)
+    final_options = {}
+    for key in ('infer_types', 'encode', 'auto_encode'):
+        if key in worker_options:
+            final_options[key] = worker_options.pop(key)
+
+    pool = multiprocessing.Pool(workers) if parallel else None
+    try:
+        targets = []
+        for index, obj in enumerate(paths):
+            if cache_dir:
+                target = _get_cache_path(cache_dir, obj, args, kwds,
+                                         worker_options)
+            else:
+                target = os.path.join(directory, 'src{0}.sqlite3'.format(index))
+            targets.append(target)
+
+        tasks = [(target, directory, obj, args, kwds, worker_options)
+                 for target, obj in zip(targets, paths)
+                 if not os.path.exists(target)]
+        if pool:
+            results = pool.imap(_load_worker, tasks)
+        else:
+            results = (_load_worker(task) for task in tasks)
+        results = iter(results)
+        pending = set(task[0] for task in tasks)
+
+        targets = iter(targets)
+        for obj in obj_list:
+            first = _get_max_rowid(cursor, table) + 1
+            if isinstance(obj, string_types):
+                target = next(targets)
+                while target in pending:
+                    pending.discard(next(results))
+
+                default = kwds.get('restval', '') if _is_csv(obj) else ''
+                csv_state = _load_from_file(cursor, table, target,
+                                            default, **final_options)
+            else:
+                csv_state = _load_object(cursor, table, obj, args, kwds,
+                                         options)
+            loaded.append((obj, first, _get_max_rowid(cursor, table), csv_state))
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        shutil.rmtree(directory, ignore_errors=True)
+    return loaded
+
+
+def _get_fingerprint(obj):
+    """Return a hashable key for the *where* condition *obj*. Equal
+    keys are made for conditions that match the same values--e.g.,
+    two regular expressions with the same pattern or two functions
+    made from the same code, in the same module, with the same closure
+    values and defaults. If no key can be made, the key uses the
+    object's identity.
+    """
+    if isinstance(obj, Predicate):
+        inner = _get_fingerprint(obj.obj)
+        return (type(obj), inner, obj._inverted)  # <- EXIT!
+
+    if isinstance(obj, tuple):
+        key = (tuple, tuple(_get_fingerprint(x) for x in obj))
+    elif isinstance(obj, (set, frozenset)):
+        key = (frozenset, frozenset(_get_fingerprint(x) for x in obj))
+    elif isinstance(obj, types.FunctionType):
+        closure = tuple(_get_fingerprint(x.cell_contents)
+                        for x in obj.__closure__ or ())
+        defaults = tuple(_get_fingerprint(x) for x in obj.__defaults__ or ())
+        kwdefaults = getattr(obj, '__kwdefaults__', None) or {}  # <- New in 3.0.
+        kwdefaults = tuple(sorted(
+            (k, _get_fingerprint(v)) for k, v in kwdefaults.items()))
+        key = (types.FunctionType, obj.__code__, id(obj.__globals__),
+               closure, defaults, kwdefaults)
+    else:
+        key = (type(obj), obj)
+
+    try:
+        hash(key)
+    except TypeError:
+        return ('id', id(obj))
+    return key
+
+
+class _FunctionRegistry(object):
+    """The user-defined functions registered with a connection. The
+    *setter* should be a function of a name and a function that
+    registers the function (or unregisters it when given None).
+
+    Functions are stored by key (see _get_fingerprint()) so Selects
+    using equivalent conditions share a single SQLite function. Each
+    function also has a count of the Selects using it and is
+    unregistered when the count drops to zero (see _Resources). When
+    more than MAX_USER_FUNCTIONS are registered, the least recently
+    used functions that no Select uses are unregistered (functions
+    in use are never evicted, see Select._use_function()).
+
+    SQLite can not unregister a function while a statement is in
+    progress, so failed unregistrations are tried again later.
+    """
+    def __init__(self, setter, lock):
+        self._setter = setter
+        self.lock = lock
+        self._entries = collections.OrderedDict()  # Oldest first.
+        self._unregistered = []  # Names still to be unregistered.
+
+    def get(self, key):
+        """Return the name of the function stored under *key* (or
+        None) and mark it as the most recently used.
+        """
+        with self.lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self._entries[key] = entry
+            return entry['name']
+
+    def add(self, key, func, keyref=None):
+        """Register *func* under *key* and return its new name. The
+        *keyref* is kept so that an identity-based key can not be
+        reused by another object.
+        """
+        with self.lock:
+            if key in self._entries:
+                raise ValueError('function {0!r} already registered'.format(func))
+            name = next(_user_function_name_gen)
+            self._setter(name, func)  # <- Register!
+            self._entries[key] = {'name': name, 'func': func,
+                                  'keyref': keyref, 'users': 0}
+            excess = len(self._entries) - MAX_USER_FUNCTIONS
+            unused = [k for k, v in self._entries.items()
+                      if not v['users'] and k != key]
+            for old_key in unused[:max(excess, 0)]:
+                self._unregister(self._entries.pop(old_key)['name'])
+            return name
+
+    def add_user(self, key):
+        with self.lock:
+            if key in self._entries:
+                self._entries[key]['users'] += 1
+
+    def remove_user(self, key):
+        """Decrement the count of Selects using the function stored
+        under *key* and unregister it if the count drops to zero.
+        """
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return  # <- EXIT! (Already unregistered.)
+            entry['users'] -= 1
+            if entry['users'] <= 0:
+                del self._entries[key]
+                self._unregister(entry['name'])
+
+    def _unregister(self, name):
+        """Unregister the function *name* along with any functions
+        that could not be unregistered by earlier calls.
+        """
+        self._unregistered.append(name)
+        failed = []
+        for name in self._unregistered:
+            try:
+                self._setter(name, None)  # <- Unregister!
+            except sqlite3.Error:
+                failed.append(name)  # <- A statement is in progress.
+        self._unregistered = failed
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_default_registry = _FunctionRegistry(
+    lambda name, func: DEFAULT_CONNECTION.create_function(name, 1, func),
+    _default_lock,
+)
+
+
+class _SharedConnection(sqlite3.Connection):
+    """Connection that creates tables in its main database rather
+    than as temporary tables (see temptable.get_table_keyword()).
+    """
+    shared_tables = True
+
+
+class _SharedDatabase(object):
+    """A temporary database file used by Selects that were created
+    with *concurrent* set to True. Data is written using a single
+    connection (while holding *lock*) and each thread reads using a
+    connection of its own. The database uses WAL mode so readers do
+    not block each other or the writer.
+    """
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        self.pid = os.getpid()
+        self.lock = threading.RLock()
+        self.writer = self._connect(check_same_thread=False)
+        self.writer.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        self.writer.execute('PRAGMA journal_mode=WAL')
+        self._functions = {}  # User-defined functions (by name).
+        self._version = 0  # Incremented when _functions is changed.
+        self._local = threading.local()
+        self.registry = _FunctionRegistry(self._set_function, self.lock)
+
+    def _connect(self, **kwds):
+        kwds.update(_uri_kwds)
+        connection = sqlite3.connect(self.path, factory=_SharedConnection, **kwds)
+        connection.execute('PRAGMA synchronous=OFF')
+        connection.isolation_level = None  # <- Run in 'autocommit' mode.
+        return connection
+
+    def create_function(self, name, func):
+        """Register a user-defined function of one argument with the
+        writer and (as they are used) with each reader connection.
+        """
+        with self.lock:
+            self.writer.create_function(name, 1, func)
+            self._functions[name] = func
+            self._version += 1
+
+    def remove_function(self, name):
+        """Unregister a function added with create_function()."""
+        with self.lock:
+            self.writer.create_function(name, 1, None)
+            self._functions.pop(name, None)
+            self._version += 1
+
+    def _set_function(self, name, func):
+        if func is None:
+            self.remove_function(name)
+        else:
+            self.create_function(name, func)
+
+    def get_reader(self):
+        """Return the read connection for the calling thread."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._connect()
+            connection.execute('PRAGMA query_only=ON')
+            self._local.connection = connection
+            self._local.functions = set()
+            self._local.version = 0
+
+        if self._local.version != self._version:
+            with self.lock:
+                functions = dict(self._functions)
+                version = self._version
+            for name in self._local.functions.difference(functions):
+                connection.create_function(name, 1, None)
+            for name, func in functions.items():
+                if name not in self._local.functions:
+                    connection.create_function(name, 1, func)
+            self._local.functions = set(functions)
+            self._local.version = version
+        return connection
+
+    def close(self):
+        """Close the writer connection and remove the database file."""
+        if self.pid != os.getpid():
+            return  # <- EXIT! (Owned by the parent of a forked process.)
+        self.writer.close()
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(self.path + suffix)
+            except OSError:
+                pass
+
+
+_shared_database = None
+_shared_database_lock = threading.Lock()
+
+
+def _get_shared_database():
+    """Return the _SharedDatabase used by concurrent Selects (it is
+    created when first needed and removed when Python exits).
+    """
+    global _shared_database
+    with _shared_database_lock:
+        if _shared_database is None:
+            _shared_database = _SharedDatabase()
+            atexit.register(_shared_database.close)
+    return _shared_database
+
+
+def _incremental_vacuum(cursor, schema):
+    """Return the free pages of the database *schema* to the file
+    system (if it uses incremental auto-vacuum).
+    """
+    cursor.execute('PRAGMA {0}.auto_vacuum'.format(schema))
+    if cursor.fetchone()[0] != 2:  # <- 2 is INCREMENTAL.
+        return  # <- EXIT!
+
+    previous = None
+    while True:
+        cursor.execute('PRAGMA {0}.freelist_count'.format(schema))
+        pages = cursor.fetchone()[0]
+        if not pages or pages == previous:
+            break
+        previous = pages
+        # Each step of the statement frees one page. The sqlite3
+        # module steps statements that return no rows only once.
+        for _ in range(pages):
+            cursor.execute('PRAGMA {0}.incremental_vacuum'.format(schema))
+
+
+class _Resources(object):
+    """The names of the tables, views, user-defined functions, attached
+    databases and snapshot files that belong to a Select. They are
+    kept apart from the Select so they can still be released after
+    the Select is garbage collected.
+    """
+    def __init__(self, connection, lock, registry, shared=None):
+        self.connection = connection
+        self.lock = lock
+        self.registry = registry
+        self.shared = shared
+        self.pid = os.getpid()
+        self.tables = set()
+        self.views = set()
+        self.functions = set()  # Keys of functions in the registry.
+        self.databases = set()  # Paths of attached database files.
+        self.files = set()  # Paths of snapshot files.
+
+    def release(self, vacuum=False):
+        """Drop the tables (and their indexes) and views, release the
+        functions (they are unregistered unless another Select uses
+        them), detach databases, remove snapshot files, and if *vacuum*
+        is True, return free pages to the file system. Nothing is done
+        in a forked process (the resources belong to its parent).
+        Raises sqlite3.ProgrammingError if DEFAULT_CONNECTION would
+        be used by another thread.
+        """
+        if self.pid != os.getpid():
+            return  # <- EXIT!
+        if not self.shared:
+            _check_default_thread()
+
+        with self.lock:
+            cursor = self.connection.cursor()
+            for view in sorted(self.views):
+                cursor.execute('DROP VIEW IF EXISTS {0}'.format(view))
+                self.views.discard(view)
+            for path in list(self.databases):
+                _detach_database(cursor, path)
+                self.databases.discard(path)
+            for path in list(self.files):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                _snapshot_files.discard(path)
+                self.files.discard(path)
+            for table in sorted(self.tables):
+                cursor.execute('DROP TABLE IF EXISTS {0}'.format(table))
+                self.tables.discard(table)
+            for key in list(self.functions):
+                self.registry.remove_user(key)
+                self.functions.discard(key)
+            if vacuum:
+                _incremental_vacuum(cursor, 'main' if self.shared else 'temp')
+
+
+_finalizers = set()  # Weak references to open Selects.
+_collected = []  # Resources of collected Selects waiting to be released.
+
+
+def _add_finalizer(select, resources):
+    """Make sure the *resources* of *select* are released after it is
+    garbage collected. Releasing is done by _release_collected() (not
+    during garbage collection, which can happen at any time and in
+    any thread).
+    """
+    def finalize(ref):
+        _finalizers.discard(ref)
+        _collected.append(resources)
+    _finalizers.add(weakref.ref(select, finalize))
+
+
+def _release_collected():
+    """Release resources of garbage collected Selects. Resources that
+    can not be released now (e.g., their connection is being used by
+    a query or belongs to another thread) are kept for a later call.
+    """
+    failed = []
+    while _collected:
+        resources = _collected.pop()
+        try:
+            resources.release()
+        except sqlite3.Error:
+            failed.append(resources)
+    _collected.extend(failed)
+
+
+def _check_fork():
+    """Replace DEFAULT_CONNECTION (and the objects that belong to it)
+    if running in a forked child process. A connection and its temp
+    files can not be shared by two processes.
+    """
+    global DEFAULT_CONNECTION
+    global _process_id
+    global _default_thread
+    global _default_lock
+    global _default_registry
+    global _shared_database
+    global _shared_database_lock
+
+    if _process_id == os.getpid():
+        return  # <- EXIT!
+
+    DEFAULT_CONNECTION = _new_default_connection()
+    _process_id = os.getpid()
+    _default_thread = threading.current_thread()
+    _default_lock = threading.RLock()
+    _default_registry = _FunctionRegistry(
+        lambda name, func: DEFAULT_CONNECTION.create_function(name, 1, func),
+        _default_lock,
+    )
+    _shared_database = None
+    _shared_database_lock = threading.Lock()
+    _attached_databases.clear()
+    _attached_users.clear()
+    _snapshot_files.clear()
+    _finalizers.clear()
+    del _collected[:]
+
+
+def _write_locked(method):
+    """Decorator for Select methods that change the database. The
+    Select's lock is held while *method* runs, its snapshot is
+    discarded (see Select.__getstate__()) and its cached field
+    names are invalidated (see Select._get_schema()).
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwds):
+        self._check_process()
+        with self._lock:
+            self._snapshot = None
+            try:
+                return method(self, *args, **kwds)
+            finally:
+                self._schema_version += 1
+    return wrapper
+
+
+class _FileSource(object):
+    """Bookkeeping for a file path loaded into a Select. Keeps the
+    rowid ranges of the file's rows and a signature used to detect
+    changes to the file. A CSV file whose last line was loaded without
+    a line ending has no byte offset (see load_csv()) so, like other
+    files, it is reloaded when it changes.
+    """
+    signature_size = 1024
+
+    def __init__(self, path, args, kwds, options):
+        self.path = path
+        self.args = args
+        self.kwds = kwds
+        self.options = options
+        self.rowids = []  # <- List of (first, last) rowid ranges.
+        self.encoding = None
+        self.position = None
+        self.header_encoding = None
+        self.signature = None
+
+    def update(self, first, last, csv_state):
+        """Record rows and the CSV state from a completed load."""
+        if last >= first:
+            self.rowids.append((first, last))
+        csv_state = csv_state or (None, None, None)
+        self.encoding, self.position, self.header_encoding = csv_state
+        self.signature = self.get_signature()
+
+    def get_signature(self):
+        """Return the first and last bytes that were loaded from a CSV
+        file or, for other files, return the file's size and mtime.
+        """
+        if self.position is None:
+            stat = os.stat(self.path)
+            return (stat.st_size, stat.st_mtime)
+
+        size = min(self.position, self.signature_size)
+        with open(self.path, 'rb') as fh:
+            head = fh.read(size)
+            fh.seek(self.position - size)
+            tail = fh.read(size)
+        return (head, tail)
+
+    def get_change(self):
+        """Return 'append' if rows were appended to a CSV file, 'reload'
+        if the file was truncated or rewritten, or None if unchanged.
+        """
+        if self.position is None:
+            return 'reload' if self.get_signature() != self.signature else None
+
+        size = os.stat(self.path).st_size
+        if size < self.position or self.get_signature() != self.signature:
+            return 'reload'
+        if size > self.position:
+            return 'append' if self.position else 'reload'
+        return None
+
 
 class Select(object):
     """A class to quickly load and select tabular data. The given
@@ -90,13 +1383,51 @@ class Select(object):
     Load multple files using a shell-style wildcard::
 
         select = squint.Select('*.csv')
+
+    By default, a Select can only be used by the thread that imported
+    squint. When *concurrent* is True, the data is stored in a shared
+    database file (using SQLite's WAL mode) and each thread queries
+    it using a connection of its own, so queries from several threads
+    can run at the same time::
+
+        select = squint.Select('myfile.csv', concurrent=True)
+
+    Loading data into a concurrent Select is still done by one thread
+    at a time.
+
+    A Select can be pickled to pass it to other processes (e.g., to
+    run queries in a :mod:`multiprocessing` pool). Its data is copied
+    into a read-only snapshot file and the unpickled Select reads
+    from the snapshot (it is opened when the Select is first used)::
+
+        with multiprocessing.Pool() as pool:
+            results = pool.map(run_query, [select('A'), select('B')])
+
+    The snapshot is reused until the Select is changed and is removed
+    when the Select is closed. A Select made with :meth:`from_sqlite`
+    is pickled as a reference to its original file. Selects can not
+    be used by a forked process that inherited them (pickle them
+    instead).
     """
     def __init__(self, objs=None, *args, **kwds):
         """Initialize self."""
-        self._connection = DEFAULT_CONNECTION
-        self._user_function_dict = dict()  # User-defined SQLite functions.
-        self._table = None  # Table name.
-        self._obj_strings = []  # Strings for repr().
+        _check_fork()
+        if kwds.pop('concurrent', False):
+            self._shared = _get_shared_database()
+            self._connection = self._shared.writer
+            self._lock = self._shared.lock
+        else:
+            self._shared = None
+            self._connection = DEFAULT_CONNECTION
+            self._lock = _default_lock
+        self._registry = self._shared.registry if self._shared else _default_registry
+        self._resources = _Resources(self._connection, self._lock,
+                                     self._registry, self._shared)
+        _add_finalizer(self, self._resources)
+        _release_collected()
+        self._schema_version = 0  # Incremented when the table changes.
+        self._bulk_depth = 0  # Nesting level of bulk_load() (not reset).
+        self._reset()
         if objs:
             try:
                 self.load_data(objs, *args, **kwds)
@@ -104,6 +1435,227 @@ class Select(object):
                 __tracebackhide__ = True
                 raise
 
+    def _reset(self):
+        """Set the Select's attributes to those of an empty Select."""
+        self._user_function_dict = collections.OrderedDict()  # UDFs, oldest first.
+        self._table = None  # Table name.
+        self._obj_strings = []  # Strings for repr().
+        self._sources = []  # File paths that can be refreshed.
+        self._is_view = False  # True when _table is a view (see from_sqlite).
+        self._stats = {}  # Column statistics (None when must be rebuilt).
+        self._stats_start = None  # Rows not yet in _stats (see _mark_stats).
+        self._codes = {}  # Codes of dictionary encoded columns (by column).
+        self._code_tables = {}  # Code table names (by column).
+        self._deferred_indexes = []  # Statements to re-create indexes.
+        self._pending = []  # Loads deferred with lazy=True.
+        self._pending_names = None  # Cached names (see _get_pending_fieldnames).
+        self._view_source = None  # (path, table, code tables) of a view.
+        self._snapshot = None  # Snapshot file path (see __getstate__).
+        self._reopen_state = None  # Unpickled state (see __setstate__).
+        self._schema = None  # Cached field names (see _get_schema).
+
+    def close(self, vacuum=False):
+        """Drop the Select's tables (and their indexes) and unregister
+        the functions it made for *where* conditions. The Select is
+        left empty and can be loaded again::
+
+            select = squint.Select('myfile.csv')
+            ...
+            select.close()
+
+        Tables are also dropped once a Select is garbage collected
+        (the next time a Select is created) but closing the Select
+        releases them right away. A Select can be used as a context
+        manager to close it when the block exits::
+
+            with squint.Select('myfile.csv') as select:
+                ...
+
+        When *vacuum* is True, the pages freed by dropping the tables
+        are returned to the file system (otherwise they are reused
+        by later tables).
+        """
+        if self._resources.pid == os.getpid():
+            self._check_process()  # <- Inherited Selects are just reset.
+        with self._lock:
+            self._resources.release(vacuum)
+            self._reset()
+        _release_collected()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @classmethod
+    def from_sqlite(cls, path, table):
+        """Create a Select that reads *table* directly from the SQLite
+        database file at *path*. The database is attached to the
+        Select's connection and queries run against the original
+        table---no data is copied::
+
+            select = squint.Select.from_sqlite('mydata.sqlite3', 'mytable')
+
+        The file itself is never modified. If data is later added
+        with :meth:`load_data` (or an index is created), the table
+        is first copied into a temporary table.
+        """
+        select = cls()
+        select._check_process()
+        cursor = select._connection.cursor()
+        schema = _attach_database(cursor, path)
+        select._resources.databases.add(path)
+        cursor.execute(
+            "SELECT name FROM {0}.sqlite_master "
+            "WHERE type IN ('table', 'view') AND name=?".format(schema),
+            (table,),
+        )
+        if not cursor.fetchall():
+            msg = 'no such table: {0!r} in {1!r}'.format(table, path)
+            raise sqlite3.OperationalError(msg)
+
+        select._table = select._create_view(cursor, schema, table)
+        select._is_view = True
+        select._view_source = (path, table, {})
+        select._stats = None  # <- Always computed from the attached table.
+        select._append_obj_string((path, table))
+        return select
+
+    def _create_view(self, cursor, schema, table):
+        """Create a temporary view of *table* in the attached database
+        *schema* and return the view's name.
+        """
+        view = new_table_name(cursor)
+        statement = 'CREATE TEMPORARY VIEW {0} AS SELECT * FROM {1}.{2}'
+        cursor.execute(statement.format(view, schema, normalize_names(table)))
+        self._resources.views.add(view)
+        return view
+
+    def _copy_view(self, cursor):
+        """If the Select reads from a view of an attached table (see
+        from_sqlite() and __setstate__()), replace the view and the
+        views of its code tables with temporary tables that contain
+        a copy of their data.
+        """
+        if not self._is_view:
+            return  # <- EXIT!
+
+        views = [self._table] + [x for x in self._code_tables.values()
+                                 if x in self._resources.views]
+        copies = {}
+        with savepoint(cursor):
+            for view in views:
+                table = new_table_name(cursor)
+                if view == self._table:
+                    statement = 'CREATE TEMPORARY TABLE {0} AS SELECT * FROM {1}'
+                    cursor.execute(statement.format(table, view))
+                else:
+                    statement = 'CREATE TEMPORARY TABLE {0} (code INTEGER PRIMARY KEY, value)'
+                    cursor.execute(statement.format(table))
+                    statement = 'INSERT INTO {0} (code, value) SELECT code, value FROM {1}'
+                    cursor.execute(statement.format(table, view))
+                cursor.execute('DROP VIEW {0}'.format(view))
+                copies[view] = table
+
+        for view, table in copies.items():
+            self._resources.views.discard(view)
+            self._resources.tables.add(table)
+        self._code_tables = dict((k, copies.get(v, v))
+                                 for k, v in self._code_tables.items())
+        self._table = copies[self._table]
+        self._is_view = False
+        self._view_source = None
+
+        for path in list(self._resources.databases):  # <- No longer used.
+            try:
+                _detach_database(cursor, path)
+            except sqlite3.OperationalError:
+                continue  # <- A statement is in progress, detach on close().
+            self._resources.databases.discard(path)
+
+    def __getstate__(self):
+        """Return the Select's state for pickling. The Select's tables
+        are written to a snapshot file the first time it is pickled
+        (the snapshot is reused until the Select is changed). A view
+        (see from_sqlite()) refers to its original database instead.
+
+        This is the only method that can use DEFAULT_CONNECTION from
+        another thread (e.g., the task handler thread of a process
+        pool). The Select's lock keeps it from running during a load
+        or another change.
+        """
+        self._check_process(check_thread=False)
+        if self._reopen_state and not self._pending:
+            return dict(self._reopen_state)  # <- EXIT! (Not yet reopened.)
+
+        with self._lock:
+            self._load_pending()
+            cursor = self._connection.cursor()
+            cursor.execute('PRAGMA table_info({0})'.format(self._table))
+            fieldnames = [x[1] for x in cursor.fetchall()]
+            if self._view_source:
+                path, table, code_tables = self._view_source
+            elif self._table:
+                if not self._snapshot:
+                    tables = [self._table] + sorted(self._code_tables.values())
+                    self._snapshot = _write_snapshot(cursor, tables)
+                    self._resources.files.add(self._snapshot)
+                path, table, code_tables = self._snapshot, self._table, self._code_tables
+            else:
+                path, table, code_tables = None, None, {}
+
+            return {
+                'path': path,
+                'table': table,
+                'code_tables': dict(code_tables),
+                'codes': self._save_codes()[0],
+                'stats': self._stats if self._stats_start is None else None,
+                'fieldnames': fieldnames,
+                'obj_strings': list(self._obj_strings),
+            }
+
+    def __setstate__(self, state):
+        """Initialize self from a pickled state (see __getstate__()).
+        The snapshot is attached when the Select is first used.
+        """
+        self.__init__()
+        self._obj_strings = list(state['obj_strings'])
+        if state['table']:
+            self._reopen_state = state
+
+    def _reopen(self):
+        """Create views of the tables in the snapshot of an unpickled
+        Select (see __setstate__()).
+        """
+        state = self._reopen_state
+        path = state['path']
+        cursor = self._connection.cursor()
+        schema = _attach_database(cursor, path)
+        self._resources.databases.add(path)
+        self._table = self._create_view(cursor, schema, state['table'])
+        for column, table in state['code_tables'].items():
+            self._code_tables[column] = self._create_view(cursor, schema, table)
+        self._codes = state['codes']
+        self._stats = state['stats']
+        self._is_view = True
+        self._view_source = (path, state['table'], state['code_tables'])
+        self._reopen_state = None
+
+    def _check_process(self, check_thread=True):
+        """Raise an error if the Select was inherited by a forked
+        process (its connection belongs to the parent process) or,
+        when *check_thread* is True, if DEFAULT_CONNECTION is used
+        by another thread (see *concurrent* for multi-threaded use).
+        """
+        if self._resources.pid != os.getpid():
+            msg = ('Select was created by another process, use pickle '
+                   'to pass a Select to other processes')
+            raise RuntimeError(msg)
+
+        if check_thread and not self._shared:
+            _check_default_thread()
+
     def load_data(self, objs, *args, **kwds):
         """Load data from one or more objects into the Select. The
         given *objs*, *\\*args*, and *\\*\\*kwds*, can be any values
@@ -123,6 +1675,86 @@ class Select(object):
 
             select = squint.Select('myfile1.csv')
             select.load_data(['myfile2.csv', 'myfile3.csv'])
+
+        CSV files compressed with gzip, bzip2 or xz (named with a
+        ".csv.gz", ".csv.bz2" or ".csv.xz" extension) are decompressed
+        as they are loaded::
+
+            select = squint.Select('myfile.csv.gz')
+
+        By default, values are stored as they are read (CSV values
+        are stored as text). When *infer_types* is True, column types
+        are inferred from the first rows of each source and numeric
+        values are stored as INTEGER or REAL values::
+
+            select = squint.Select('myfile.csv', infer_types=True)
+
+        If a later row contains a value that does not fit the inferred
+        type, the column is widened so that no values are altered.
+
+        When loading many files, *workers* can be given to parse the
+        files in a pool of worker processes. The resulting table is
+        the same as when files are loaded one after another::
+
+            select = squint.Select('*.csv', workers=4)
+
+        Files that are loaded repeatedly can be cached by giving a
+        *cache_dir* directory. A loaded file is kept in the cache and
+        when the same file is loaded again (unmodified and using the
+        same arguments), its data is read from the cache instead of
+        being parsed::
+
+            select = squint.Select('big.csv', cache_dir='.squint_cache')
+
+        To load only some of the columns, give a list of *columns* to
+        keep or a list of columns to *exclude*. Other columns are
+        discarded while loading and do not appear in :attr:`fieldnames`::
+
+            select = squint.Select('myfile.csv', columns=['A', 'B'])
+
+        To load only some of the rows, give a dictionary of *where*
+        constraints. Constraints use the same predicate matching as
+        :meth:`__call__ <Select.__call__>` and rows that do not match
+        are never inserted::
+
+            select = squint.Select('myfile.csv', where={'region': 'west'})
+
+        Constraints are tested against values as they are read (before
+        any *infer_types* conversion). A source without a constrained
+        column is tested using an empty string in its place.
+
+        Indexes made with :meth:`create_index` are dropped while new
+        rows are inserted and are rebuilt once the data is loaded. Use
+        :meth:`bulk_load` to rebuild them once for several loads.
+
+        When *pipeline* is True, records are parsed in a background
+        thread while earlier records are being inserted. The number of
+        records loaded per second is logged (at the DEBUG level) to the
+        ``squint._vendor.temptable`` logger::
+
+            select = squint.Select('big.csv', pipeline=True)
+
+        Columns that repeat a few values many times (like "country"
+        or "status") can be stored using *encode*. Each distinct value
+        is stored once in a separate code table and the column holds
+        integer codes. Queries decode values automatically and *where*
+        conditions are tested once for each distinct value::
+
+            select = squint.Select('big.csv', encode=['country', 'status'])
+
+        When *encode* is True, new columns that contain few distinct
+        text values in their first rows are encoded. Once a column is
+        encoded, later loads encode it too. A column that was already
+        loaded without encoding cannot be encoded. Values of encoded
+        columns are stored as they are read (types are not inferred).
+
+        When *lazy* is True, data is not loaded until the Select is
+        first queried. Until then, :attr:`fieldnames` are read from the
+        header rows of CSV files (other objects are loaded when their
+        field names are needed). Missing files are still reported right
+        away::
+
+            select = squint.Select('big.csv', lazy=True)
         """
         if isinstance(objs, string_types):
             obj_list = glob(objs)  # Get shell-style wildcard matches.
@@ -135,28 +1767,406 @@ class Select(object):
         else:
             obj_list = objs
 
+        lazy = kwds.pop('lazy', False)
+        options = _pop_load_options(kwds)
+        if lazy:
+            self._pending.append((obj_list, args, kwds, options))
+            self._pending_names = None
+        else:
+            self._load_pending()
+            self._load(obj_list, args, kwds, options)
+
+        for obj in obj_list:
+            self._append_obj_string(obj)
+
+    @_write_locked
+    def _load(self, obj_list, args, kwds, options):
+        """Load the objects in *obj_list* into the Select. The *args*
+        and *kwds* are arguments for the objects' readers and *options*
+        is a dictionary from _pop_load_options().
+        """
+        options = dict(options)
+        workers = options.pop('workers')
+        cache_dir = options.pop('cache_dir')
+        encode = options.pop('encode')
+        auto_encode = encode is True
+        encode = [] if (encode is None or auto_encode) else _make_list(encode)
+        fieldnames = self.fieldnames if self._table else []
+        for column in encode:
+            if column in fieldnames and column not in self._codes:
+                msg = 'cannot encode {0!r}, column was loaded without encoding'
+                raise ValueError(msg.format(column))
+
         cursor = self._connection.cursor()
-        with savepoint(cursor):
-            table = self._table or new_table_name(cursor)
+        self._copy_view(cursor)
+        saved_codes = self._save_codes()
+        try:
+            for column in encode:
+                self._codes.setdefault(column, {})
+            load_options = self._get_encode_options(options, auto_encode)
+
+            with savepoint(cursor):
+                table = self._table or new_table_name(cursor)
+                start = self._get_stats_start(cursor, table)
+                index_statements = drop_indexes(cursor, table)
+                loaded = _load_objects(cursor, table, obj_list, args, kwds,
+                                       load_options, workers, cache_dir)
+                self._store_codes(cursor, table, start)
+
+                for obj, first, last, csv_state in loaded:
+                    if isinstance(obj, string_types):
+                        source = _FileSource(obj, args, kwds, options)
+                        source.update(first, last, csv_state)
+                        self._sources.append(source)
+
+                if not self._bulk_depth:
+                    for statement in index_statements:
+                        cursor.execute(statement)
+        except Exception:
+            cursor.close()  # <- Reset failed statements (needed on Python 2).
+            self._restore_codes(saved_codes)
+            raise
+
+        if self._bulk_depth:
+            self._deferred_indexes.extend(index_statements)
+        self._mark_stats(start)
+
+        if not self._table and table_exists(cursor, table):
+            self._resources.tables.add(table)
+            self._table = table
+
+    def _load_pending(self):
+        """Load data that was deferred using *lazy* (see load_data())
+        after reopening the snapshot of an unpickled Select. If loading
+        fails, the failed data is kept so the error is raised again
+        when the Select is next used.
+        """
+        if not self._pending and not self._reopen_state:
+            return  # <- EXIT!
+        with self._lock:
+            if self._reopen_state:
+                self._reopen()
+            while self._pending:
+                self._load(*self._pending[0])
+                self._pending.pop(0)
+                self._pending_names = None
+
+    def _get_pending_fieldnames(self):
+        """Return the field names the Select will have once deferred
+        data is loaded. Only the header rows of CSV files are read and
+        the names they contain are cached until the deferred loads
+        change. Returns None if the names can not be read without
+        loading the data (e.g., when a deferred object is not a CSV
+        file path).
+        """
+        if self._pending_names is None:
+            self._pending_names = self._read_pending_names()
+        if self._pending_names is False:
+            return None  # <- EXIT!
+
+        if self._reopen_state:
+            fieldnames = list(self._reopen_state['fieldnames'])
+        else:
+            fieldnames = list(self._get_schema()[0])
+        for name in self._pending_names:
+            if name not in fieldnames:
+                fieldnames.append(name)
+        return fieldnames
+
+    def _read_pending_names(self):
+        """Return a list of the field names in the header rows of the
+        deferred CSV files or False if a header can not be read.
+        """
+        fieldnames = []
+        for obj_list, args, kwds, options in self._pending:
+            kwds = dict(kwds)
+            encoding = args[0] if args else kwds.pop('encoding', None)
             for obj in obj_list:
-                if ((
-                        isinstance(obj, string_types)
-                        and obj.lower().endswith('.csv')
-                    ) or (
-                        isinstance(obj, file_types)
-                        and getattr(obj, 'name', '').lower().endswith('.csv')
-                    )
-                ):
-                    load_csv(cursor, table, obj, *args, **kwds)
-                else:
-                    reader = get_reader(obj, *args, **kwds)
-                    load_data(cursor, table, reader)
+                if not isinstance(obj, string_types) or not _is_csv(obj):
+                    return False  # <- EXIT!
+                try:
+                    header = read_header(obj, encoding, **kwds)
+                except Exception:  # <- Errors are raised when loading.
+                    return False  # <- EXIT!
+                if header is None:
+                    continue
+
+                indexes = project_columns(header, options['include'],
+                                          options['exclude'])
+                for name in (str(header[i]).strip() for i in indexes):
+                    if name not in fieldnames:
+                        fieldnames.append(name)
+        return fieldnames
+
+    @contextlib.contextmanager
+    def bulk_load(self):
+        """Context manager to load data from several calls to
+        :meth:`load_data` before rebuilding the Select's indexes.
+        Indexes are dropped by the first load and are rebuilt once
+        when the block exits::
 
-                self._append_obj_string(obj)
+            select = squint.Select('myfile1.csv')
+            select.create_index('town')
+
+            with select.bulk_load():
+                select.load_data('myfile2.csv')
+                select.load_data('myfile3.csv')
 
+        Queries made inside the block are run without the indexes.
+        """
+        self._check_process()
+        self._bulk_depth += 1
+        try:
+            yield self
+        finally:
+            self._bulk_depth -= 1
+            if not self._bulk_depth:
+                statements = self._deferred_indexes
+                self._deferred_indexes = []
+                with self._lock:
+                    self._snapshot = None
+                    cursor = self._connection.cursor()
+                    for statement in statements:
+                        # Indexes can be re-created inside the block.
+                        cursor.execute(_index_if_not_exists(statement))
+
+    @_write_locked
+    def refresh(self):
+        """Update the Select with changes made to the files it has
+        loaded. Rows that were appended to CSV files are inserted into
+        the existing table and files that were truncated or otherwise
+        rewritten are reloaded::
+
+            select = squint.Select('mylog.csv')
+            ...
+            select.refresh()  # <- Loads rows added to 'mylog.csv'.
+
+        Only sources that were loaded from file paths are refreshed,
+        other objects (lists, file objects, etc.) are not affected.
+        Rows from reloaded files are moved to the end of the table.
+        """
+        cursor = self._connection.cursor()
+        saved_codes = self._save_codes()
+        try:
+            with savepoint(cursor):
+                table = self._table or new_table_name(cursor)
+                start = stats_start = self._get_stats_start(cursor, table)
+                for source in self._sources:
+                    change = source.get_change()
+                    if change is None:
+                        continue
+                    if change == 'reload':
+                        stats_start = None  # <- Rows are deleted, rebuild stats.
+
+                    options = self._get_encode_options(source.options)
+                    first = _get_max_rowid(cursor, table) + 1
+                    if change == 'append':
+                        kwds = dict(source.kwds)
+                        encoding = kwds.pop('encoding', None)
+                        if source.args:
+                            encoding = source.args[0]
+                        csv_state = append_csv(
+                            cursor,
+                            table,
+                            source.path,
+                            source.encoding,
+                            source.position,
+                            fallback=not encoding,
+                            options=_get_load_options(options),
+                            header_encoding=source.header_encoding,
+                            **kwds
+                        )
+                    else:
+                        if source.rowids:
+                            statement = 'DELETE FROM {0} WHERE _ROWID_ BETWEEN ? AND ?'
+                            statement = statement.format(table)
+                            cursor.executemany(statement, source.rowids)
+                            source.rowids = []
+                        csv_state = _load_object(cursor, table, source.path,
+                                                 source.args, source.kwds,
+                                                 options)
+                    source.update(first, _get_max_rowid(cursor, table), csv_state)
+
+                self._store_codes(cursor, table, start)
+        except Exception:
+            cursor.close()  # <- Reset failed statements (needed on Python 2).
+            self._restore_codes(saved_codes)
+            raise
+
+        self._mark_stats(stats_start)
         if not self._table and table_exists(cursor, table):
+            self._resources.tables.add(table)
             self._table = table
 
+    def _get_encode_options(self, options, auto_encode=False):
+        """Return the load *options* with the Select's encoded columns
+        added (see _store_codes()).
+        """
+        if not self._codes and not auto_encode:
+            return options  # <- EXIT!
+        return dict(options, encode=self._codes, auto_encode=auto_encode)
+
+    def _save_codes(self):
+        """Return a copy of the Select's codes and code table names
+        that can be given to _restore_codes() if loading fails.
+        """
+        codes = dict((k, dict(v)) for k, v in self._codes.items())
+        return codes, dict(self._code_tables)
+
+    def _restore_codes(self, saved_codes):
+        self._codes, self._code_tables = saved_codes
+
+    def _store_codes(self, cursor, table, start):
+        """Insert new codes into the code tables of encoded columns.
+        Rows that got a column's default value (because their source
+        did not contain the column) have the value replaced with its
+        code. The *start* is from _get_stats_start().
+        """
+        if not self._codes or not table_exists(cursor, table):
+            return  # <- EXIT!
+
+        last_rowid, old_columns = start
+        cursor.execute('PRAGMA table_info({0})'.format(table))
+        columns = [x[1] for x in cursor.fetchall()]
+        for column, codes in self._codes.items():
+            code_table = self._code_tables.get(column)
+            if not code_table:
+                code_table = new_table_name(cursor)
+                statement = 'CREATE {0} {1} (code INTEGER PRIMARY KEY, value)'
+                cursor.execute(statement.format(get_table_keyword(cursor), code_table))
+                self._resources.tables.add(code_table)
+                self._code_tables[column] = code_table
+
+            if column in columns:
+                name = normalize_names(column)
+                first = last_rowid if column in old_columns else 0
+                statement = ("SELECT DISTINCT {0} FROM {1} "
+                             "WHERE _ROWID_ > ? AND typeof({0}) != 'integer'")
+                cursor.execute(statement.format(name, table), (first,))
+                for value, in cursor.fetchall():
+                    key = (type(value), value)  # <- See encode_records().
+                    code = codes.setdefault(key, len(codes) + 1)
+                    statement = 'UPDATE {1} SET {0}=? WHERE _ROWID_ > ? AND {0} IS ?'
+                    cursor.execute(statement.format(name, table), (code, first, value))
+
+            cursor.execute('SELECT IFNULL(MAX(code), 0) FROM {0}'.format(code_table))
+            stored = cursor.fetchone()[0]
+            statement = 'INSERT INTO {0} (code, value) VALUES (?, ?)'
+            new_codes = sorted((c, k[1]) for k, c in codes.items() if c > stored)
+            cursor.executemany(statement.format(code_table), new_codes)
+
+    def _get_decode_exprs(self):
+        """Return a dictionary of encoded column names and the SQL
+        expressions that decode their values.
+        """
+        return dict((x, self._get_column_expr(x)) for x in self._code_tables)
+
+    def _get_stats_start(self, cursor, table):
+        """Return a tuple of the table's last rowid and its columns
+        before new rows are loaded (see _get_new_stats()).
+        """
+        if not table_exists(cursor, table):
+            return (0, [])
+        last_rowid = _get_max_rowid(cursor, table)
+        cursor.execute('PRAGMA table_info({0})'.format(table))
+        return (last_rowid, [x[1] for x in cursor.fetchall()])
+
+    def _mark_stats(self, start):
+        """Mark the column statistics as out of date after rows were
+        loaded. The *start* is from _get_stats_start() (or None if
+        rows were deleted). Loading does not read the new rows again,
+        the statistics are updated when they are next used (see
+        _update_stats()).
+        """
+        if start is None:
+            self._stats = None
+            self._stats_start = None
+        elif self._stats is not None and self._stats_start is None:
+            self._stats_start = start  # <- Later loads are after this.
+
+    def _update_stats(self):
+        """Add rows loaded since the column statistics were last
+        updated (see _mark_stats()).
+        """
+        with self._lock:
+            if self._stats_start is None:
+                return  # <- EXIT!
+            cursor = self._get_connection().cursor()
+            self._stats = self._get_new_stats(cursor, self._table,
+                                              self._stats_start)
+            self._stats_start = None
+
+    def _get_new_stats(self, cursor, table, start):
+        """Return the Select's column statistics updated with rows
+        loaded after *start* (from _get_stats_start()). Returns None
+        if statistics can not be updated incrementally (when the old
+        statistics are unknown, rows were deleted, or columns were
+        added to existing rows).
+        """
+        if self._stats is None or start is None:
+            return None  # <- EXIT!
+        if not table_exists(cursor, table):
+            return {}  # <- EXIT!
+
+        last_rowid, columns = start
+        new_stats = _get_column_stats(cursor, table, last_rowid,
+                                      self._get_decode_exprs())
+        if last_rowid and set(new_stats) != set(columns):
+            return None  # <- EXIT! (New columns contain defaults.)
+        return _merge_column_stats(self._stats, new_stats)
+
+    def stats(self):
+        """Return a dictionary of statistics for each column. The
+        statistics are kept in a catalog that is updated (using only
+        the newly loaded rows) the first time it is used after data
+        is loaded, so they can usually be returned without reading
+        the whole table::
+
+            >>> select = Select([['A', 'B'], ['x', 1], ['y', ''], ['z', 3]])
+            >>> select.stats()['B']
+            {'count': 3, 'empty': 1, 'min': 1, 'max': '', 'distinct': 3}
+
+        The *count* is the number of non-NULL values (the same as
+        :meth:`Query.count`), *empty* is the number of NULL or empty
+        string values, and *min* and *max* are the same as
+        :meth:`Query.min` and :meth:`Query.max`. The number of
+        *distinct* values is computed the first time it is requested
+        after data is loaded. When they are available, these
+        statistics are used to answer ``count()``, ``min()`` and
+        ``max()`` queries (without *where* conditions) directly.
+        """
+        self._load_pending()
+        self._update_stats()
+        cursor = self._get_connection().cursor()
+        stats = self._stats
+        if stats is None:
+            if not self._table:
+                return {}  # <- EXIT!
+            stats = _get_column_stats(cursor, self._table,
+                                      exprs=self._get_decode_exprs())
+
+        missing = [k for k, v in stats.items() if v['distinct'] is None]
+        if missing and self._table:
+            aggregates = ['COUNT(DISTINCT {0})'.format(x)
+                          for x in normalize_names(missing)]
+            statement = 'SELECT {0} FROM {1}'
+            cursor.execute(statement.format(', '.join(aggregates), self._table))
+            for column, distinct in zip(missing, cursor.fetchone()):
+                stats[column]['distinct'] = distinct
+
+        if not self._is_view:
+            self._stats = stats  # <- Keep catalog (views can change).
+        return dict((k, dict(v)) for k, v in stats.items())
+
+    def _get_connection(self):
+        """Return the connection used to read data in the calling
+        thread (see _SharedDatabase).
+        """
+        self._check_process()
+        if self._shared:
+            return self._shared.get_reader()
+        return self._connection
+
     def _append_obj_string(self, obj):
         """Get string for *obj*, limit to one line, and append to list."""
         obj_str = repr(obj)
@@ -186,9 +2196,34 @@ class Select(object):
     @property
     def fieldnames(self):
         """A list of field names used by the data source."""
-        cursor = self._connection.cursor()
-        cursor.execute('PRAGMA table_info({0})'.format(self._table))
-        return [x[1] for x in cursor]
+        if self._pending:
+            fieldnames = self._get_pending_fieldnames()
+            if fieldnames is not None:
+                return fieldnames  # <- EXIT!
+            self._load_pending()
+        elif self._reopen_state:
+            return list(self._reopen_state['fieldnames'])  # <- EXIT!
+        return list(self._get_schema()[0])
+
+    def _get_schema(self):
+        """Return a tuple of the table's field names and a frozenset
+        of the same names. The names are read once and are cached
+        until a method that changes the database is called (see
+        _write_locked()).
+        """
+        schema = self._schema
+        version = self._schema_version
+        if schema is not None and schema[0] == version:
+            return schema[1:]  # <- EXIT!
+
+        if self._table:
+            cursor = self._get_connection().cursor()
+            cursor.execute('PRAGMA table_info({0})'.format(self._table))
+            fieldnames = tuple(x[1] for x in cursor)
+        else:
+            fieldnames = ()
+        self._schema = (version, fieldnames, frozenset(fieldnames))
+        return self._schema[1:]
 
     def __call__(self, columns=None, **where):
         """After a Select has been created, it can be called like a
@@ -245,17 +2280,27 @@ class Select(object):
 
     def _execute_query(self, select_clause, trailing_clause=None, **kwds_filter):
         """Execute query and return cursor object."""
-        # Build SELECT query.
+        stmnt, params = self._build_query(select_clause, trailing_clause, kwds_filter)
+        return self._run_query(stmnt, params)
+
+    def _build_query(self, select_clause, trailing_clause, where_dict):
+        """Return a SELECT statement and its parameters."""
         stmnt = 'SELECT {0} FROM {1}'.format(select_clause, self._table)
-        where_clause, params = self._build_where_clause(kwds_filter)
+        where_clause, params = self._build_where_clause(where_dict)
         if where_clause:
             stmnt = '{0} WHERE {1}'.format(stmnt, where_clause)
         if trailing_clause:
             stmnt = '{0}\n{1}'.format(stmnt, trailing_clause)
+        return stmnt, params
 
-        # Execute query.
+    def _run_query(self, stmnt, params, param_values=None):
+        """Execute statement and return cursor object. Placeholders in
+        *params* are replaced with the given *param_values* (see
+        param()).
+        """
+        params = _bind_params(params, param_values or {})
         try:
-            cursor = self._connection.cursor()
+            cursor = self._get_connection().cursor()
             cursor.execute(stmnt, params)
         except Exception as e:
             exc_cls = e.__class__
@@ -266,76 +2311,125 @@ class Select(object):
 
     def _build_where_clause(self, where_dict):
         """Return SQL 'WHERE' clause that implements *where* keyword
-        constraints.
+        constraints. Predicates that can be tested in SQL are compiled
+        (see _compile_matcher()), others use user-defined functions.
         """
         clause = []
         params = []
         items = where_dict.items()
         items = sorted(items, key=lambda x: x[0])  # Ordered by key.
         for key, val in items:
-            if isinstance(val, dict):
-                msg = ('cannot narrow a selection using a dictionary, '
-                       'got: {0}={1!r}').format(key, val)
-                if len(val) == 0:
-                    msg = '{0}\n  Did you mean {1}=set()?'.format(msg, key)
-                raise ValueError(msg)
-
-            if isinstance(val, Set):
-                clause.append('{key} IN ({qmarks})'.format(
-                    key=key,
+            _check_where_value(key, val)
+
+            # Values of encoded columns are tested using the code table
+            # and the column is compared to the codes that matched.
+            code_table = self._code_tables.get(key)
+            column = 'value' if code_table else self._escape_field_name(key)
+
+            if isinstance(val, _Param):
+                condition = column + '=?'
+                params.append(val)  # <- Replaced when run (see _run_query()).
+            elif isinstance(val, _FilterFunction):
+                condition, filter_params = self._compile_filter(column, val)
+                if not condition:
+                    continue  # <- Matches all values.
+                params.extend(filter_params)
+            elif isinstance(val, Set):
+                condition = '{key} IN ({qmarks})'.format(
+                    key=column,
                     qmarks=', '.join('?' * len(val))
-                ))
+                )
                 params.extend(val)
             elif callable(val) and not isinstance(val, type):
                 func_name = self._get_user_function(val)
-                clause.append('{0}({1})'.format(func_name, key))
+                condition = '{0}({1})'.format(func_name, column)
             else:
                 pred = get_matcher(val)
-                if isinstance(pred, MatcherObject):
+                compiled = _compile_matcher(column, val)
+                if compiled and compiled[2]:
+                    condition, compiled_params, _ = compiled
+                    if not condition:
+                        continue  # <- Matches all values.
+                    params.extend(compiled_params)
+                elif isinstance(pred, MatcherObject):
                     func_name = self._get_user_function(pred._func, keyref=val)
-                    clause.append('{0}({1})'.format(func_name, key))
+                    condition = '{0}({1})'.format(func_name, column)
+                    if compiled:  # <- Narrow the values tested by the function.
+                        condition = '{0} AND {1}'.format(compiled[0], condition)
+                        params.extend(compiled[1])
                 elif isinstance(pred, MatcherTuple):
                     def func(x):
                         return pred == x
                     func_name = self._get_user_function(func, keyref=val)
-                    clause.append('{0}({1})'.format(func_name, key))
+                    condition = '{0}({1})'.format(func_name, column)
                 else:
-                    clause.append(key + '=?')
+                    condition = column + '=?'
                     params.append(val)
 
+            if code_table:
+                condition = '{0} IN (SELECT code FROM {1} WHERE {2})'.format(
+                    self._escape_field_name(key), code_table, condition)
+            clause.append(condition)
+
         clause = ' AND '.join(clause) if clause else ''
         return clause, params
 
+    def _compile_filter(self, column, filter_function):
+        """Return an SQL condition (and its parameters) that tests the
+        values of *column* using the predicates of *filter_function*
+        (see _FilterFunction). Predicates that can not be compiled to
+        SQL are tested using a user-defined function.
+        """
+        conditions = []
+        params = []
+        remaining = []
+        for predicate in filter_function.predicates:
+            compiled = _compile_predicate(column, predicate)
+            if compiled is None:
+                remaining.append(predicate)
+                continue
+            condition, compiled_params, exact = compiled
+            if condition:
+                conditions.append(condition)
+                params.extend(compiled_params)
+            if not exact:
+                remaining.append(predicate)
+
+        if remaining:
+            func_name = self._get_user_function(_FilterFunction(*remaining))
+            conditions.append('{0}({1})'.format(func_name, column))
+        return ' AND '.join(conditions), params
+
     def _get_user_function(self, func, keyref=None):
         """Returns SQLite user-defined function name. If *keyref* is
         provided, it is used to generate the lookup-key for fetching
-        (and storing) the function name from the _user_function_dict
-        property.
+        (and storing) the function name from the connection's function
+        registry and the _user_function_dict property. Equivalent
+        conditions get the same key (see _get_fingerprint()).
         """
-        if not keyref:
+        if keyref is None:
             keyref = func
+        func_key = _get_fingerprint(keyref)
 
-        try:
-            func_key = hash(keyref)
-        except TypeError:
-            func_key = id(keyref)
+        with self._lock:
+            func_name = self._registry.get(func_key)
+            if func_name is None:  # <- New or unregistered (see _FunctionRegistry).
+                self._user_function_dict.pop(func_key, None)
+                self._create_user_function(func, func_key, keyref)
+                return self._user_function_dict[func_key]
 
-        try:
-            return self._user_function_dict[func_key]
-        except KeyError:
-            self._create_user_function(func, func_key)
-            return self._user_function_dict[func_key]
+            self._user_function_dict.pop(func_key, None)
+            self._user_function_dict[func_key] = func_name  # <- Most recent.
+            self._use_function(func_key)
+            return func_name
 
-    def _create_user_function(self, func, func_key=None):
+    def _create_user_function(self, func, func_key=None, keyref=None):
         """Register *func* with the SQLite connection using an
         automatically generated function name. Add the new name
         to the _user_function_dict using the given *func_key*.
         """
         if not func_key:
-            try:
-                func_key = hash(func)
-            except TypeError:
-                func_key = id(func)
+            func_key = _get_fingerprint(func)
 
         if func_key in self._user_function_dict:
             raise ValueError('function {0!r} already registered'.format(func))
@@ -346,9 +2440,26 @@ class Select(object):
             def func(x):
                 return _func(x)
 
-        func_name = next(_user_function_name_gen)
-        self._connection.create_function(func_name, 1, func)  # <- Register!
-        self._user_function_dict[func_key] = func_name
+        with self._lock:
+            func_name = self._registry.add(func_key, func, keyref)  # <- Register!
+            self._user_function_dict[func_key] = func_name
+            self._use_function(func_key)
+
+    def _use_function(self, func_key):
+        """Count the Select as a user of the registered function (see
+        _Resources.release()). A Select uses at most MAX_USER_FUNCTIONS
+        functions--beyond that, it stops using the ones it used least
+        recently so the registry can evict them.
+        """
+        if func_key not in self._resources.functions:
+            self._registry.add_user(func_key)
+            self._resources.functions.add(func_key)
+
+        while len(self._user_function_dict) > MAX_USER_FUNCTIONS:
+            old_key, _ = self._user_function_dict.popitem(last=False)
+            if old_key in self._resources.functions:
+                self._resources.functions.discard(old_key)
+                self._registry.remove_user(old_key)
 
     def _format_result_group(self, columns, cursor):
         outer_type = type(columns)
@@ -398,7 +2509,10 @@ class Select(object):
         """Assert that given fieldnames are present in data source,
         raises LookupError if fields are missing.
         """
-        available = self.fieldnames
+        if self._pending or self._reopen_state:
+            available = frozenset(self.fieldnames)
+        else:
+            available = self._get_schema()[1]
         for name in fieldnames:
             if name not in available:
                 msg = '{0!r} not in {1!r}'.format(name, self)
@@ -410,18 +2524,38 @@ class Select(object):
         name = name.replace('"', '""')
         return '"{0}"'.format(name)
 
+    def _get_column_expr(self, name):
+        """Return an SQL expression for the values of the column
+        *name*. Values of encoded columns are decoded using the
+        column's code table.
+        """
+        escaped = self._escape_field_name(name)
+        code_table = self._code_tables.get(name)
+        if code_table:
+            return '(SELECT value FROM {0} WHERE code={1})'.format(
+                code_table, escaped)
+        return escaped
+
     def _parse_key_value(self, key, value):
         key_columns = (key,) if isinstance(key, str) else tuple(key)
         value = tuple(value)[0]
         value_columns = (value,) if isinstance(value, str) else  tuple(value)
         self._assert_fields_exist(key_columns)
         self._assert_fields_exist(value_columns)
-        key_columns = tuple(self._escape_field_name(x) for x in key_columns)
-        value_columns = tuple(self._escape_field_name(x) for x in value_columns)
+        key_columns = tuple(self._get_column_expr(x) for x in key_columns)
+        value_columns = tuple(self._get_column_expr(x) for x in value_columns)
 
         return key_columns, value_columns
 
     def _select(self, columns, **where):
+        self._load_pending()
+        stmnt, params, formatter = self._prepare_select(columns, **where)
+        return formatter(self._run_query(stmnt, params))
+
+    def _prepare_select(self, columns, **where):
+        """Return the statement, parameters and result formatter
+        (a function of a cursor) used by _select().
+        """
         key, value = _parse_columns(columns)
         key_columns, value_columns = self._parse_key_value(key, value)
 
@@ -433,10 +2567,18 @@ class Select(object):
             order_by = 'ORDER BY {0}'.format(', '.join(key_columns))
         else:
             order_by = None
-        cursor = self._execute_query(select_clause, order_by, **where)
-        return self._format_results(columns, cursor)
+        stmnt, params = self._build_query(select_clause, order_by, where)
+        return stmnt, params, functools.partial(self._format_results, columns)
 
     def _select_distinct(self, columns, **where):
+        self._load_pending()
+        stmnt, params, formatter = self._prepare_select_distinct(columns, **where)
+        return formatter(self._run_query(stmnt, params))
+
+    def _prepare_select_distinct(self, columns, **where):
+        """Return the statement, parameters and result formatter
+        used by _select_distinct().
+        """
         key, value = _parse_columns(columns)
         key_columns, value_columns = self._parse_key_value(key, value)
 
@@ -446,10 +2588,44 @@ class Select(object):
             order_by = 'ORDER BY {0}'.format(', '.join(key_columns))
         else:
             order_by = None
-        cursor = self._execute_query(select_clause, order_by, **where)
-        return self._format_results(columns, cursor)
+        stmnt, params = self._build_query(select_clause, order_by, where)
+        return stmnt, params, functools.partial(self._format_results, columns)
 
     def _select_aggregate(self, sqlfunc, columns, **where):
+        self._load_pending()
+
+        # When possible, get the result from the column statistics.
+        column = self._get_stats_column(sqlfunc, columns, where)
+        if column is not None:
+            return self._stats[column][sqlfunc.lower()]  # <- EXIT!
+
+        stmnt, params, formatter = self._prepare_select_aggregate(sqlfunc, columns, **where)
+        return formatter(self._run_query(stmnt, params))
+
+    def _get_stats_column(self, sqlfunc, columns, where):
+        """Return the column whose statistics (see stats()) give the
+        result of the aggregate *sqlfunc* or None if the aggregate
+        must be computed using a query.
+        """
+        column = columns
+        if isinstance(column, Sequence) and len(column) == 1:
+            column = column[0]  # <- A single column, e.g. ['A'].
+        if (where
+                or self._is_view
+                or not isinstance(column, string_types)
+                or sqlfunc.upper() not in ('COUNT', 'MIN', 'MAX')):
+            return None  # <- EXIT!
+
+        self._update_stats()
+        if self._stats and column in self._stats:
+            return column
+        return None
+
+    def _prepare_select_aggregate(self, sqlfunc, columns, **where):
+        """Return the statement, parameters and result formatter
+        used by _select_aggregate().
+        """
+        sqlfunc = sqlfunc.upper()
         key, value = _parse_columns(columns)
         key_columns, value_columns = self._parse_key_value(key, value)
 
@@ -457,26 +2633,37 @@ class Select(object):
             func = lambda col: 'DISTINCT {0}'.format(col)
             value_columns = tuple(func(col) for col in value_columns)
 
-        sqlfunc = sqlfunc.upper()
         value_columns = tuple('{0}({1})'.format(sqlfunc, x) for x in value_columns)
         select_clause = ', '.join(key_columns + value_columns)
         if key:
             group_by = 'GROUP BY {0}'.format(', '.join(key_columns))
         else:
             group_by = None
-        cursor = self._execute_query(select_clause, group_by, **where)
-        results =  self._format_results(columns, cursor)
+        stmnt, params = self._build_query(select_clause, group_by, where)
 
-        if isinstance(columns, Mapping):
-            results = _get_iteritems((k, next(v)) for k, v in results)
-            return Result(results, evaltype=dict)
-        return next(results)
+        def formatter(cursor):
+            results = self._format_results(columns, cursor)
+            if isinstance(columns, Mapping):
+                results = _get_iteritems((k, next(v)) for k, v in results)
+                return Result(results, evaltype=dict)
+            return next(results)
+
+        return stmnt, params, formatter
+
+    def _prepare_statement(self, method, args, where):
+        """Return a _PreparedStatement for the given select *method*
+        (e.g., '_select') and its arguments (see PreparedQuery).
+        """
+        statement = _PreparedStatement(self, method, args, where)
+        statement.prepare()  # <- Raises errors when the query is prepared.
+        return statement
 
     def __iter__(self):
         columns = self.fieldnames
         query = self(columns)
         return query.__iter__()
 
+    @_write_locked
     def create_index(self, *columns):
         """Create an index for specified columns---can speed up
         testing in many cases.
@@ -508,6 +2695,10 @@ class Select(object):
             __tracebackhide__ = True
             raise
 
+        self._load_pending()
+        cursor = self._connection.cursor()
+        self._copy_view(cursor)  # <- Views of attached tables can't be indexed.
+
         # Build index name.
         whitelist = lambda col: ''.join(x for x in col if x.isalnum())
         idx_name = '_'.join(whitelist(col) for col in columns)
@@ -521,7 +2712,6 @@ class Select(object):
         statement = statement.format(idx_name, self._table, ', '.join(columns))
 
         # Create index.
-        cursor = self._connection.cursor()
         cursor.execute(statement)
 
     # NOTE: Do NOT add to_csv() method to Select. It's simple
@@ -531,6 +2721,59 @@ class Select(object):
     #
 
 
+class _PreparedStatement(object):
+    """A function of parameter values (see param()) that runs the
+    query of a Select *method* (e.g., '_select') and returns its
+    formatted results. The statement is built once and is rebuilt
+    only when the Select's tables change or when one of the user-
+    defined functions it uses has been unregistered (see
+    _FunctionRegistry).
+    """
+    def __init__(self, select, method, args, where):
+        if method not in ('_select', '_select_distinct', '_select_aggregate'):
+            raise ValueError('unrecognized select method {0!r}'.format(method))
+        self.select = select
+        self.method = method
+        self.args = args
+        self.where = where
+        self._state = None
+
+    def prepare(self):
+        """Build the statement and its result formatter."""
+        select = self.select
+        select._load_pending()
+        with select._lock:
+            prepare = getattr(select, '_prepare' + self.method)
+            stmnt, params, formatter = prepare(*self.args, **self.where)
+            names = set(re.findall(r'\b(FUNC\d+)\(', stmnt))
+            functions = tuple((k, v) for k, v in select._user_function_dict.items()
+                              if v in names)
+            self._state = (select._table, dict(select._code_tables), functions,
+                           stmnt, params, formatter)
+
+    def _is_current(self):
+        table, code_tables, functions = self._state[:3]
+        select = self.select
+        if table != select._table or code_tables != select._code_tables:
+            return False
+        registry = select._registry
+        return all(registry.get(key) == name for key, name in functions)
+
+    def __call__(self, param_values):
+        select = self.select
+        select._load_pending()
+        if self.method == '_select_aggregate':
+            sqlfunc, columns = self.args
+            column = select._get_stats_column(sqlfunc, columns, self.where)
+            if column is not None:
+                return select._stats[column][sqlfunc.lower()]  # <- EXIT!
+
+        if not self._is_current():
+            self.prepare()
+        stmnt, params, formatter = self._state[3:]
+        return formatter(select._run_query(stmnt, params, param_values))
+
+
 class Query(BaseQuery):
     """Query(columns, **where)
     Query(select, columns, **where)
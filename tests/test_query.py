@@ -12,6 +12,7 @@ from squint._compatibility.collections.abc import Mapping
 from squint._utils import IterItems
 from squint._utils import nonstringiter
 
+import squint.select
 from squint.select import (
     Select,
     Query,
@@ -37,6 +38,8 @@ from squint.query import (
     _normalize_columns,
     _parse_columns,
     RESULT_TOKEN,
+    PreparedQuery,
+    param,
 )
 from squint.result import Result
 
@@ -1279,6 +1282,256 @@ class TestQuery(unittest.TestCase):
         self.assertRegex(repr(query), regex)
 
 
+class TestOptimizationRules(unittest.TestCase):
+    def setUp(self):
+        self.select = Select([
+            ('A', 'B', 'C'),
+            ('x', 'foo', 1),
+            ('y', 'bar', 2),
+            ('x', 'baz', 3),
+            ('z', 'foo', 2),
+            ('y', '', 2),
+        ])
+
+    def get_plan(self, query):
+        plan = query._get_execution_plan(query.source, query._query_steps)
+        return Query._optimize(plan)
+
+    def assertOptimizedEqual(self, query):
+        def fetch(optimize):
+            result = query.execute(optimize=optimize)
+            return result.fetch() if isinstance(result, Result) else result
+        self.assertEqual(fetch(True), fetch(False), msg=repr(query))
+
+    def test_filter(self):
+        plan = self.get_plan(self.select('A').filter('x'))
+        self.assertEqual(len(plan), 2, msg='filter step should be removed')
+        self.assertEqual(plan[1][2]['A'].predicates, ('x',))
+
+        predicates = [
+            'x',
+            re.compile('[xy]'),
+            set(['y', 'z']),
+            lambda x: 'yes' if x == 'z' else '',  # <- Truth values are used.
+            str,
+            None,
+        ]
+        for predicate in predicates:
+            self.assertOptimizedEqual(self.select('A').filter(predicate))
+            self.assertOptimizedEqual(self.select({'A'}).filter(predicate))
+            self.assertOptimizedEqual(self.select('A').distinct().filter(predicate))
+            self.assertOptimizedEqual(self.select('A', C=2).filter(predicate))
+
+    def test_filter_quoted_column(self):
+        select = Select([['my col', 'B"C'], ['x', '1'], ['y', '2']])
+        for column in ['my col', 'B"C']:
+            query = select(column).filter(set(['x', '2']))
+            self.assertEqual(len(self.get_plan(query)), 2, msg='filter step should be removed')
+            self.assertOptimizedEqual(query)
+        self.assertEqual(select('my col').filter('x').fetch(), ['x'])
+        self.assertEqual(select('my col', **{'B"C': '2'}).fetch(), ['y'])
+
+    def test_filter_merged(self):
+        query = self.select('A').filter(set(['x', 'y'])).filter(lambda x: x != 'x')
+        plan = self.get_plan(query)
+        self.assertEqual(len(plan), 2)
+        self.assertEqual(len(plan[1][2]['A'].predicates), 2)
+        self.assertOptimizedEqual(query)
+
+    def test_filter_mixed_types(self):
+        """Filters moved into *where* conditions should match values
+        the same way as Python (e.g., strings never equal numbers).
+        """
+        select = Select([['A'], ['1'], [1], [1.0], [0], [''], [None], ['x']])
+        predicates = ['1', 1, 0, '', None, True, False, Ellipsis,
+                      set(['1', 0]), set([None, 1]), set()]
+        for predicate in predicates:
+            self.assertOptimizedEqual(select('A').filter(predicate))
+
+        select = Select([['A'], ['1'], ['2'], ['0']], infer_types=True)
+        for predicate in predicates:
+            self.assertOptimizedEqual(select('A').filter(predicate))
+
+    def test_filter_not_moved(self):
+        queries = [
+            self.select({'A': 'B'}).filter('foo'),  # <- Can leave empty groups.
+            self.select(('A', 'B')).filter(lambda row: row[0] == 'x'),
+            self.select('A', A='x').filter('x'),  # <- Already constrained.
+            self.select('A').map(lambda x: x.upper()).filter('X'),
+        ]
+        for query in queries:
+            plan = self.get_plan(query)
+            self.assertTrue(plan is None or any(x[0] is _filter_data for x in plan))
+            self.assertOptimizedEqual(query)
+
+    def test_count_distinct(self):
+        plan = self.get_plan(self.select('A').distinct().count())
+        expected = (
+            (getattr, (RESULT_TOKEN, '_select_aggregate'), {}),
+            (RESULT_TOKEN, ('COUNT', set(['A'])), {}),
+        )
+        self.assertEqual(plan, expected)
+
+        self.assertOptimizedEqual(self.select('A').distinct().count())
+        self.assertOptimizedEqual(self.select({'A': 'C'}).distinct().count())
+        self.assertOptimizedEqual(self.select('C', A='x').distinct().count())
+        self.assertOptimizedEqual(self.select(('A', 'C')).distinct().count())
+
+    def test_chained_aggregates(self):
+        plan = self.get_plan(self.select('C').count().max())
+        expected = (
+            (getattr, (RESULT_TOKEN, '_select_aggregate'), {}),
+            (RESULT_TOKEN, ('COUNT', ['C']), {}),
+        )
+        self.assertEqual(plan, expected)
+
+        self.assertOptimizedEqual(self.select('C').count().max().min())
+        self.assertOptimizedEqual(self.select('C').max().distinct())
+        self.assertOptimizedEqual(self.select({'A': 'C'}).min().max())
+        self.assertOptimizedEqual(self.select('C').map(str).count().min())
+
+    def test_composed_rules(self):
+        query = self.select('A').filter(set(['x', 'y'])).distinct().count().max()
+        plan = self.get_plan(query)
+        self.assertEqual(len(plan), 2)
+        self.assertEqual(plan[0], (getattr, (RESULT_TOKEN, '_select_aggregate'), {}))
+        self.assertOptimizedEqual(query)
+
+    def test_rows_returned(self):
+        """Optimized plans should return fewer rows to Python."""
+        data = [('A', 'B')] + [(str(x % 7), x) for x in range(500)]
+        select = Select(data)
+        counted = []
+
+        format_results = select._format_results
+        def counting_format_results(columns, cursor):
+            rows = list(cursor)
+            counted.append(len(rows))
+            return format_results(columns, iter(rows))
+        select._format_results = counting_format_results
+
+        def rows_returned(query, optimize):
+            del counted[:]
+            query.execute(optimize=optimize)
+            return sum(counted)
+
+        query = select('A').distinct().count()
+        self.assertEqual(rows_returned(query, optimize=False), 500)
+        self.assertEqual(rows_returned(query, optimize=True), 1)
+
+        query = select('A').filter('3')
+        self.assertEqual(rows_returned(query, optimize=False), 500)
+        self.assertEqual(rows_returned(query, optimize=True), 71)
+
+
+class TestPreparedQuery(unittest.TestCase):
+    def setUp(self):
+        self.select = Select([
+            ('A', 'B', 'C'),
+            ('x', 'foo', 1),
+            ('y', 'bar', 2),
+            ('x', 'baz', 3),
+            ('z', 'foo', 2),
+        ])
+
+    def test_execute(self):
+        query = self.select({'A': 'C'}, B=param('b')).sum()
+        prepared = query.prepare()
+        self.assertIsInstance(prepared, PreparedQuery)
+        self.assertEqual(prepared.params, frozenset(['b']))
+
+        for value in ['foo', 'bar', 'qux']:
+            expected = self.select({'A': 'C'}, B=value).sum().fetch()
+            self.assertEqual(prepared.fetch(b=value), expected)
+
+        result = prepared.execute(b='foo')
+        self.assertIsInstance(result, Result)
+        self.assertEqual(result.fetch(), {'x': 1, 'z': 2})
+
+    def test_python_steps(self):
+        query = self.select('C', A=param('a')).map(lambda x: x * 10)
+        prepared = query.prepare()
+        self.assertEqual(prepared.fetch(a='x'), [10, 30])
+        self.assertEqual(prepared.fetch(a='y'), [20])
+
+        query = self.select('A', C=param('c')).filter('x').distinct()
+        self.assertEqual(query.prepare().fetch(c=1), ['x'])
+        self.assertEqual(query.prepare().fetch(c=2), [])
+
+    def test_built_once(self):
+        select = self.select
+        calls = []
+        build_query = select._build_query
+        def counting_build_query(*args, **kwds):
+            calls.append(args)
+            return build_query(*args, **kwds)
+        select._build_query = counting_build_query
+
+        prepared = select('A', B=param('b')).count().prepare()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(prepared.fetch(b='foo'), 2)
+        self.assertEqual(prepared.fetch(b='bar'), 1)
+        self.assertEqual(len(calls), 1, msg='statement should be reused')
+
+    def test_parameter_errors(self):
+        prepared = self.select('A', B=param('b'), C=param('c')).prepare()
+        with self.assertRaises(TypeError):
+            prepared.fetch(b='foo')  # <- Missing 'c'.
+
+        with self.assertRaises(TypeError):
+            prepared.fetch(b='foo', c=1, d=2)  # <- Unexpected 'd'.
+
+        with self.assertRaises(TypeError):
+            self.select('A', B=param('b')).fetch()  # <- Not prepared.
+
+        with self.assertRaises(TypeError):
+            param(123)
+
+    def test_source_errors(self):
+        with self.assertRaises(ValueError):
+            Query('A').prepare()  # <- No source.
+
+        prepared = Query('A', B=param('b')).prepare(self.select)
+        self.assertEqual(prepared.fetch(b='foo'), ['x', 'z'])
+
+        with self.assertRaises(TypeError):
+            Query.from_object([1, 2, 3]).prepare()
+
+    def test_changed_data(self):
+        select = self.select
+        prepared = select('C').max().prepare()  # <- Uses column stats.
+        self.assertEqual(prepared.fetch(), 3)
+
+        select.load_data([('A', 'B', 'C'), ('w', 'foo', 9)])
+        self.assertEqual(prepared.fetch(), 9)
+
+    def test_encoded_column(self):
+        data = [('A', 'B')] + [('x', 'foo'), ('y', 'bar')] * 20
+        select = Select(data, encode=['B'])
+        prepared = select('A', B=param('b')).distinct().prepare()
+        self.assertEqual(prepared.fetch(b='foo'), ['x'])
+        self.assertEqual(prepared.fetch(b='bar'), ['y'])
+
+    def test_unregistered_function(self):
+        select = self.select
+        prepared = select('A', B=re.compile('a[rz]$'), C=param('c')).prepare()
+        self.assertEqual(prepared.fetch(c=2), ['y'])
+
+        original_max = squint.select.MAX_USER_FUNCTIONS
+        try:
+            squint.select.MAX_USER_FUNCTIONS = 1
+            select('A', B=re.compile('o$')).fetch()  # <- Evicts function.
+        finally:
+            squint.select.MAX_USER_FUNCTIONS = original_max
+
+        self.assertEqual(prepared.fetch(c=3), ['x'])
+
+    def test_repr(self):
+        self.assertEqual(repr(param('b')), "param('b')")
+        query = self.select('A', B=param('b'))
+        self.assertIn("B=param('b')", repr(query))
+
+
 class TestCount(unittest.TestCase):
     def test_count_with_optimization(self):
         select = Select([('A', 'B'), (1, 2), (1, 2)])
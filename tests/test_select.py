@@ -1,18 +1,35 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
+import bz2
+import gc
+import gzip
+import logging
+import multiprocessing
 import os
+import pickle
+import re
 import shutil
 import sqlite3
 import tempfile
+import threading
+import types
+import warnings
 
 from squint._compatibility.builtins import *
 from squint._compatibility.collections import namedtuple
 from .common import (
     StringIO,
     unittest,
+    version_info,
 )
+import squint.select
+from squint._vendor.load_csv import FallbackDecoder
+from squint._vendor.load_csv import lzma
 from squint.select import Select
+from squint.select import _is_sql_literal
 from squint.select import Query
+from squint import Predicate
+from squint.query import _FilterFunction
 from squint.result import Result
 
 
@@ -152,39 +169,67 @@ class TestSelect(HelperTestCase):
         select = Select([['A', 'B'], ['x', 1], ['y', 2], ['z', 3]])
 
         result = select._build_where_clause({'A': 'x'})
-        expected = ('A=?', ['x'])
+        expected = ('"A"=?', ['x'])
         self.assertEqual(result, expected)
 
         result = select._build_where_clause({'A': set(['x', 'y'])})
         self.assertEqual(len(result), 2)
-        self.assertEqual(result[0], 'A IN (?, ?)')
+        self.assertEqual(result[0], '"A" IN (?, ?)')
         self.assertEqual(set(result[1]), set(['x', 'y']))
 
         # User-defined function.
         userfunc = lambda x: len(x) == 1
         result = select._build_where_clause({'A': userfunc})
         self.assertEqual(len(result), 2)
-        self.assertRegex(result[0], r'FUNC\d+\(A\)')
+        self.assertRegex(result[0], r'FUNC\d+\("A"\)')
         self.assertEqual(result[1], [])
 
-        # Predicate (a type)
+        # Predicate (a type, compiled to SQL)
         prev_len = len(select._user_function_dict)
         predicate = int
         result = select._build_where_clause({'A': predicate})
-        self.assertEqual(len(result), 2)
-        self.assertRegex(result[0], r'FUNC\d+\(A\)')
-        self.assertEqual(result[1], [])
-        self.assertEqual(len(select._user_function_dict), prev_len + 1)
+        self.assertEqual(result, ("typeof(\"A\")='integer'", []))
+        self.assertEqual(len(select._user_function_dict), prev_len)
 
-        # Predicate (a boolean)
-        prev_len = len(select._user_function_dict)
+        # Predicate (a boolean, compiled to SQL)
         predicate = True
         result = select._build_where_clause({'A': predicate})
-        self.assertEqual(len(result), 2)
-        self.assertRegex(result[0], r'FUNC\d+\(A\)')
+        self.assertIn('CASE typeof("A")', result[0])
         self.assertEqual(result[1], [])
+        self.assertEqual(len(select._user_function_dict), prev_len)
+
+        # Predicate (a regex, uses a user-defined function)
+        predicate = re.compile('[xy]')
+        result = select._build_where_clause({'A': predicate})
+        self.assertRegex(result[0], r'^FUNC\d+\("A"\)$')
         self.assertEqual(len(select._user_function_dict), prev_len + 1)
 
+    def test_build_where_clause_filter_function(self):
+        """Filters moved into *where* conditions by the query optimizer
+        are compiled to SQL when possible.
+        """
+        select = Select([['A', 'B'], ['x', 1], ['y', 2], ['z', 3]])
+
+        result = select._build_where_clause({'A': _FilterFunction('x')})
+        expected = ('(typeof("A")=\'text\' AND "A" IN (?))', ['x'])
+        self.assertEqual(result, expected)
+
+        result = select._build_where_clause({'B': _FilterFunction(set([1, None]))})
+        expected = ('("B" IS NULL OR (typeof("B") IN (\'integer\', \'real\') AND "B" IN (?)))', [1])
+        self.assertEqual(result, expected)
+
+        result = select._build_where_clause({'A': _FilterFunction(True)})
+        self.assertIn('CASE typeof("A")', result[0])
+
+        result = select._build_where_clause({'A': _FilterFunction(Ellipsis)})
+        self.assertEqual(result, ('', []), msg='wildcard matches all values')
+        self.assertEqual(select._user_function_dict, {})
+
+        # Other predicates use a user-defined function.
+        result = select._build_where_clause({'A': _FilterFunction('x', len)})
+        self.assertRegex(result[0], r'^\(typeof\("A"\)=\'text\' .+ AND FUNC\d+\("A"\)$')
+        self.assertEqual(len(select._user_function_dict), 1)
+
     def test_execute_query(self):
         data = [['A', 'B'], ['x', 101], ['y', 202], ['z', 303]]
         source = Select(data)
@@ -441,6 +486,1652 @@ class TestSelect(HelperTestCase):
         self.assertEqual(result.fetch(), expected)
 
 
+class TestInferTypes(unittest.TestCase):
+    def get_types(self, select):
+        cursor = select._connection.cursor()
+        cursor.execute('PRAGMA table_info({0})'.format(select._table))
+        return [x[2] for x in cursor]
+
+    def test_default_untyped(self):
+        select = Select([['A', 'B'], ['x', '1'], ['y', '2']])
+        self.assertEqual(self.get_types(select), ['', ''])
+        self.assertEqual(select('B').fetch(), ['1', '2'])
+
+    def test_infer_types(self):
+        data = [['A', 'B', 'C', 'D'],
+                ['x', '10', '1.5', ''],
+                ['y', '9', '2', '']]
+        select = Select(data, infer_types=True)
+        self.assertEqual(self.get_types(select), ['TEXT', 'INTEGER', 'REAL', ''])
+        self.assertEqual(select('B').fetch(), [10, 9])
+        self.assertEqual(select('C').fetch(), [1.5, 2.0])
+        self.assertEqual(select({'B': 'A'}).fetch(), {9: ['y'], 10: ['x']})
+
+    def test_infer_from_csv(self):
+        fh = StringIO('A,B\nx,10\ny,9\nz,100\n')
+        fh.name = 'myfile.csv'
+        select = Select(fh, infer_types=True)
+        self.assertEqual(select('B').min().fetch(), 9)
+        self.assertEqual(select('B').max().fetch(), 100)
+
+    def test_leading_zeros_not_numeric(self):
+        select = Select([['A'], ['007'], ['008']], infer_types=True)
+        self.assertEqual(self.get_types(select), ['TEXT'])
+        self.assertEqual(select('A').fetch(), ['007', '008'])
+
+    def test_widen_integer_to_real(self):
+        select = Select([['A'], ['1'], ['2']], infer_types=True)
+        select.load_data([['A'], ['2.5']])
+        self.assertEqual(self.get_types(select), ['REAL'])
+        self.assertEqual(select('A').fetch(), [1.0, 2.0, 2.5])
+
+    def test_lossy_numbers_not_inferred(self):
+        data = [['A', 'B', 'C'],
+                ['12345678901234567890', '0.1000000000000000055511151231257827', '1e999'],
+                ['1', '0.5', '1.0']]
+        select = Select(data, infer_types=True)
+        self.assertEqual(self.get_types(select), ['TEXT', 'TEXT', 'TEXT'])
+        self.assertEqual(select('A').fetch(), ['12345678901234567890', '1'])
+        self.assertEqual(select('B').fetch()[0], '0.1000000000000000055511151231257827')
+
+    def test_normalized_reals_inferred(self):
+        select = Select([['A'], ['1.50'], ['1e3'], ['-0.0']], infer_types=True)
+        self.assertEqual(self.get_types(select), ['REAL'])
+        self.assertEqual(select('A').fetch(), [1.5, 1000.0, -0.0])
+
+    def test_large_integer_widens_to_no_affinity(self):
+        select = Select([['A'], ['1'], ['2']], infer_types=True)
+        select.load_data([['A'], ['12345678901234567890']])
+        self.assertEqual(self.get_types(select), [''])
+        self.assertEqual(select('A').fetch(), [1, 2, '12345678901234567890'])
+
+    def test_widen_to_no_affinity(self):
+        select = Select([['A'], ['1'], ['2']], infer_types=True)
+        select.create_index('A')
+        select.load_data([['A'], ['007'], ['n/a']])
+        self.assertEqual(self.get_types(select), [''])
+        self.assertEqual(select('A').fetch(), [1, 2, '007', 'n/a'])
+
+        cursor = select._connection.cursor()
+        cursor.execute('PRAGMA index_list({0})'.format(select._table))
+        self.assertEqual(len(cursor.fetchall()), 1, msg='index should be rebuilt')
+
+    def test_non_numeric_text_fits(self):
+        select = Select([['A'], ['1'], ['2']], infer_types=True)
+        select.load_data([['A'], ['n/a']])
+        self.assertEqual(self.get_types(select), ['INTEGER'])
+        self.assertEqual(select('A').fetch(), [1, 2, 'n/a'])
+
+
+class LoaderWarning(UserWarning):
+    pass
+
+
+def warning_predicate(value):
+    """Predicate for TestParallelLoading that emits warnings."""
+    warnings.warn('loader warning', LoaderWarning)
+    warnings.warn('deprecated', DeprecationWarning)
+    return True
+
+
+class TestParallelLoading(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+        contents = [
+            b'A,B\nx,1\ny,2\n',
+            b'A,C\nz,3\n',
+            b'B,C,D\n4,5,6\n7,8,9\n',
+        ]
+        self.paths = []
+        for index, content in enumerate(contents):
+            path = os.path.join(self.tmpdir, 'file{0}.csv'.format(index))
+            with open(path, 'wb') as fh:
+                fh.write(content)
+            self.paths.append(path)
+
+    def test_matches_sequential(self):
+        sequential = Select(self.paths)
+        parallel = Select(self.paths, workers=2)
+        self.assertEqual(parallel.fieldnames, sequential.fieldnames)
+        self.assertEqual(list(parallel), list(sequential))
+
+    def test_glob_and_infer_types(self):
+        pattern = os.path.join(self.tmpdir, '*.csv')
+        select = Select(pattern, workers=2, infer_types=True)
+        self.assertEqual(select.fieldnames, ['A', 'B', 'C', 'D'])
+        self.assertEqual(select('B').sum().fetch(), 14)
+
+    def test_fallback_encoding_warning(self):
+        path = os.path.join(self.tmpdir, 'latin1.csv')
+        with open(path, 'wb') as fh:
+            fh.write(b'A,B\nx,\xe9\n')
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            select = Select(self.paths + [path], workers=2)
+        self.assertEqual(len(caught), 1)
+        self.assertIn('fallback', str(caught[0].message))
+        self.assertEqual(select({'A': 'B'}).fetch()['x'], ['1', u'\xe9'])
+
+    def test_warning_categories(self):
+        def get_warnings(workers):
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                warnings.simplefilter('ignore', DeprecationWarning)
+                Select(self.paths[:2], workers=workers,
+                       where={'A': warning_predicate})
+            return [(x.category, str(x.message)) for x in caught]
+
+        sequential = get_warnings(workers=None)
+        self.assertEqual(sequential, [(LoaderWarning, 'loader warning')] * 3)
+        self.assertEqual(get_warnings(workers=2), sequential)
+
+
+class TestSchemaUnion(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+        contents = [
+            b'A,B\nx,1\ny,2\n',
+            b'C,A\n3,z\n',
+            b'',  # <- Empty file.
+            b'B,D,C\n4,5,6\n',
+        ]
+        self.paths = []
+        for index, content in enumerate(contents):
+            path = os.path.join(self.tmpdir, 'file{0}.csv'.format(index))
+            with open(path, 'wb') as fh:
+                fh.write(content)
+            self.paths.append(path)
+
+    def load_one_at_a_time(self, **kwds):
+        select = Select()
+        for path in self.paths:
+            select.load_data(path, **kwds)
+        return select
+
+    def test_matches_one_at_a_time(self):
+        expected = self.load_one_at_a_time()
+        select = Select(self.paths)
+        self.assertEqual(select.fieldnames, ['A', 'B', 'C', 'D'])
+        self.assertEqual(select.fieldnames, expected.fieldnames)
+        self.assertEqual(list(select), list(expected))
+
+    def test_projection(self):
+        expected = self.load_one_at_a_time(columns=['D', 'C'])
+        select = Select(self.paths, columns=['D', 'C'])
+        self.assertEqual(select.fieldnames, ['C', 'D'])
+        self.assertEqual(list(select), list(expected))
+
+    @unittest.skipUnless(hasattr(sqlite3.Connection, 'set_trace_callback'),
+                         'requires set_trace_callback()')
+    def test_single_schema_change(self):
+        select = Select([['A'], ['w']])
+        statements = []
+
+        def trace(sql):
+            statements.append(sql)
+
+        select._connection.set_trace_callback(trace)
+        try:
+            select.load_data(self.paths)
+        finally:
+            select._connection.set_trace_callback(None)
+
+        first_insert = next(i for i, x in enumerate(statements)
+                            if x.startswith('INSERT'))
+        alter_statements = [x for x in statements[first_insert:]
+                            if x.startswith('ALTER')]
+        self.assertEqual(alter_statements, [], msg='schema set before inserts')
+        self.assertEqual(select.fieldnames, ['A', 'B', 'C', 'D'])
+
+
+class TestPipelinedLoading(unittest.TestCase):
+    def setUp(self):
+        self.data = [['A', 'B']] + [[str(x), x % 7] for x in range(2500)]
+
+    def test_matches_unpipelined(self):
+        expected = Select(self.data, infer_types=True)
+        select = Select(self.data, infer_types=True, pipeline=True)
+        self.assertEqual(list(select), list(expected))
+
+        fh = StringIO('A,B\nx,1\ny,2\n')
+        fh.name = 'myfile.csv'
+        select = Select(fh, pipeline=True, where={'B': '2'})
+        self.assertEqual(list(select), [['y', '2']])
+
+    def test_reader_error(self):
+        def records():
+            yield ['A', 'B']
+            yield ['x', 1]
+            raise ValueError('bad record')
+
+        with self.assertRaises(ValueError):
+            Select(records(), pipeline=True)
+
+    def test_insert_error(self):
+        data = self.data + [['x', 1, 'extra']]
+        with self.assertRaises(sqlite3.ProgrammingError):
+            Select(data, pipeline=True)
+
+    def test_throughput_logged(self):
+        messages = []
+
+        class Handler(logging.Handler):
+            def emit(self, record):
+                messages.append(record.getMessage())
+
+        logger = logging.getLogger('squint._vendor.temptable')
+        handler = Handler()
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        self.addCleanup(logger.setLevel, logger.level)
+        logger.setLevel(logging.DEBUG)
+
+        Select(self.data, pipeline=True)
+        self.assertEqual(len(messages), 1)
+        self.assertIn('loaded 2500 records', messages[0])
+
+
+def where_function(value):
+    """Picklable predicate for TestLoadCache."""
+    return value == 'x'
+
+
+class TestLoadCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.cache_dir = os.path.join(self.tmpdir, 'cache')
+
+        self.path = os.path.join(self.tmpdir, 'data.csv')
+        with open(self.path, 'wb') as fh:
+            fh.write(b'A,B\nx,1\ny,2\n')
+
+    def get_cache_files(self):
+        return [x for x in os.listdir(self.cache_dir) if x.endswith('.sqlite3')]
+
+    def test_cache_hit(self):
+        select = Select(self.path, cache_dir=self.cache_dir)
+        self.assertEqual(list(select), [['x', '1'], ['y', '2']])
+
+        cache_files = self.get_cache_files()
+        self.assertEqual(len(cache_files), 1)
+
+        # Alter cached data to verify that the cache is used.
+        connection = sqlite3.connect(os.path.join(self.cache_dir, cache_files[0]))
+        connection.execute("INSERT INTO data VALUES ('z', '3')")
+        connection.commit()
+        connection.close()
+
+        select = Select(self.path, cache_dir=self.cache_dir)
+        self.assertEqual(list(select), [['x', '1'], ['y', '2'], ['z', '3']])
+
+    def test_changed_file_or_arguments(self):
+        Select(self.path, cache_dir=self.cache_dir)
+        Select(self.path, cache_dir=self.cache_dir, delimiter=';')
+        self.assertEqual(len(self.get_cache_files()), 2)
+
+        with open(self.path, 'ab') as fh:
+            fh.write(b'z,3\n')
+
+        select = Select(self.path, cache_dir=self.cache_dir)
+        self.assertEqual(len(self.get_cache_files()), 3)
+        self.assertEqual(select('A').fetch(), ['x', 'y', 'z'])
+
+    def test_where_function_not_cached(self):
+        select = Select(self.path, cache_dir=self.cache_dir,
+                        where={'A': where_function})
+        self.assertEqual(select('A').fetch(), ['x'])
+        select = Select(self.path, cache_dir=self.cache_dir,
+                        where={'A': Predicate(where_function)})
+        self.assertEqual(select('A').fetch(), ['x'])
+        self.assertFalse(os.path.isdir(self.cache_dir) and self.get_cache_files())
+
+        select = Select(self.path, cache_dir=self.cache_dir, where={'A': 'y'})
+        self.assertEqual(select('A').fetch(), ['y'])
+        self.assertEqual(len(self.get_cache_files()), 1)
+
+    def test_warnings_replayed(self):
+        with open(self.path, 'wb') as fh:
+            fh.write(b'A,B\nx,\xe9\n')
+
+        for _ in range(2):
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                select = Select(self.path, cache_dir=self.cache_dir)
+            self.assertEqual(len(caught), 1)
+            self.assertEqual(select('B').fetch(), [u'\xe9'])
+
+
+class TestEncodingFallback(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'data.csv')
+
+    def load(self, content):
+        with open(self.path, 'wb') as fh:
+            fh.write(content)
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            select = Select(self.path)
+        return select, [str(x.message) for x in caught]
+
+    def test_utf8(self):
+        select, messages = self.load(b'\xef\xbb\xbfA\nx\n\xc3\xa9\n')
+        self.assertEqual(select.fieldnames, ['A'])  # <- BOM removed.
+        self.assertEqual(select('A').fetch(), ['x', u'\xe9'])
+        self.assertEqual(messages, [])
+
+    def test_fallback_from_prefix(self):
+        select, messages = self.load(b'A\nx\n\xe9\n')
+        self.assertEqual(select('A').fetch(), ['x', u'\xe9'])
+        self.assertEqual(len(messages), 1)
+        self.assertIn("using fallback 'latin-1'", messages[0])
+
+    def test_switch_after_prefix(self):
+        rows = b'x\n' * 40000  # <- Larger than sniffed prefix.
+        select, messages = self.load(b'A\n\xc3\xa9\n' + rows + b'\xe9\n')
+
+        values = select('A').fetch()
+        self.assertEqual(len(values), 40002)
+        self.assertEqual(values[0], u'\xe9', msg='decoded as UTF-8')
+        self.assertEqual(values[-1], u'\xe9', msg='decoded as latin-1')
+        self.assertEqual(len(messages), 1)
+
+    def test_decoder_is_iterator(self):
+        with open(self.path, 'wb') as fh:
+            fh.write(b'A,B\nx,1\n')
+        lines = FallbackDecoder(self.path, ['utf-8'])
+        self.addCleanup(lines.close)
+        self.assertIs(iter(lines), lines)
+        self.assertEqual(next(iter(lines)), 'A,B\n')
+        self.assertEqual(list(iter(lines)), ['x,1\n'])  # <- Not restarted.
+
+    def test_line_endings(self):
+        select, messages = self.load(b'A,B\r1,2\r3,4\r')  # <- CR only.
+        self.assertEqual(list(select), [['1', '2'], ['3', '4']])
+
+        select, messages = self.load(b'A,B\r\n1,"x\ry"\r\n3,4\n5,6')
+        self.assertEqual(list(select), [['1', 'x\ry'], ['3', '4'], ['5', '6']])
+
+
+class TestCompressedFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+    def get_openers(self):
+        openers = [('data.csv.gz', gzip.GzipFile), ('data.csv.bz2', bz2.BZ2File)]
+        if lzma:
+            openers.append(('data.csv.xz', lzma.LZMAFile))
+        return openers
+
+    def write(self, name, opener, content):
+        path = os.path.join(self.tmpdir, name)
+        fh = opener(path, 'wb')
+        try:
+            fh.write(content)
+        finally:
+            fh.close()
+        return path
+
+    def test_paths(self):
+        content = b'A,B\nx,1\ny,2\n'
+        paths = [self.write(x, y, content) for x, y in self.get_openers()]
+        for path in paths:
+            select = Select(path)
+            self.assertEqual(list(select), [['x', '1'], ['y', '2']], msg=path)
+
+    def test_file_object(self):
+        for name, opener in self.get_openers():
+            path = self.write(name, opener, b'A,B\nx,1\n')
+            with open(path, 'rb') as fh:
+                select = Select(fh)
+            self.assertEqual(list(select), [['x', '1']], msg=name)
+
+    def test_text_wrapper(self):
+        content = u'A,B\nx,\xe9\n'.encode('utf-16')  # <- Not ASCII-compatible.
+        for name, opener in self.get_openers():
+            path = self.write(name, opener, content)
+            select = Select(path, encoding='utf-16')
+            self.assertEqual(list(select), [['x', u'\xe9']], msg=name)
+
+            with open(path, 'rb') as fh:
+                select = Select(fh, encoding='utf-16')
+            self.assertEqual(list(select), [['x', u'\xe9']], msg=name)
+
+    def test_encoding_fallback(self):
+        rows = b'x\n' * 40000  # <- Larger than sniffed prefix.
+        content = b'A\n\xc3\xa9\n' + rows + b'\xe9\n'
+        path = self.write('data.csv.gz', gzip.GzipFile, content)
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            select = Select(path)
+
+        values = select('A').fetch()
+        self.assertEqual(len(values), 40002)
+        self.assertEqual(values[0], u'\xe9', msg='decoded as UTF-8')
+        self.assertEqual(values[-1], u'\xe9', msg='decoded as latin-1')
+        self.assertEqual(len(caught), 1)
+
+    def test_refresh_reloads(self):
+        path = self.write('data.csv.gz', gzip.GzipFile, b'A\nx\n')
+        select = Select(path)
+        self.write('data.csv.gz', gzip.GzipFile, b'A\nx\ny\n')
+        select.refresh()
+        self.assertEqual(select('A').fetch(), ['x', 'y'])
+
+
+class TestFromSqlite(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'data.sqlite3')
+
+        connection = sqlite3.connect(self.path)
+        connection.execute('CREATE TABLE mytable (A TEXT, B INTEGER)')
+        connection.executemany('INSERT INTO mytable VALUES (?, ?)',
+                               [('x', 1), ('y', 2), ('z', 3)])
+        connection.commit()
+        connection.close()
+
+    def test_queries(self):
+        select = Select.from_sqlite(self.path, 'mytable')
+        self.assertEqual(select.fieldnames, ['A', 'B'])
+        self.assertEqual(select('A', B=lambda x: x > 1).fetch(), ['y', 'z'])
+        self.assertEqual(select('B').sum().fetch(), 6)
+        self.assertEqual(repr(select), '<Select ({0!r}, {1!r})>'.format(
+            self.path, 'mytable'))
+
+    def test_no_copy(self):
+        select = Select.from_sqlite(self.path, 'mytable')
+
+        connection = sqlite3.connect(self.path)
+        connection.execute("INSERT INTO mytable VALUES ('w', 4)")
+        connection.commit()
+        connection.close()
+
+        self.assertEqual(select('A').fetch(), ['x', 'y', 'z', 'w'])
+
+    def test_load_data_copies_table(self):
+        select = Select.from_sqlite(self.path, 'mytable')
+        select.load_data([['A', 'C'], ['w', 'foo']])
+        select.create_index('A')
+        self.assertEqual(select.fieldnames, ['A', 'B', 'C'])
+        self.assertEqual(select({'A'}).fetch(), set(['x', 'y', 'z', 'w']))
+
+        other = Select.from_sqlite(self.path, 'mytable')  # <- File unchanged.
+        self.assertEqual(other('A').fetch(), ['x', 'y', 'z'])
+
+    def get_schemas(self, select):
+        cursor = select._connection.cursor()
+        cursor.execute('PRAGMA database_list')
+        return [x[1] for x in cursor.fetchall()]
+
+    def test_read_only(self):
+        select = Select.from_sqlite(self.path, 'mytable')
+        self.addCleanup(select.close)
+        schema = self.get_schemas(select)[-1]
+        cursor = select._connection.cursor()
+        with self.assertRaises(sqlite3.OperationalError):
+            cursor.execute("INSERT INTO {0}.mytable VALUES ('w', 4)".format(schema))
+
+    def test_attached_per_connection(self):
+        cursors = [sqlite3.connect(':memory:').cursor() for _ in range(2)]
+        for cursor in cursors:
+            self.addCleanup(cursor.connection.close)
+            schema = squint.select._attach_database(cursor, self.path)
+            cursor.execute('SELECT COUNT(*) FROM {0}.mytable'.format(schema))
+            self.assertEqual(cursor.fetchall(), [(3,)])
+
+        for cursor in cursors:
+            squint.select._detach_database(cursor, self.path)
+            cursor.execute('PRAGMA database_list')
+            self.assertEqual(len(cursor.fetchall()), 1, msg='detached')
+
+    def test_detached(self):
+        for _ in range(12):  # <- SQLite attaches at most 10 by default.
+            select = Select.from_sqlite(self.path, 'mytable')
+            select.close()
+
+        select = Select.from_sqlite(self.path, 'mytable')
+        self.addCleanup(select.close)
+        schemas = self.get_schemas(select)
+        select.load_data([['A', 'B'], ['w', 4]])  # <- Table is copied.
+        self.assertEqual(len(self.get_schemas(select)), len(schemas) - 1)
+
+    def test_stats(self):
+        select = Select.from_sqlite(self.path, 'mytable')
+        stats = select.stats()
+        self.assertEqual(stats['A'], {'count': 3, 'empty': 0, 'min': 'x',
+                                      'max': 'z', 'distinct': 3})
+        self.assertEqual(stats['B']['count'], 3)
+        self.assertEqual(stats['B']['max'], 3)
+
+    def test_missing_table_or_file(self):
+        with self.assertRaises(sqlite3.OperationalError):
+            Select.from_sqlite(self.path, 'missing')
+
+        with self.assertRaises(EnvironmentError):  # <- FileNotFoundError
+            Select.from_sqlite(os.path.join(self.tmpdir, 'missing.db'), 'x')
+
+
+class TestRefresh(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path1 = os.path.join(self.tmpdir, 'file1.csv')
+        self.path2 = os.path.join(self.tmpdir, 'file2.csv')
+        self.write(self.path1, 'A,B\nx,1\n')
+        self.write(self.path2, 'A,B\ny,2\n')
+
+    def write(self, path, content, mode='w'):
+        with open(path, mode + 'b') as fh:
+            fh.write(content.encode('ascii'))
+
+    def test_unchanged(self):
+        select = Select([self.path1, self.path2])
+        select.refresh()
+        self.assertEqual(list(select), [['x', '1'], ['y', '2']])
+
+    def test_appended(self):
+        select = Select([self.path1, self.path2])
+        self.write(self.path1, 'x,3\nx,4\n', mode='a')
+        select.refresh()
+        self.assertEqual(select('B').fetch(), ['1', '2', '3', '4'])
+
+        self.write(self.path1, 'x,5\n', mode='a')
+        self.write(self.path2, 'y,6\n', mode='a')
+        select.refresh()
+        self.assertEqual(select('B').fetch(), ['1', '2', '3', '4', '5', '6'])
+
+    def test_unterminated_line(self):
+        select = Select(self.path1)
+        self.write(self.path1, 'y,ab', mode='a')  # <- Row is still being written.
+        select.refresh()
+        self.assertEqual(list(select), [['x', '1']])
+
+        self.write(self.path1, 'cd\nz,4\n', mode='a')
+        select.refresh()
+        self.assertEqual(list(select), [['x', '1'], ['y', 'abcd'], ['z', '4']])
+
+    def test_unterminated_line_loaded(self):
+        self.write(self.path1, 'y,ab', mode='a')
+        select = Select(self.path1)  # <- Last line is loaded as-is.
+        self.assertEqual(list(select), [['x', '1'], ['y', 'ab']])
+
+        self.write(self.path1, 'cd\nz,4\n', mode='a')
+        select.refresh()
+        self.assertEqual(list(select), [['x', '1'], ['y', 'abcd'], ['z', '4']])
+
+        self.write(self.path1, 'w,5\n', mode='a')
+        select.refresh()
+        self.assertEqual(select('A').fetch(), ['x', 'y', 'z', 'w'])
+
+    @unittest.skipIf(version_info < (3, 0), 'non-ASCII column names require Python 3')
+    def test_appended_after_encoding_switch(self):
+        rows = b'x,1\n' * 40000  # <- Larger than sniffed prefix.
+        with open(self.path1, 'wb') as fh:
+            fh.write(b'A,\xc3\xa9\n' + rows + b'\xe9,2\n')  # <- Switch to latin-1.
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            select = Select(self.path1)
+        self.assertEqual(select.fieldnames, ['A', u'\xe9'])
+
+        self.write(self.path1, 'y,3\n', mode='a')
+        select.refresh()
+        self.assertEqual(select.fieldnames, ['A', u'\xe9'], msg='header decoded as UTF-8')
+        self.assertEqual(select('A').fetch()[-2:], [u'\xe9', 'y'])
+
+    def test_appended_new_column(self):
+        self.write(self.path1, 'A,C\n')  # <- Header only.
+        select = Select([self.path1, self.path2])
+        self.write(self.path1, 'z,9\n', mode='a')
+        select.refresh()
+        self.assertEqual(select.fieldnames, ['A', 'C', 'B'])
+        self.assertEqual(list(select), [['y', '', '2'], ['z', '9', '']])
+
+    def test_rewritten(self):
+        select = Select([self.path1, self.path2])
+        self.write(self.path1, 'A,B\nw,0\nw,0\nw,0\n')
+        select.refresh()
+        self.assertEqual(list(select), [['y', '2'], ['w', '0'], ['w', '0'], ['w', '0']])
+
+    def test_truncated(self):
+        select = Select([self.path1, self.path2])
+        self.write(self.path1, 'x,3\n', mode='a')
+        select.refresh()
+        self.write(self.path1, 'A,B\n')
+        select.refresh()
+        self.assertEqual(list(select), [['y', '2']])
+
+    def test_typed_column_rebuild(self):
+        select = Select(self.path1, infer_types=True)
+        self.write(self.path1, 'x,n/a\nx,007\n', mode='a')  # <- Widens column.
+        select.refresh()
+        self.write(self.path1, 'A,B\nv,5\n')
+        select.refresh()
+        self.assertEqual(list(select), [['v', '5']])  # <- Column is untyped.
+
+    def test_other_sources_unaffected(self):
+        select = Select([['A', 'B'], ['z', 9]])
+        select.load_data(self.path1)
+        self.write(self.path1, 'A,B\nw,0\n')
+        select.refresh()
+        self.assertEqual(list(select), [['z', 9], ['w', '0']])
+
+
+class TestColumnProjection(unittest.TestCase):
+    def setUp(self):
+        self.data = [['A', 'B', 'C'], ['x', 1, 'foo'], ['y', 2, 'bar']]
+
+    def test_columns(self):
+        select = Select(self.data, columns=['C', 'A'])
+        self.assertEqual(select.fieldnames, ['A', 'C'])
+        self.assertEqual(list(select), [['x', 'foo'], ['y', 'bar']])
+
+        with self.assertRaises(LookupError):
+            select('B')
+
+    def test_single_column_string(self):
+        select = Select(self.data, columns='B')
+        self.assertEqual(select.fieldnames, ['B'])
+        self.assertEqual(select('B').fetch(), [1, 2])
+
+    def test_exclude(self):
+        select = Select(self.data, exclude=['B'])
+        self.assertEqual(select.fieldnames, ['A', 'C'])
+
+        select = Select(self.data, columns=['A', 'B'], exclude='A')
+        self.assertEqual(select.fieldnames, ['B'])
+
+    def test_dict_records(self):
+        records = [{'A': 'x', 'B': 1}, {'A': 'y', 'B': 2}]
+        select = Select(records, columns=['B'])
+        self.assertEqual(select.fieldnames, ['B'])
+        self.assertEqual(select('B').fetch(), [1, 2])
+
+    def test_csv_and_multiple_sources(self):
+        fh = StringIO('A,B,C\nx,1,foo\n')
+        fh.name = 'myfile.csv'
+        select = Select(fh, columns=['A', 'D'])
+        select.load_data([['C', 'D'], ['bar', 'baz']], columns=['A', 'D'])
+        self.assertEqual(list(select), [['x', ''], ['', 'baz']])
+
+    def test_no_matching_columns(self):
+        select = Select(self.data, columns=['D'])
+        self.assertEqual(select.fieldnames, [])
+
+    def test_bad_row_length(self):
+        data = [['A', 'B'], ['x', 1], ['y']]
+        with self.assertRaises(sqlite3.ProgrammingError) as cm:
+            Select(data, columns=['A'])
+        self.assertIn('too few or too many values', str(cm.exception))
+
+
+class TestDeferredIndexes(unittest.TestCase):
+    def setUp(self):
+        self.select = Select([['A', 'B'], ['x', 1], ['y', 2]])
+        self.select.create_index('A')
+        self.cursor = self.select._connection.cursor()
+
+    def get_index_names(self):
+        self.cursor.execute(
+            "SELECT name FROM sqlite_temp_master "
+            "WHERE type='index' AND tbl_name=?",
+            (self.select._table,),
+        )
+        return [x[0] for x in self.cursor.fetchall()]
+
+    def test_load_data(self):
+        index_names = self.get_index_names()
+        self.assertEqual(len(index_names), 1)
+
+        self.select.load_data([['A', 'B'], ['z', 3]])
+        self.assertEqual(self.get_index_names(), index_names)
+        self.assertEqual(self.select({'A'}).fetch(), set(['x', 'y', 'z']))
+
+    def test_bulk_load(self):
+        index_names = self.get_index_names()
+        with self.select.bulk_load():
+            self.select.load_data([['A', 'B'], ['z', 3]])
+            self.assertEqual(self.get_index_names(), [])
+
+            with self.select.bulk_load():  # <- Nested block.
+                self.select.load_data([['A', 'C'], ['w', 'foo']])
+            self.assertEqual(self.get_index_names(), [])
+
+        self.assertEqual(self.get_index_names(), index_names)
+        self.assertEqual(self.select({'A'}).fetch(), set(['x', 'y', 'z', 'w']))
+
+    def test_create_index_in_block(self):
+        index_names = self.get_index_names()
+        with self.select.bulk_load():
+            self.select.load_data([['A', 'B'], ['z', 3]])
+            self.select.create_index('A')  # <- Re-created inside block.
+            self.select.create_index('B')
+        self.assertEqual(len(self.get_index_names()), 2)
+        self.assertIn(index_names[0], self.get_index_names())
+
+    def test_failed_load(self):
+        index_names = self.get_index_names()
+        with self.assertRaises(Exception):
+            self.select.load_data([['A', 'B'], ['z', 3, 'extra']])
+        self.assertEqual(self.get_index_names(), index_names)
+
+        with self.assertRaises(Exception):
+            with self.select.bulk_load():
+                self.select.load_data([['A', 'B'], ['z', 3]])
+                raise Exception('error in block')
+        self.assertEqual(self.get_index_names(), index_names)
+
+
+class TestLoadFilter(unittest.TestCase):
+    def setUp(self):
+        self.data = [
+            ['A', 'B', 'C'],
+            ['x', 'west', '1'],
+            ['y', 'east', '2'],
+            ['z', 'west', '3'],
+        ]
+
+    def test_equality(self):
+        select = Select(self.data, where={'B': 'west'})
+        self.assertEqual(select('A').fetch(), ['x', 'z'])
+
+    def test_predicates(self):
+        select = Select(self.data, where={'A': {'x', 'y'}})
+        self.assertEqual(select('A').fetch(), ['x', 'y'])
+
+        select = Select(self.data, where={'C': lambda x: int(x) > 1})
+        self.assertEqual(select('A').fetch(), ['y', 'z'])
+
+        regex = re.compile('^e')
+        select = Select(self.data, where={'A': {'x', 'z'}, 'B': regex})
+        self.assertEqual(select('A').fetch(), [])
+
+    def test_same_as_call(self):
+        where = {'B': re.compile('st$'), 'C': {'1', '2'}}
+        expected = Select(self.data)('A', **where).fetch()
+        self.assertEqual(Select(self.data, where=where)('A').fetch(), expected)
+
+    def test_filtered_column_not_loaded(self):
+        select = Select(self.data, columns=['A'], where={'B': 'east'})
+        self.assertEqual(select.fieldnames, ['A'])
+        self.assertEqual(select('A').fetch(), ['y'])
+
+    def test_missing_column(self):
+        select = Select(self.data)
+        select.load_data([['A', 'D'], ['w', 'foo']], where={'B': 'west'})
+        self.assertEqual(select.fieldnames, ['A', 'B', 'C', 'D'])
+        self.assertEqual(select('A').fetch(), ['x', 'y', 'z'])
+
+        select.load_data([['A', 'D'], ['v', 'bar']], where={'B': ''})
+        self.assertEqual(select('A').fetch(), ['x', 'y', 'z', 'v'])
+
+    def test_csv_file(self):
+        fh = StringIO('A,B\nx,west\ny,east\n')
+        fh.name = 'myfile.csv'
+        select = Select(fh, where={'B': 'east'})
+        self.assertEqual(list(select), [['y', 'east']])
+
+    def test_dict_value(self):
+        with self.assertRaises(ValueError):
+            Select(self.data, where={'B': {}})
+
+
+class TestStats(unittest.TestCase):
+    def setUp(self):
+        self.data = [
+            ['A', 'B'],
+            ['x', '3'],
+            ['y', ''],
+            ['x', '1'],
+        ]
+
+    def test_stats(self):
+        select = Select(self.data)
+        expected = {
+            'A': {'count': 3, 'empty': 0, 'min': 'x', 'max': 'y', 'distinct': 2},
+            'B': {'count': 3, 'empty': 1, 'min': '', 'max': '3', 'distinct': 3},
+        }
+        self.assertEqual(select.stats(), expected)
+
+    def test_empty_select(self):
+        self.assertEqual(Select().stats(), {})
+
+    def test_incremental_update(self):
+        select = Select(self.data)
+        select.stats()  # <- Compute distinct counts.
+        select.load_data([['A', 'B'], ['z', '0']])
+        self.assertIsNotNone(select._stats)  # <- Catalog is kept.
+
+        stats = select.stats()
+        self.assertEqual(stats['A'], {'count': 4, 'empty': 0, 'min': 'x',
+                                      'max': 'z', 'distinct': 3})
+        self.assertEqual(stats['B']['min'], '')
+        self.assertEqual(stats['B']['max'], '3')
+
+    def test_new_column(self):
+        select = Select(self.data)
+        select.stats()
+        select.load_data([['A', 'C'], ['z', 'foo']])
+        select._update_stats()
+        self.assertIsNone(select._stats)  # <- Must be rebuilt.
+
+        stats = select.stats()
+        self.assertEqual(stats['C'], {'count': 4, 'empty': 3, 'min': '',
+                                      'max': 'foo', 'distinct': 2})
+        self.assertEqual(stats['B']['empty'], 2)
+
+    def test_matches_query_aggregates(self):
+        data = [['A', 'B'], ['x', 10], ['y', 'abc'], ['z', None], ['w', 2.5]]
+        select = Select(data)
+        stats = select.stats()
+        select._stats = None  # <- Compute with SQL instead of catalog.
+        self.assertEqual(stats['B']['count'], select('B').count().fetch())
+        self.assertEqual(stats['B']['min'], select('B').min().fetch())
+        self.assertEqual(stats['B']['max'], select('B').max().fetch())
+
+    def test_aggregates_use_catalog(self):
+        select = Select(self.data)
+        select.stats()
+        select._stats['A']['max'] = 'catalog value'
+        self.assertEqual(select('A').max().fetch(), 'catalog value')
+
+        # Where conditions are not handled by the catalog.
+        self.assertEqual(select('A', B='3').max().fetch(), 'x')
+
+    def test_computed_when_used(self):
+        calls = []
+        get_column_stats = squint.select._get_column_stats
+
+        def counting(*args, **kwds):
+            calls.append(args)
+            return get_column_stats(*args, **kwds)
+
+        squint.select._get_column_stats = counting
+        self.addCleanup(setattr, squint.select, '_get_column_stats',
+                        get_column_stats)
+
+        select = Select(self.data)
+        select.load_data([['A', 'B'], ['z', '0']])
+        self.assertEqual(calls, [], msg='should not read rows when loading')
+
+        self.assertEqual(select('A').max().fetch(), 'z')
+        self.assertEqual(len(calls), 1, msg='should read new rows once')
+
+        self.assertEqual(select('A').min().fetch(), 'x')
+        self.assertEqual(len(calls), 1, msg='should use updated catalog')
+
+    def test_failed_load(self):
+        select = Select(self.data)
+        expected = select.stats()
+        with self.assertRaises(Exception):
+            select.load_data([['A', 'B'], ['z', '0'], ['foo']], strict=True)
+        self.assertEqual(select.stats(), expected)
+
+
+class TestDictionaryEncoding(unittest.TestCase):
+    def setUp(self):
+        self.data = [['A', 'B', 'C']]
+        for i in range(10):
+            self.data.append(['x', 'east' if i % 2 else 'west', str(i)])
+
+    def get_stored(self, select, column):
+        cursor = select._connection.cursor()
+        cursor.execute('SELECT {0} FROM {1}'.format(column, select._table))
+        return [x[0] for x in cursor]
+
+    def get_codes(self, select, column):
+        return dict((v, c) for (_, v), c in select._codes[column].items())
+
+    def test_stored_as_codes(self):
+        select = Select(self.data, encode='B')
+        self.assertEqual(set(self.get_stored(select, 'B')), set([1, 2]))
+        self.assertEqual(select('B').fetch(), [x[1] for x in self.data[1:]])
+
+    def test_query_results(self):
+        plain = Select(self.data)
+        select = Select(self.data, encode=['A', 'B'])
+        self.assertEqual(list(select), list(plain))
+        self.assertEqual(select({'B': 'C'}).fetch(), plain({'B': 'C'}).fetch())
+        self.assertEqual(select({'B'}).fetch(), set(['east', 'west']))
+        self.assertEqual(select('B').max().fetch(), 'west')
+        self.assertEqual(select('B').count().fetch(), 10)
+
+    def test_where_conditions(self):
+        plain = Select(self.data)
+        select = Select(self.data, encode='B')
+        conditions = [
+            'east',
+            set(['west']),
+            re.compile('^e'),
+            lambda x: x.startswith('w'),
+        ]
+        for condition in conditions:
+            self.assertEqual(select('C', B=condition).fetch(),
+                             plain('C', B=condition).fetch())
+
+    def test_missing_column(self):
+        select = Select(self.data, encode='B')
+        select.load_data([['A', 'C'], ['y', '10']])
+        self.assertEqual(select('B', A='y').fetch(), [''])
+        self.assertTrue(all(isinstance(x, int) for x in self.get_stored(select, 'B')))
+
+        select.load_data([['A', 'D'], ['z', 'foo']], encode='D')
+        self.assertEqual(select('D').fetch(), [''] * 11 + ['foo'])
+
+    def test_later_loads(self):
+        select = Select(self.data, encode='B')
+        select.load_data([['A', 'B'], ['y', 'north'], ['y', 'east']])
+        self.assertEqual(select('B', A='y').fetch(), ['north', 'east'])
+        self.assertEqual(self.get_codes(select, 'B'), {'west': 1, 'east': 2, 'north': 3})
+
+    def test_equal_values_of_other_types(self):
+        data = [['A', 'B'], [1, 'x'], [1.0, 'y'], [True, 'z'], [1, 'w']]
+        select = Select(data, encode='A')
+        self.assertEqual(len(select._codes['A']), 3)
+        values = select('A').fetch()
+        self.assertEqual(values, [1, 1.0, 1, 1])  # <- SQLite stores True as 1.
+        self.assertEqual([type(x) for x in values], [int, float, int, int])
+
+    def test_already_loaded(self):
+        select = Select(self.data)
+        with self.assertRaises(ValueError):
+            select.load_data([['A', 'B'], ['y', 'east']], encode='B')
+
+    def test_auto_encode(self):
+        data = self.data[:1] + self.data[1:] * 10
+        select = Select(data, encode=True)
+        self.assertEqual(sorted(select._codes), ['A', 'B'])  # <- Not 'C'.
+        self.assertEqual(list(select), list(Select(data)))
+
+    def test_failed_load(self):
+        select = Select(self.data, encode='B')
+        with self.assertRaises(Exception):
+            select.load_data([['A', 'B'], ['y', 'north'], ['foo']], strict=True)
+        self.assertEqual(self.get_codes(select, 'B'), {'west': 1, 'east': 2})
+
+        select.load_data([['A', 'B'], ['y', 'south']])
+        self.assertEqual(select('B', A='y').fetch(), ['south'])
+
+    def test_workers_and_refresh(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        paths = []
+        for index, content in enumerate([b'A,B\nx,1\n', b'A,B\ny,2\n']):
+            path = os.path.join(tmpdir, 'file{0}.csv'.format(index))
+            with open(path, 'wb') as fh:
+                fh.write(content)
+            paths.append(path)
+
+        select = Select(paths, workers=2, encode='A')
+        self.assertEqual(self.get_codes(select, 'A'), {'x': 1, 'y': 2})
+        self.assertEqual(select({'A': 'B'}).fetch(), {'x': ['1'], 'y': ['2']})
+
+        with open(paths[0], 'ab') as fh:
+            fh.write(b'z,3\n')
+        select.refresh()
+        self.assertEqual(select('B', A='z').fetch(), ['3'])
+        self.assertEqual(set(self.get_stored(select, 'A')), set([1, 2, 3]))
+
+
+class TestLazyLoading(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path1 = os.path.join(self.tmpdir, 'file1.csv')
+        self.path2 = os.path.join(self.tmpdir, 'file2.csv')
+        with open(self.path1, 'wb') as fh:
+            fh.write(b'A,B\nx,1\ny,2\n')
+        with open(self.path2, 'wb') as fh:
+            fh.write(b'A,C\nz,3\n')
+
+    def test_loaded_on_first_query(self):
+        select = Select([self.path1, self.path2], lazy=True)
+        self.assertIsNone(select._table)
+        self.assertEqual(select.fieldnames, ['A', 'B', 'C'])
+
+        query = select('A', B='1')
+        self.assertIsNone(select._table)  # <- Not loaded by making a query.
+
+        self.assertEqual(query.fetch(), ['x'])
+        self.assertIsNotNone(select._table)
+        self.assertEqual(list(select), list(Select([self.path1, self.path2])))
+
+    def test_lazy_after_loaded(self):
+        select = Select(self.path1)
+        select.load_data(self.path2, lazy=True)
+        self.assertEqual(select.fieldnames, ['A', 'B', 'C'])
+        self.assertEqual(select('A').fetch(), ['x', 'y', 'z'])
+
+    def test_headers_read_once(self):
+        calls = []
+        read_header = squint.select.read_header
+        def counting_read_header(*args, **kwds):
+            calls.append(args[0])
+            return read_header(*args, **kwds)
+        squint.select.read_header = counting_read_header
+        self.addCleanup(setattr, squint.select, 'read_header', read_header)
+
+        select = Select([self.path1, self.path2], lazy=True)
+        self.assertEqual(select.fieldnames, ['A', 'B', 'C'])
+        select('A', B='1')
+        select({'A': 'C'})
+        self.assertEqual(calls, [self.path1, self.path2])
+
+        select.load_data(self.path1, lazy=True, columns=['B'])  # <- Read again.
+        self.assertEqual(select.fieldnames, ['A', 'B', 'C'])
+        self.assertEqual(len(calls), 5)
+
+    def test_missing_field(self):
+        select = Select(self.path1, lazy=True)
+        with self.assertRaises(LookupError):
+            select('D')
+        self.assertIsNone(select._table)
+
+    def test_column_projection(self):
+        select = Select(self.path1, lazy=True, columns=['B'])
+        self.assertEqual(select.fieldnames, ['B'])
+        self.assertEqual(select('B').fetch(), ['1', '2'])
+
+    def test_non_csv_object(self):
+        select = Select([['A', 'B'], ['x', 1]], lazy=True)
+        self.assertIsNone(select._table)
+        self.assertEqual(select.fieldnames, ['A', 'B'])  # <- Loads data.
+        self.assertIsNotNone(select._table)
+
+    def test_load_order(self):
+        select = Select(self.path1, lazy=True)
+        select.load_data(self.path2)  # <- Loads deferred data first.
+        self.assertEqual(select('A').fetch(), ['x', 'y', 'z'])
+        self.assertEqual(select('A').count().fetch(), 3)
+
+    def test_repr(self):
+        select = Select(self.path1, lazy=True)
+        self.assertEqual(repr(select), '<Select {0!r}>'.format(self.path1))
+
+    def test_missing_file(self):
+        with self.assertRaises(EnvironmentError):  # <- FileNotFoundError
+            Select(os.path.join(self.tmpdir, 'missing.csv'), lazy=True)
+
+    def test_failed_load(self):
+        data = [['A', 'B'], ['x', '1'], ['y']]
+        select = Select(data, lazy=True, strict=True)
+        with self.assertRaises(Exception):
+            select('A').fetch()
+        with self.assertRaises(Exception):
+            select('A').fetch()  # <- Raised again.
+
+
+class TestConcurrentSelect(unittest.TestCase):
+    def setUp(self):
+        self.data = [['A', 'B']]
+        for i in range(100):
+            self.data.append([str(i % 3), str(i)])
+
+    def run_threads(self, func, count=4):
+        results = []
+        errors = []
+        def target():
+            try:
+                results.append(func())
+            except Exception as error:
+                errors.append(error)
+        threads = [threading.Thread(target=target) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return results
+
+    def test_default_connection_thread_check(self):
+        select = Select(self.data)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            self.run_threads(select.close, count=1)
+
+        def bulk_load():
+            with select.bulk_load():
+                pass
+        with self.assertRaises(sqlite3.ProgrammingError):
+            self.run_threads(bulk_load, count=1)
+        self.assertEqual(select('A').count().fetch(), 100)  # <- Still open.
+
+        def table_exists(table):
+            cursor = select._connection.cursor()
+            cursor.execute("SELECT 1 FROM sqlite_temp_master WHERE name=?",
+                           (table,))
+            return bool(cursor.fetchall())
+
+        collected = Select(self.data)
+        table = collected._table
+        del collected
+        gc.collect()
+        self.run_threads(Select, count=1)  # <- Released by owning thread only.
+        self.assertTrue(table_exists(table))
+        Select()
+        self.assertFalse(table_exists(table))
+        select.close()
+
+    def test_shared_database(self):
+        select = Select(self.data, concurrent=True)
+        cursor = select._connection.cursor()
+        cursor.execute('PRAGMA journal_mode')
+        self.assertEqual(cursor.fetchone()[0].lower(), 'wal')
+
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        self.assertIn(select._table, [x[0] for x in cursor])
+
+    def test_threaded_queries(self):
+        select = Select(self.data, concurrent=True)
+        expected = Select(self.data)({'A': 'B'}, B=re.compile('1$')).fetch()
+
+        func = lambda: select({'A': 'B'}, B=re.compile('1$')).fetch()
+        for result in self.run_threads(func):
+            self.assertEqual(result, expected)
+
+        func = lambda: select('B', B=lambda x: x.startswith('9')).fetch()
+        for result in self.run_threads(func):
+            self.assertEqual(result, ['9'] + [str(x) for x in range(90, 100)])
+
+    def test_threaded_loads(self):
+        select = Select(self.data, concurrent=True)
+        func = lambda: select.load_data([['A', 'B'], ['x', 'y']])
+        self.run_threads(func)
+        self.assertEqual(select('B', A='x').fetch(), ['y', 'y', 'y', 'y'])
+        self.assertEqual(select('A').count().fetch(), 104)
+
+    def test_encode_and_index(self):
+        select = Select(self.data, concurrent=True, encode='A')
+        select.create_index('A')
+        func = lambda: select('B', A='2').count().fetch()
+        self.assertEqual(self.run_threads(func), [33, 33, 33, 33])
+
+
+class TestClose(unittest.TestCase):
+    def setUp(self):
+        self.data = [['A', 'B']]
+        for i in range(50):
+            self.data.append(['x' * 100, str(i % 5)])
+
+    def get_tables(self, select):
+        cursor = select._connection.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' "
+                       "UNION ALL "
+                       "SELECT name FROM sqlite_temp_master WHERE type='table'")
+        return set(x[0] for x in cursor)
+
+    def test_close(self):
+        select = Select(self.data, encode='B')
+        select.create_index('A')
+        tables = set([select._table]) | set(select._code_tables.values())
+        self.assertTrue(tables <= self.get_tables(select))
+
+        select.close()
+        self.assertFalse(tables & self.get_tables(select))
+        self.assertEqual(select.fieldnames, [])
+        self.assertEqual(repr(select), '<Select (no data loaded)>')
+
+        select.load_data(self.data)  # <- Can be loaded again.
+        self.assertEqual(select('B').count().fetch(), 50)
+
+    def test_close_in_bulk_load(self):
+        select = Select(self.data)
+        select.create_index('A')
+        with select.bulk_load():
+            select.load_data(self.data)
+            select.close()
+        self.assertEqual(select._bulk_depth, 0)
+
+        select.load_data(self.data)
+        select.create_index('A')
+        select.load_data(self.data)  # <- Rebuilds the index after loading.
+        cursor = select._connection.cursor()
+        cursor.execute("SELECT name FROM sqlite_temp_master "
+                       "WHERE type='index' AND tbl_name=?", (select._table,))
+        self.assertEqual(len(cursor.fetchall()), 1)
+
+    def test_functions(self):
+        select = Select(self.data)
+        select('A', B=lambda x: x == '1').fetch()
+        names = list(select._user_function_dict.values())
+        self.assertEqual(len(names), 1)
+
+        select.close()
+        cursor = select._connection.cursor()
+        with self.assertRaises(sqlite3.OperationalError):
+            cursor.execute('SELECT {0}(1)'.format(names[0]))
+
+    def test_context_manager(self):
+        with Select(self.data) as select:
+            table = select._table
+            self.assertEqual(select('B').count().fetch(), 50)
+        self.assertNotIn(table, self.get_tables(select))
+
+    def test_garbage_collected(self):
+        select = Select(self.data)
+        table = select._table
+        del select
+        gc.collect()
+        other = Select()  # <- Releases tables of collected Selects.
+        self.assertNotIn(table, self.get_tables(other))
+
+    def test_vacuum(self):
+        select = Select(self.data)
+        select.close(vacuum=True)
+        cursor = select._connection.cursor()
+        cursor.execute('PRAGMA temp.freelist_count')
+        self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_concurrent(self):
+        select = Select(self.data, concurrent=True)
+        table = select._table
+        select.close(vacuum=True)
+        self.assertNotIn(table, self.get_tables(select))
+
+
+class TestUserFunctionRegistry(unittest.TestCase):
+    def setUp(self):
+        self.data = [['A', 'B'], ['x', 'foo'], ['y', 'bar'], ['z', 'baz']]
+
+    def test_shared_fingerprint(self):
+        select1 = Select(self.data)
+        select2 = Select(self.data)
+        name1 = select1._get_user_function(re.compile('^ba'))
+        name2 = select2._get_user_function(re.compile('^ba'))
+        self.assertEqual(name1, name2, msg='same pattern, same function')
+
+        name3 = select1._get_user_function(set(['foo', 'bar']))
+        name4 = select2._get_user_function(set(['bar', 'foo']))
+        self.assertEqual(name3, name4, msg='same set contents, same function')
+
+        def make_func(value):
+            return lambda x: x == value
+
+        name5 = select1._get_user_function(make_func('foo'))
+        name6 = select2._get_user_function(make_func('foo'))
+        name7 = select2._get_user_function(make_func('bar'))
+        self.assertEqual(name5, name6, msg='same code and closure')
+        self.assertNotEqual(name5, name7, msg='different closure')
+
+    def test_function_defaults_and_globals(self):
+        select = Select(self.data)
+
+        def make_func(value):
+            def func(x, value=value):
+                return x == value
+            return func
+        self.assertEqual(select('A', B=make_func('foo')).fetch(), ['x'])
+        self.assertEqual(select('A', B=make_func('bar')).fetch(), ['y'])
+
+        func1 = eval('lambda x: x == value', {'value': 'foo'})
+        func2 = types.FunctionType(func1.__code__, {'value': 'baz'})
+        self.assertEqual(select('A', B=func1).fetch(), ['x'])
+        self.assertEqual(select('A', B=func2).fetch(), ['z'])  # <- Same code.
+
+        if not hasattr(func1, '__kwdefaults__'):
+            return  # <- Keyword-only arguments are new in Python 3.
+
+        namespace = {}
+        exec('def make_func(value):\n'
+             '    def func(x, *, value=value):\n'
+             '        return x == value\n'
+             '    return func\n', namespace)
+        make_func = namespace['make_func']
+        self.assertEqual(select('A', B=make_func('foo')).fetch(), ['x'])
+        self.assertEqual(select('A', B=make_func('baz')).fetch(), ['z'])
+
+    def test_close_shared(self):
+        select1 = Select(self.data)
+        select2 = Select(self.data)
+        pattern = re.compile('[a][rz]$')  # <- Not compiled to SQL.
+        select1('A', B=pattern).fetch()
+        select2('A', B=pattern).fetch()
+        name = select1._get_user_function(pattern)
+
+        select1.close()  # <- Function is still used by select2.
+        self.assertEqual(select2('A', B=pattern).fetch(), ['y', 'z'])
+
+        select2.close()  # <- Last user, function is unregistered.
+        cursor = select2._connection.cursor()
+        with self.assertRaises(sqlite3.OperationalError):
+            cursor.execute('SELECT {0}(1)'.format(name))
+
+    def test_eviction(self):
+        select = Select(self.data)
+        original_max = squint.select.MAX_USER_FUNCTIONS
+        try:
+            squint.select.MAX_USER_FUNCTIONS = 2
+            first = select._get_user_function(re.compile('^f'))
+            select._get_user_function(re.compile('^b'))
+            select._get_user_function(re.compile('z$'))  # <- Releases first.
+
+            cursor = select._connection.cursor()
+            with self.assertRaises(sqlite3.OperationalError):
+                cursor.execute("SELECT {0}('foo')".format(first))
+
+            # Released functions are registered again when used.
+            result = select('A', B=re.compile('oo$')).fetch()
+            self.assertEqual(result, ['x'])
+            self.assertEqual(len(select._resources.functions), 2)
+        finally:
+            squint.select.MAX_USER_FUNCTIONS = original_max
+            select.close()
+
+    def test_functions_in_use_not_evicted(self):
+        select1 = Select(self.data)
+        select2 = Select(self.data)
+        original_max = squint.select.MAX_USER_FUNCTIONS
+        try:
+            squint.select.MAX_USER_FUNCTIONS = 1
+            name = select1._get_user_function(lambda x: len(x) == 3)
+            select2._get_user_function(lambda x: len(x) == 4)
+            select2._get_user_function(lambda x: len(x) == 5)
+
+            cursor = select1._connection.cursor()
+            cursor.execute("SELECT {0}('foo')".format(name))
+            self.assertEqual(cursor.fetchall(), [(1,)], msg='still registered')
+        finally:
+            squint.select.MAX_USER_FUNCTIONS = original_max
+            select1.close()
+            select2.close()
+
+    def test_unregister_in_progress(self):
+        connection = sqlite3.connect(':memory:')
+        self.addCleanup(connection.close)
+        registry = squint.select._FunctionRegistry(
+            lambda name, func: connection.create_function(name, 1, func),
+            threading.RLock(),
+        )
+        name = registry.add('key1', abs)
+        registry.add_user('key1')
+        cursor = connection.execute(
+            'SELECT {0}(-1) UNION ALL SELECT {0}(-2)'.format(name))
+        cursor.fetchone()  # <- Statement is in progress.
+
+        registry.remove_user('key1')  # <- Can not be unregistered yet.
+        self.assertEqual(cursor.fetchall(), [(2,)])
+
+        registry.add('key2', abs)
+        registry.add_user('key2')
+        registry.remove_user('key2')  # <- Also unregisters the first.
+        with self.assertRaises(sqlite3.OperationalError):
+            connection.execute('SELECT {0}(1)'.format(name))
+
+
+def _fetch_query(query):  # <- Used by TestPickle (must be picklable).
+    return query.fetch()
+
+
+class TestPickle(unittest.TestCase):
+    def setUp(self):
+        self.data = [['A', 'B'], ['x', 'foo'], ['y', 'bar'], ['z', 'foo']]
+
+    def roundtrip(self, obj):
+        return pickle.loads(pickle.dumps(obj))
+
+    def test_roundtrip(self):
+        select = Select(self.data)
+        select.create_index('B')
+        self.addCleanup(select.close)
+
+        copy = self.roundtrip(select)
+        self.assertIsNotNone(copy._reopen_state, msg='opened when first used')
+        self.assertEqual(copy.fieldnames, ['A', 'B'])
+        self.assertEqual(repr(copy), repr(select))
+        self.assertEqual(copy('A', B='foo').fetch(), ['x', 'z'])
+        self.assertIsNone(copy._reopen_state)
+        copy.close()
+
+        cursor = select._connection.cursor()
+        cursor.execute('PRAGMA index_list({0})'.format(select._table))
+        self.assertEqual(len(cursor.fetchall()), 1)
+
+    def test_snapshot_reused(self):
+        select = Select(self.data)
+        self.addCleanup(select.close)
+
+        pickle.dumps(select)
+        snapshot = select._snapshot
+        pickle.dumps(select)
+        self.assertEqual(select._snapshot, snapshot, msg='unchanged, reused')
+
+        select.load_data([['A', 'B'], ['w', 'baz']])
+        copy = self.roundtrip(select)
+        self.assertNotEqual(select._snapshot, snapshot)
+        self.assertEqual(copy('A').fetch(), ['x', 'y', 'z', 'w'])
+        copy.close()
+
+        select.close()
+        self.assertFalse(os.path.exists(snapshot))
+
+    def test_encoded_columns(self):
+        select = Select(self.data, encode='B')
+        self.addCleanup(select.close)
+
+        copy = self.roundtrip(select)
+        self.assertEqual(copy({'B': 'A'}, B='foo').fetch(), {'foo': ['x', 'z']})
+
+        copy.load_data([['A', 'B'], ['w', 'foo']])  # <- Copied from the snapshot.
+        self.assertEqual(copy('A', B='foo').fetch(), ['x', 'z', 'w'])
+        self.assertEqual(select('A', B='foo').fetch(), ['x', 'z'])
+        copy.close()
+
+    def test_from_sqlite(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'data.sqlite3')
+        connection = sqlite3.connect(path)
+        connection.execute('CREATE TABLE mytable (A TEXT, B TEXT)')
+        connection.executemany('INSERT INTO mytable VALUES (?, ?)', self.data[1:])
+        connection.commit()
+        connection.close()
+
+        select = Select.from_sqlite(path, 'mytable')
+        state = select.__getstate__()
+        self.assertEqual(state['path'], path, msg='no snapshot is made')
+        self.assertEqual(self.roundtrip(select)('A').fetch(), ['x', 'y', 'z'])
+
+    def test_query(self):
+        select = Select(self.data)
+        self.addCleanup(select.close)
+
+        query = self.roundtrip(select('A', B='foo'))
+        self.assertEqual(query.fetch(), ['x', 'z'])
+
+    def test_process_pool(self):
+        select = Select(self.data)
+        self.addCleanup(select.close)
+
+        queries = [select('A', B='foo'), select('B').count()]
+        pool = multiprocessing.Pool(2)
+        try:
+            results = pool.map(_fetch_query, queries)
+        finally:
+            pool.close()
+            pool.join()
+        self.assertEqual(results, [['x', 'z'], 3])
+
+    def test_inherited_select(self):
+        select = Select(self.data)
+        self.addCleanup(select.close)
+
+        select._resources.pid = -1  # <- As if inherited by a forked process.
+        with self.assertRaises(RuntimeError):
+            select('A').fetch()
+
+
+class TestCompiledMatchers(unittest.TestCase):
+    def setUp(self):
+        self.select = Select([
+            ['A', 'B'],
+            ['a', 'bar'],
+            ['b', 'baz'],
+            ['c', 'foo'],
+            ['d', ''],
+            ['e', '12'],
+        ])
+        self.select.load_data(
+            [['A', 'B'], ['f', 3], ['g', 1.5], ['h', 0], ['i', None]]
+        )
+
+    def tearDown(self):
+        self.select.close()
+
+    def assertCompiled(self, predicate):
+        """Check that *predicate* is compiled to SQL without using a
+        user-defined function and that it matches the same records
+        as the user-defined function would.
+        """
+        select = self.select
+        sql, params = select._build_where_clause({'B': predicate})
+        self.assertFalse(re.search(r'FUNC\d+\(', sql), msg=sql)
+
+        rows = select('A', B=predicate).fetch()
+        expected = [a for a, b in select(['A', 'B']).fetch()
+                    if Predicate(predicate)(b)]
+        self.assertEqual(sorted(rows), sorted(expected))
+
+    def test_types(self):
+        self.assertCompiled(int)
+        self.assertCompiled(float)
+        self.assertCompiled(str)
+        self.assertCompiled(object)
+        self.assertCompiled(bool)
+
+    def test_truthiness(self):
+        self.assertCompiled(True)
+        self.assertCompiled(False)
+
+    def test_ellipsis(self):
+        self.assertEqual(self.select._build_where_clause({'B': Ellipsis}),
+                         ('', []))
+        self.assertEqual(self.select('A', B=Ellipsis).fetch(),
+                         ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'i'])
+
+    def test_nan(self):
+        self.assertCompiled(float('nan'))
+
+    def test_sql_literal(self):
+        self.assertTrue(_is_sql_literal(-2 ** 63))  # <- A "long" on Python 2.
+        self.assertFalse(_is_sql_literal(2 ** 63))
+        self.assertFalse(_is_sql_literal(True))
+        self.assertFalse(_is_sql_literal(float('nan')))
+
+    def test_regex_prefix(self):
+        select = self.select
+        sql, params = select._build_where_clause({'B': re.compile('^ba')})
+        self.assertEqual(sql, '"B" >= ? AND "B" < ?')
+        self.assertEqual(params, ['ba', 'bb'])
+        self.assertEqual(select('A', B=re.compile('^ba')).fetch(), ['a', 'b'])
+
+        sql, params = select._build_where_clause({'B': re.compile('^ba.*$')})
+        self.assertRegex(sql, r'FUNC\d+\("B"\)')  # <- "$" is not literal.
+
+        sql, params = select._build_where_clause({'B': re.compile('^ba[rz]')})
+        self.assertRegex(sql, r'^"B" >= \? AND "B" < \? AND FUNC\d+\("B"\)$')
+        self.assertEqual(select('A', B=re.compile('^ba[r]')).fetch(), ['a'])
+
+    def test_regex_alternation(self):
+        select = Select([['A'], ['abc1'], ['fooxyz'], ['bar']])
+        regex = re.compile('^abc|xyz')
+        sql, params = select._build_where_clause({'A': regex})
+        self.assertRegex(sql, r'^FUNC\d+\("A"\)$')
+        self.assertEqual(select('A', A=regex).fetch(), ['abc1', 'fooxyz'])
+        self.assertEqual(select('A').filter(regex).fetch(), ['abc1', 'fooxyz'])
+        self.assertEqual(select('A', A=re.compile('^ab(c|x)')).fetch(), ['abc1'])
+        select.close()
+
+    def test_regex_numeric_prefix(self):
+        sql, params = self.select._build_where_clause({'B': re.compile('^12')})
+        self.assertRegex(sql, r'^FUNC\d+\("B"\)$')
+        self.assertEqual(self.select('A', B=re.compile('^12')).fetch(), ['e'])
+
+    def test_regex_unanchored(self):
+        sql, params = self.select._build_where_clause({'B': re.compile('oo')})
+        self.assertRegex(sql, r'^FUNC\d+\("B"\)$')
+
+    def test_infer_types(self):
+        select = Select([['A', 'B', 'C'], ['x', '1', '2.5'], ['y', '2', '3']],
+                        infer_types=True)
+        self.assertEqual(select('A', B=int).fetch(), ['x', 'y'])
+        self.assertEqual(select('A', B=str).fetch(), [])
+        self.assertEqual(select('A', C=float).fetch(), ['x', 'y'])
+        self.assertEqual(select('A', C=True).fetch(), ['x', 'y'])
+        select.close()
+
+    def test_encoded_column(self):
+        data = [['A', 'B']] + [['x', 'foo'], ['y', 'bar']] * 50
+        select = Select(data, encode=['B'])
+        self.assertEqual(select('A', B=re.compile('^fo')).fetch(), ['x'] * 50)
+        text_type = type(u'')  # <- SQLite returns unicode on Python 2.
+        self.assertEqual(select('A', B=text_type).fetch(), ['x', 'y'] * 50)
+        select.close()
+
+
+class TestSchemaCache(unittest.TestCase):
+    def setUp(self):
+        self.select = Select([['A', 'B'], ['x', 'foo'], ['y', 'bar']])
+
+    def count_connection_use(self, function):
+        """Return the number of times *function* uses the Select's
+        connection.
+        """
+        select = self.select
+        calls = []
+        get_connection = select._get_connection
+        def counting_get_connection():
+            calls.append(1)
+            return get_connection()
+        select._get_connection = counting_get_connection
+        try:
+            function()
+        finally:
+            del select._get_connection
+        return len(calls)
+
+    def test_query_construction(self):
+        select = self.select
+        self.assertEqual(select.fieldnames, ['A', 'B'])
+
+        # Fields are validated without reading the table schema.
+        count = self.count_connection_use(lambda: select({'A': 'B'}, B='foo'))
+        self.assertEqual(count, 0)
+        count = self.count_connection_use(lambda: select())
+        self.assertEqual(count, 0)
+
+        with self.assertRaises(LookupError):
+            select('C')
+
+    def test_load_data(self):
+        select = self.select
+        self.assertEqual(select.fieldnames, ['A', 'B'])
+        select.load_data([['A', 'C'], ['z', 'baz']])
+        self.assertEqual(select.fieldnames, ['A', 'B', 'C'])
+        self.assertEqual(select('C').fetch(), ['', '', 'baz'])
+
+    def test_close(self):
+        select = self.select
+        self.assertEqual(select.fieldnames, ['A', 'B'])
+        select.close()
+        self.assertEqual(select.fieldnames, [])
+
+    def test_fieldnames_copy(self):
+        fieldnames = self.select.fieldnames
+        fieldnames.append('C')  # <- Does not change the cached names.
+        self.assertEqual(self.select.fieldnames, ['A', 'B'])
+
+
 class TestCall(HelperTestCase):
     def test_list_of_elements(self):
         query = self.select(['label1'])